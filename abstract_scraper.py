@@ -1,32 +1,68 @@
 import gzip
 import os
-import queue
 import re
 import shutil
 import sys
-import time
 from abc import ABC, abstractmethod
-from threading import Thread, Event
-from typing import Tuple
-from urllib.request import urlretrieve
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import downloader
+import generic
+from abstract_viewer import Viewer
+from downloader import DownloadManifest, DownloadSink
+from stream_index import StreamIndexSink
 
 
 class Scraper(ABC):
     INPUT_FILE_REGEX = re.compile(r'^([\w.]+)')
 
+    # The viewer of the downloaded files, which indexes gzip files while they are
+    # downloaded, and the size of their records if they are fixed-size
+    VIEWER: type[Viewer] | None = None
+    RECORD_SIZE: int | None = None
+
     def __init__(self, output_path: str, threads: int):
         self.output_path: str = output_path
         self.threads: int = threads
 
+        # The format to store downloaded gzip files in, see stream_index
+        self.store_format: str = 'gzip'
+
+        # Whether downloaded files are converted into the binary stores of the
+        # viewer, if it has any, see LogViewer.convert
+        self.convert: bool = False
+
     @abstractmethod
     def scrape(self):
         raise NotImplementedError()
 
     @staticmethod
-    def download_file(url: str, destination: str, extract: bool = True):
-        temp_name = destination + ".download"
-        urlretrieve(url, temp_name)
-        os.rename(temp_name, destination)
+    def download_file(
+            url: str,
+            destination: str,
+            extract: bool = True,
+            manifest: DownloadManifest | None = None,
+            sink: DownloadSink | None = None
+    ) -> bool:
+        """
+        Download a file, resuming a partial download of it, unless the manifest
+        shows that it has already been downloaded. See downloader.download_file.
+        :return: Whether the file was downloaded.
+        """
+        return downloader.download_file(url, destination, manifest, sink=sink)
+
+    def create_sink(self, file_path: str) -> DownloadSink | None:
+        """
+        Create the sink of a downloaded file. Gzip files of scrapers with a viewer
+        are decompressed and indexed while they are downloaded, and stored in
+        self.store_format, so that they can be viewed without reading them again.
+        :param file_path: The path the file is downloaded to.
+        :return: The sink, or None to store the file as downloaded.
+        """
+        if self.VIEWER is None or not generic.is_gzip(file_path):
+            return None
+
+        return StreamIndexSink(self.VIEWER, self.store_format, self.RECORD_SIZE)
 
     @staticmethod
     def read_input_files(file_path: str, line_regex: re.Pattern = None) -> list[str]:
@@ -45,7 +81,13 @@ class Scraper(ABC):
 
     def cache_files(self, file_list: str | list[str], output_dir: str,
                     url_format: str):
-
+        """
+        Download files in a pool of self.threads threads. Gzip files are
+        decompressed while they are downloaded, see create_sink.
+        :param file_list: The names of the files to download.
+        :param output_dir: The directory to download the files to.
+        :param url_format: The URL of the files, with %s in place of the name.
+        """
         if isinstance(file_list, str):
             file_list = [file_list]
 
@@ -53,68 +95,88 @@ class Scraper(ABC):
         sys.stdout.write(print_format % ('0%', 'initializing...'))
         sys.stdout.flush()
 
-        task_queue = queue.Queue()
         done_list = []
+        failed_list = []
         ongoing_set = set()
+        manifest = DownloadManifest(output_dir)
+
+        with ThreadPoolExecutor(max(1, min(self.threads, len(file_list)))) as pool:
+            downloads = {
+                pool.submit(
+                    self._download_task,
+                    url_format % file,
+                    os.path.join(output_dir, file),
+                    manifest,
+                    ongoing_set
+                ): file
+                for file in file_list
+            }
+
+            while downloads:
+                completed, _ = wait(list(downloads), return_when=FIRST_COMPLETED)
+
+                for future in completed:
+                    file = downloads.pop(future)
+
+                    # A failed download keeps its partial file, which the next
+                    # run resumes
+                    if future.exception() is not None:
+                        failed_list.append((file, future.exception()))
+
+                    done_list.append(file)
+
+                progress = len(done_list) / len(file_list)
+                sys.stdout.write(
+                    print_format % (f'{progress:.0%}', ', '.join(ongoing_set))
+                )
+                sys.stdout.flush()
 
-        for file in file_list:
-            task_queue.put((url_format, output_dir, file))
-
-        thread_count = min(self.threads, len(file_list))
-        threads = [
-            Thread(
-                target=self._download_threaded,
-                args=(task_queue, done_list, ongoing_set)
-            )
-            for _ in range(thread_count)
-        ]
-
-        for thread in threads:
-            thread.start()
-
-        last_done = 0
+        sys.stdout.write(print_format % ('100%', 'done!'))
+        sys.stdout.write('\n')
+        sys.stdout.flush()
 
-        while any(thread.is_alive() for thread in threads):
-            done = len(done_list)
+        for file, error in failed_list:
+            sys.stderr.write(f'Failed to cache {file}: {error}\n')
 
-            if done == last_done:
-                time.sleep(0.01)
-                continue
+        self.convert_files(output_dir)
 
-            last_done = done
+    def convert_files(self, directory: str):
+        """
+        Convert the files of a directory into the binary stores of the viewer, if
+        self.convert is set and the viewer has stores. Files that are already
+        converted are skipped.
+        :param directory: The directory to convert the files of.
+        """
+        if not self.convert or not hasattr(self.VIEWER, 'convert'):
+            return
 
-            current = ', '.join(ongoing_set)
-            progress = len(done_list) / len(file_list)
+        sys.stdout.write('Converting files...')
+        sys.stdout.flush()
 
-            sys.stdout.write(print_format % (f'{progress:.0%}', current))
-            sys.stdout.flush()
+        converted = self.VIEWER(directory, None, None).convert()
 
-        sys.stdout.write(print_format % ('100%', 'done!'))
-        sys.stdout.write('\n')
+        sys.stdout.write(f' {len(converted)} converted.\n')
         sys.stdout.flush()
 
-    def _download_threaded(
+    def _download_task(
             self,
-            task_queue: queue.Queue[Tuple[str, str, str]],
-            done_list: list[str],
-            ongoing_list: set[str]
+            url: str,
+            file_path: str,
+            manifest: DownloadManifest,
+            ongoing_set: set[str]
     ):
-        try:
-            while task := task_queue.get(block=False):
-                url_format, destination, file = task
-                file_path = os.path.join(destination, file)
+        """
+        Download a file in the download pool.
+        """
+        file = os.path.basename(file_path)
+        ongoing_set.add(file)
 
-                ongoing_list.add(file)
-
-                if not os.path.exists(file_path):
-                    self.download_file(url_format % file, file_path)
-
-                if hasattr(self, 'get_archive_format') and \
-                        hasattr(self, 'extract_file') and \
-                        self.get_archive_format(file_path) is not None:
-                    self.extract_file(file_path)
-
-                ongoing_list.remove(file)
-                done_list.append(file)
-        except queue.Empty:
-            return
\ No newline at end of file
+        try:
+            self.download_file(
+                url,
+                file_path,
+                manifest=manifest,
+                sink=self.create_sink(file_path)
+            )
+        finally:
+            ongoing_set.discard(file)
@@ -1,14 +1,68 @@
+import bisect
+import heapq
+import itertools
 import os.path
 import struct
 from abc import abstractmethod
+from operator import attrgetter
 from datetime import datetime, timedelta
-from typing import Iterable, Tuple, IO
+from typing import Iterable, Tuple, IO, Generator
 
 import generic
 from generic import parse_duration, open_file
+from gzip_index import GzipCheckpoint, find_checkpoint
+from record import Record
+from time_index import TimeIndex, TimeIndexEntry
+
+
+class PartIndexer:
+    """
+    Builds the time index entry of a part from its decompressed data, which is
+    passed to it in order, so that a part can be indexed in the same pass as it is
+    decompressed, for example while it is downloaded.
+    """
+
+    @abstractmethod
+    def update(self, data: bytes):
+        """
+        Add the next decompressed data of the part.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def locate(
+            self,
+            head: bytes,
+            offset: int,
+            previous: bytes
+    ) -> tuple[int, datetime] | None:
+        """
+        Locate the first record of a gzip member, as required by build_checkpoints.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_entry(
+            self,
+            checkpoints: list[GzipCheckpoint] | None = None
+    ) -> TimeIndexEntry | None:
+        """
+        Get the index entry of all data added so far.
+        :param checkpoints: The checkpoints of the part, if it is gzip compressed.
+        :return: The entry, or None if the part contains no records.
+        """
+        raise NotImplementedError()
 
 
 class Viewer:
+    # The columns of the records returned by read, in order, mapped to the types
+    # of their values
+    SCHEMA: dict[str, type] = dict()
+
+    # Whether records at the stop time are read, as opposed to only the records
+    # before it
+    INCLUDES_STOP: bool = False
+
     def __init__(
             self,
             input_path: str,
@@ -26,7 +80,12 @@ class Viewer:
         self.stop_time: datetime | None = datetime.fromisoformat(stop_time) \
             if stop_time else None
 
-        self.files = generic.get_files(self.input_path)
+        self.files = self.drop_duplicate_files(generic.get_files(self.input_path))
+        self.record_counts: dict[Tuple[str, str | None], int] = dict()
+        self.checkpoints: dict[
+            Tuple[str, str | None],
+            list[GzipCheckpoint] | None
+        ] = dict()
         start, end = self.get_file_times()
         self.start_times: dict[Tuple[str, str | None], datetime] = start
         self.end_times: dict[Tuple[str, str | None], datetime] = end
@@ -36,6 +95,15 @@ class Viewer:
                 key=lambda file: self.start_times[file]
             )
         )
+        self.ordered_start_times: list[datetime] = [
+            self.start_times[file] for file in self.ordered_files
+        ]
+        # The latest end time of the ordered files up to each file. Unlike the end
+        # times of the files, these are sorted, so they can be bisected.
+        self.ordered_end_times: list[datetime] = list(itertools.accumulate(
+            (self.end_times[file] for file in self.ordered_files),
+            max
+        ))
 
         if duration is not None:
             if not (self.start_time is None) ^ (self.stop_time is None):
@@ -56,18 +124,153 @@ class Viewer:
     def read_last_time(self, file: IO[bytes]) -> datetime:
         raise NotImplementedError()
 
-    def find_file(self, time: datetime) -> int | None:
-        index = 0
+    @classmethod
+    def create_indexer(cls) -> PartIndexer:
+        """
+        Create an indexer for the decompressed data of a part of this kind.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def index_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        """
+        Read the first and last record times and the number of records of a part.
+        This is only done when the part is not already in the time index, so
+        implementations may read the whole part.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :return: The index entry of the part, or None if the part contains no
+        records.
+        """
+        raise NotImplementedError()
+
+    def open_part(
+            self,
+            file_path: str,
+            part: str | None,
+            time: datetime | None = None
+    ) -> IO:
+        """
+        Open a part for reading. If the part is gzip compressed and has
+        checkpoints, decompression starts from the last checkpoint before the
+        specified time, at the start of a record.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :param time: The time of the first record that has to be read, or None to
+        read the whole part.
+        :return: The opened part.
+        """
+        checkpoint = find_checkpoint(self.checkpoints.get((file_path, part)), time)
+        if checkpoint is None:
+            return open_file(file_path, part, read_flags=self.read_flags)
+
+        file = open_file(
+            file_path,
+            part,
+            read_flags=self.read_flags,
+            offset=checkpoint.compressed_offset
+        )
+
+        file.read(checkpoint.skip)
+        return file
+
+    def time_bounds(self) -> tuple[float | None, float | None]:
+        """
+        Get the start and stop time of the viewer as timestamps.
+        :return: A tuple of the start and stop timestamps, where either is None if
+        the corresponding time is not specified.
+        """
+        start = None if self.start_time is None else self.start_time.timestamp()
+        stop = None if self.stop_time is None else self.stop_time.timestamp()
+
+        return start, stop
+
+    def find_file(self, time: datetime | None) -> int:
+        """
+        Find the first ordered file that ends at or after a specified time, such
+        that all earlier files end before it.
+        :param time: The time to find the file for. If None, the first file is
+        returned.
+        :return: The index of the file in the ordered files, or the number of
+        ordered files if all files end before the specified time.
+        """
+        if time is None:
+            return 0
+
+        return bisect.bisect_left(self.ordered_end_times, time)
 
-        for file, part in self.ordered_files:
-            start = self.start_times[file, part]
+    def get_parts(self) -> list[Tuple[str, str | None]]:
+        """
+        Get the ordered files that overlap the start and stop time of the viewer.
+        :return: A list of the files, in order of their start times.
+        """
+        first = self.find_file(self.start_time)
 
-            if start > time:
-                continue
+        # Files starting at the stop time are only read if records at the stop time
+        # are
+        bisect_stop = bisect.bisect_right if self.INCLUDES_STOP else \
+            bisect.bisect_left
+        last = len(self.ordered_files) if self.stop_time is None else \
+            bisect_stop(self.ordered_start_times, self.stop_time, lo=first)
 
-            index += 1
+        parts = self.ordered_files[first:last]
+        if self.start_time is None:
+            return parts
 
-        return None if index >= len(self.ordered_files) else index
+        # Files within the range that overlap other files can still end before
+        # the start time
+        return [file for file in parts if self.end_times[file] >= self.start_time]
+
+    def group_parts(
+            self,
+            parts: list[Tuple[str, str | None]]
+    ) -> list[list[Tuple[str, str | None]]]:
+        """
+        Group parts into groups whose records have to be merged to read them in
+        order of time, since their time ranges overlap. Groups are ordered by
+        time, and parts that are not indexed form groups of their own.
+        :param parts: The parts to group, as returned by resolve_parts.
+        :return: A list of the groups, each a list of parts.
+        """
+        groups = [[file] for file in parts if file not in self.start_times]
+        group_end = None
+
+        for file in sorted(
+                (file for file in parts if file in self.start_times),
+                key=lambda file: self.start_times[file]
+        ):
+            if group_end is not None and self.start_times[file] < group_end:
+                groups[-1].append(file)
+                group_end = max(group_end, self.end_times[file])
+            else:
+                groups.append([file])
+                group_end = self.end_times[file]
+
+        return groups
+
+    @staticmethod
+    def drop_duplicate_files(
+            files: list[Tuple[str, str | None]]
+    ) -> list[Tuple[str, str | None]]:
+        """
+        Remove gzip files of a directory that have also been extracted, so that
+        their records are only read once. The extracted files are kept, since
+        they can be read without decompressing them.
+        :param files: The files, as returned by generic.get_files.
+        :return: The files without duplicates.
+        """
+        paths = {file_path for file_path, part in files if part is None}
+
+        return [
+            (file_path, part) for file_path, part in files
+            if part is not None or
+            generic.get_archive_format(file_path) != '.gz' or
+            os.path.splitext(file_path)[0] not in paths
+        ]
 
     def get_file_times(self) -> Tuple[
         dict[Tuple[str, str | None], datetime],
@@ -76,16 +279,142 @@ class Viewer:
         files = self.files
         start = dict()
         end = dict()
+        kind = type(self).__name__
+        index = TimeIndex.load(self.input_path)
 
         for file_path, part in files:
-            try:
-                with open_file(file_path, part, read_flags=self.read_flags) as file:
-                    start[file_path, part] = self.read_first_time(file)
-            except struct.error:
-                pass
+            entry = index.get(kind, file_path, part)
+
+            if entry is None:
+                try:
+                    entry = self.index_part(file_path, part)
+                except struct.error:
+                    continue
 
+                if entry is None:
+                    continue
+
+                index.put(kind, file_path, part, entry)
+
+            start[file_path, part] = entry.first
+            end[file_path, part] = entry.last
+            self.record_counts[file_path, part] = entry.count
+            self.checkpoints[file_path, part] = entry.checkpoints
+
+        index.save()
         return start, end
 
+    def resolve_parts(
+            self,
+            parts: list[str] | str | None = None
+    ) -> list[Tuple[str, str | None]]:
+        """
+        Get the files to read for a list of part names.
+        :param parts: Names of parts within the input, i.e. parts of an archive or
+        names of files in a directory. If not specified, the parts overlapping the
+        start and stop time of the viewer are used.
+        :return: A list of tuples of file paths and parts.
+        """
+        if isinstance(parts, str):
+            parts = [parts]
+
+        if not parts:
+            return self.get_parts()
+
+        if not self.is_dir:
+            return [(self.input_path, part) for part in parts]
+
+        return [
+            (os.path.join(self.input_path, part), None) for part in parts
+        ]
+
+    def get_tasks(
+            self,
+            parts: list[str] | str | None = None,
+            count: int = 1
+    ) -> list[Tuple[str, str | None, int | None, int | None]]:
+        """
+        Split the reading of some parts into tasks that can be read independently,
+        for example by different processes. Reading all tasks in order using
+        read_task yields the same records as read does. Parts that overlap in time
+        are read by a single task merging them, whose file path is None and whose
+        part is a tuple of the parts.
+        :param parts: The parts to read, as passed to read.
+        :param count: The desired number of tasks. Implementations may create more
+        or fewer tasks.
+        :return: A list of tasks, each a tuple of a file path, a part, and the
+        first and end position within the part to read, where the positions are
+        None if the whole part is read.
+        """
+        return [
+            (*group[0], None, None) if len(group) == 1 else
+            (None, tuple(group), None, None)
+            for group in self.group_parts(self.resolve_parts(parts))
+        ]
+
+    def read_task(
+            self,
+            task: Tuple[str, str | None, int | None, int | None]
+    ) -> Generator[Record, None, bool]:
+        """
+        Read the records of a task created by get_tasks.
+        :param task: The task to read.
+        :return: A generator yielding the records of the task. The return value of
+        the generator is True if reading stopped since a record after the stop
+        time was reached, in which case the records of later tasks are not part of
+        the output of read.
+        """
+        file_path, part, _, _ = task
+
+        if file_path is None:
+            return (yield from self.read_group(list(part)))
+
+        return (yield from self.read_part(file_path, part))
+
     @abstractmethod
-    def read(self, part: str | None = None) -> Iterable[str]:
+    def read_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> Generator[Record, None, bool]:
+        """
+        Read the records of a single part within the start and stop time of the
+        viewer, in order of time.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :return: A generator yielding the records of the part, see read_task.
+        """
         raise NotImplementedError()
+
+    def read_group(
+            self,
+            group: list[Tuple[str, str | None]]
+    ) -> Generator[Record, None, bool]:
+        """
+        Read the records of a group of parts, as created by group_parts, in order
+        of time. The records of overlapping parts are merged.
+        :param group: The parts of the group.
+        :return: A generator yielding the records of the group, see read_task.
+        """
+        if len(group) == 1:
+            return (yield from self.read_part(*group[0]))
+
+        # A merged part stops at its first record after the stop time, so every
+        # record of the group within the time range is read
+        yield from heapq.merge(
+            *(self.read_part(file_path, part) for file_path, part in group),
+            key=attrgetter('time')
+        )
+
+        return False
+
+    def read(self, parts: list[str] | str | None = None) -> Iterable[Record]:
+        """
+        Read the records of some parts within the start and stop time of the
+        viewer, in order of time.
+        :param parts: Names of parts within the input. If not specified, the parts
+        overlapping the start and stop time of the viewer are read.
+        :return: A generator yielding the records.
+        """
+        for group in self.group_parts(self.resolve_parts(parts)):
+            yield from self.read_group(group)
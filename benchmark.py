@@ -0,0 +1,138 @@
+import argparse
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import generic
+from log_viewer import CommonLogFormatParser, LogViewerDataPoint
+
+# The regex based parser that LogViewer used before CommonLogFormatParser, kept as
+# the reference the fast parser is measured against.
+REFERENCE_LINE_REGEX = re.compile(
+    r'([\w\-.]+) - - \[([\w\/:\s-]+)] "(\w+) (.*)" (\d+) (\w+)')
+
+
+def parse_reference(line: str) -> LogViewerDataPoint | None:
+    match = REFERENCE_LINE_REGEX.match(line)
+    if not match:
+        return None
+
+    return LogViewerDataPoint(
+        host=str(match.group(1)),
+        time=datetime.strptime(match.group(2), '%d/%b/%Y:%H:%M:%S %z'),
+        method=str(match.group(3)),
+        path=str(match.group(4)),
+        code=int(match.group(5)),
+        size=int(match.group(6))
+    )
+
+
+def generate_lines(count: int, seed: int = 0) -> list[str]:
+    """
+    Generate log lines resembling the NASA logs, including lines with a - size and
+    truncated requests.
+    :param count: The number of lines to generate.
+    :param seed: The seed of the generated lines.
+    :return: The generated lines.
+    """
+    rng = random.Random(seed)
+    time = datetime(1995, 8, 1, tzinfo=timezone(timedelta(hours=-4)))
+    hosts = ['in24.inetnebr.com', 'uplherc.upl.com', '199.120.110.21']
+    paths = ['/', '/images/NASA-logosmall.gif', '/shuttle/countdown/count.gif']
+    lines = []
+
+    for _ in range(count):
+        time += timedelta(seconds=rng.choice([0, 1, 1, 2]))
+        request = f'GET {rng.choice(paths)} HTTP/1.0"'
+
+        if rng.random() < 0.01:
+            request = 'GET /shuttle/countdown/video/livevideo.'
+
+        size = '-' if rng.random() < 0.05 else str(rng.randrange(100000))
+        lines.append(
+            f'{rng.choice(hosts)} - - [{time.strftime("%d/%b/%Y:%H:%M:%S %z")}] '
+            f'"{request} {rng.choice([200, 304, 404])} {size}\n'
+        )
+
+    return lines
+
+
+def read_lines(file_path: str, count: int) -> list[str]:
+    lines = []
+    with generic.open_file(file_path, read_flags='r') as file:
+        while len(lines) < count and (line := file.readline()):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+
+            lines.append(line)
+
+    return lines
+
+
+def measure(
+        parse: Callable[[str], object],
+        lines: list[str],
+        repeat: int = 3
+) -> float:
+    """
+    Measure the number of lines per second a parser processes.
+    :param parse: The parser to measure.
+    :param lines: The lines to parse.
+    :param repeat: The number of times to parse the lines. The fastest repetition
+    is used, to reduce the impact of other processes.
+    :return: The number of lines parsed per second.
+    """
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(lines) / best
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the log line parser of the log viewer.'
+    )
+
+    parser.add_argument(
+        '--input',
+        help='Log file to read lines from. If not specified, lines are generated.',
+        dest='input',
+        default=None
+    )
+
+    parser.add_argument(
+        '--lines',
+        help='Number of lines to parse',
+        type=int,
+        dest='lines',
+        default=200000
+    )
+
+    return parser.parse_args(sys.argv[1:])
+
+
+def main():
+    options = parse_options()
+    lines = read_lines(options.input, options.lines) if options.input else \
+        generate_lines(options.lines)
+
+    reference = measure(parse_reference, lines)
+    fast = measure(CommonLogFormatParser().parse_line, lines)
+
+    print(f'Reference parser: {reference:,.0f} lines/s')
+    print(f'Fast parser:      {fast:,.0f} lines/s')
+    print(f'Speedup:          {fast / reference:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,12 @@
 import os
 
 from abstract_scraper import Scraper
+from log_viewer import LogViewer
 
 
 class ClarknetScraper(Scraper):
+    VIEWER = LogViewer
+
     def __init__(self, output_path: str, threads: int):
         super().__init__(output_path, threads)
 
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import json
+import struct
+from datetime import datetime
+from typing import IO, Any, Iterable
+
+import numpy as np
+
+from record import Record
+
+MAGIC = b'CBSACOL1'
+VERSION = 1
+
+# The number of rows in each row group, unless specified otherwise
+ROW_GROUP_SIZE = 1 << 20
+
+# Columns containing integer timestamps, when written as batches of arrays
+TIMESTAMP_COLUMNS = {'time'}
+
+INTEGER_TYPES = ['<i1', '<i2', '<i4', '<i8']
+CODE_TYPES = ['<u1', '<u2', '<u4']
+
+
+def _smallest_type(minimum: int, maximum: int, types: list[str]) -> str:
+    for dtype in types:
+        info = np.iinfo(np.dtype(dtype))
+
+        if info.min <= minimum and maximum <= info.max:
+            return dtype
+
+    return types[-1]
+
+
+class ColumnarWriter:
+    """
+    Writer of a simple self-describing columnar file format. Rows are buffered and
+    written in row groups, where each column of a row group is stored as a single
+    typed array:
+    - Timestamps are stored as the first timestamp followed by the deltas between
+      consecutive timestamps, using the smallest integer type that fits the deltas.
+    - Strings are dictionary encoded, storing the distinct strings of the row group
+      along with an array of codes indexing them.
+    - Integers are stored using the smallest integer type that fits them, and other
+      numbers as 64-bit floats.
+    The file ends with a JSON footer describing the columns and the location and
+    encoding of each row group, followed by the length of the footer and a magic
+    number, which allows a reader to locate the footer.
+    """
+
+    def __init__(self, file: IO[bytes], row_group_size: int = ROW_GROUP_SIZE):
+        self.file: IO[bytes] = file
+        self.row_group_size: int = row_group_size
+        self.columns: list[dict] | None = None
+        self.row_groups: list[dict] = []
+        self.pending: dict[str, list] = dict()
+        self.pending_rows: int = 0
+        self.offset: int = file.write(MAGIC)
+
+    def __enter__(self) -> ColumnarWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _init_columns(self, names: Iterable[str]):
+        if self.columns is None:
+            self.columns = [{'name': name, 'type': None} for name in names]
+            self.pending = {column['name']: [] for column in self.columns}
+
+    def write_row(self, row: Record | dict[str, Any]):
+        """
+        Write a single row, such as a record returned by a viewer.
+        :param row: A record, or a dictionary mapping column names to values.
+        """
+        self._init_columns(row.keys())
+
+        for name, values in self.pending.items():
+            value = row[name]
+
+            if isinstance(value, datetime):
+                value = int(value.timestamp())
+
+            values.append(value)
+
+        self.pending_rows += 1
+        if self.pending_rows >= self.row_group_size:
+            self.flush()
+
+    def write_batch(self, batch: dict[str, np.ndarray]):
+        """
+        Write a batch of columns, such as a batch returned by
+        WorldCup98Viewer.read_batches.
+        :param batch: A dictionary mapping column names to arrays of values.
+        """
+        self._init_columns(batch.keys())
+        rows = len(next(iter(batch.values())))
+
+        for name, values in self.pending.items():
+            values.append(np.asarray(batch[name]))
+
+        self.pending_rows += rows
+        if self.pending_rows >= self.row_group_size:
+            self.flush()
+
+    def _to_array(self, values: list) -> np.ndarray:
+        if values and isinstance(values[0], np.ndarray):
+            return np.concatenate(values)
+
+        return np.array(values)
+
+    def _encode(self, column: dict, values: np.ndarray) -> tuple[dict, bytes]:
+        if column['type'] is None:
+            if column['name'] in TIMESTAMP_COLUMNS and values.dtype.kind in 'iu':
+                column['type'] = 'timestamp'
+            elif values.dtype.kind in 'iub':
+                column['type'] = 'int'
+            elif values.dtype.kind == 'f':
+                column['type'] = 'float'
+            else:
+                column['type'] = 'string'
+
+        column_type = column['type']
+
+        if column_type == 'timestamp':
+            values = values.astype(np.int64)
+            deltas = np.diff(values)
+            dtype = _smallest_type(
+                int(deltas.min(initial=0)),
+                int(deltas.max(initial=0)),
+                INTEGER_TYPES
+            )
+
+            meta = {
+                'encoding': 'delta',
+                'dtype': dtype,
+                'first': int(values[0])
+            }
+            return meta, deltas.astype(dtype).tobytes()
+
+        if column_type == 'string':
+            dictionary, codes = np.unique(values.astype(str), return_inverse=True)
+            dtype = _smallest_type(0, len(dictionary), CODE_TYPES)
+
+            meta = {
+                'encoding': 'dictionary',
+                'dtype': dtype,
+                'dictionary': dictionary.tolist()
+            }
+            return meta, codes.astype(dtype).tobytes()
+
+        if column_type == 'int':
+            dtype = _smallest_type(int(values.min()), int(values.max()), INTEGER_TYPES)
+        else:
+            dtype = '<f8'
+
+        return {'encoding': 'plain', 'dtype': dtype}, values.astype(dtype).tobytes()
+
+    def flush(self):
+        """
+        Write the buffered rows as a row group.
+        """
+        if self.pending_rows == 0:
+            return
+
+        row_group = {
+            'rows': self.pending_rows,
+            'offset': self.offset,
+            'columns': []
+        }
+
+        for column in self.columns:
+            values = self._to_array(self.pending[column['name']])
+            meta, data = self._encode(column, values)
+            meta['size'] = len(data)
+
+            row_group['columns'].append(meta)
+            self.offset += self.file.write(data)
+
+        self.row_groups.append(row_group)
+        self.pending = {name: [] for name in self.pending}
+        self.pending_rows = 0
+
+    def close(self):
+        """
+        Write any buffered rows and the footer of the file. The file itself is not
+        closed.
+        """
+        self.flush()
+
+        footer = json.dumps({
+            'version': VERSION,
+            'columns': self.columns or [],
+            'row_groups': self.row_groups
+        }).encode('utf-8')
+
+        self.file.write(footer)
+        self.file.write(struct.pack('<Q', len(footer)))
+        self.file.write(MAGIC)
+
+
+def read_footer(file: IO[bytes]) -> dict:
+    """
+    Read the footer of a columnar file.
+    :param file: The file to read the footer of.
+    :return: The footer, describing the columns and row groups of the file.
+    """
+    file.seek(-(8 + len(MAGIC)), 2)
+    length, = struct.unpack('<Q', file.read(8))
+
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('File is not a columnar file.')
+
+    file.seek(-(8 + len(MAGIC) + length), 2)
+    footer = json.loads(file.read(length))
+
+    if footer.get('version') != VERSION:
+        raise ValueError(f'Unsupported columnar file version {footer.get("version")}.')
+
+    return footer
+
+
+def _decode(meta: dict, data: bytes) -> np.ndarray:
+    values = np.frombuffer(data, dtype=meta['dtype'])
+
+    if meta['encoding'] == 'delta':
+        timestamps = np.empty(len(values) + 1, dtype=np.int64)
+        timestamps[0] = meta['first']
+        np.cumsum(values, out=timestamps[1:])
+        timestamps[1:] += meta['first']
+        return timestamps
+
+    if meta['encoding'] == 'dictionary':
+        return np.array(meta['dictionary'])[values]
+
+    return values
+
+
+def read_columnar(
+        path: str,
+        columns: list[str] | None = None
+) -> Iterable[dict[str, np.ndarray]]:
+    """
+    Read a columnar file, a row group at a time.
+    :param path: The path of the file to read.
+    :param columns: The names of the columns to read. If not specified, all
+    columns are read.
+    :return: A generator yielding a dictionary of column arrays per row group.
+    Timestamps are returned as integer epoch seconds.
+    """
+    with open(path, 'rb') as file:
+        footer = read_footer(file)
+        names = [column['name'] for column in footer['columns']]
+
+        for row_group in footer['row_groups']:
+            offset = row_group['offset']
+            batch = dict()
+
+            for name, meta in zip(names, row_group['columns']):
+                if columns is None or name in columns:
+                    file.seek(offset)
+                    batch[name] = _decode(meta, file.read(meta['size']))
+
+                offset += meta['size']
+
+            yield batch
+
+
+def load_columnar(
+        path: str,
+        columns: list[str] | None = None
+) -> dict[str, np.ndarray]:
+    """
+    Read a whole columnar file into memory.
+    :param path: The path of the file to read.
+    :param columns: The names of the columns to read. If not specified, all
+    columns are read.
+    :return: A dictionary mapping column names to arrays of all their values.
+    """
+    batches = list(read_columnar(path, columns))
+    if not batches:
+        return dict()
+
+    return {
+        name: np.concatenate([batch[name] for batch in batches])
+        for name in batches[0]
+    }
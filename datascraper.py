@@ -8,6 +8,7 @@ import clarknet.scraper
 import nasa.scraper
 import worldcup98.scraper
 from generic import DatasetType
+from stream_index import STORE_FORMATS
 
 SCRAPER_MAP = {
     DatasetType.WORLDCUP98: worldcup98.scraper.WorldCup98Scraper,
@@ -33,16 +34,43 @@ def parse_options():
 
     parser.add_argument(
         '--threads',
+        type=int,
         help='Number of threads to use for scraping/downloading',
         dest='thread_count',
         default=1
     )
 
+    parser.add_argument(
+        '--store',
+        choices=STORE_FORMATS,
+        help='The format to store downloaded gzip files in, which are indexed '
+             'while they are downloaded: as downloaded, re-encoded so that they '
+             'can be seeked by time, or decompressed',
+        dest='store_format',
+        default='gzip'
+    )
+
+    parser.add_argument(
+        '--convert',
+        help='Convert downloaded NASA or ClarkNet logs into compact binary stores, '
+             'which view.py reads instead of the logs',
+        action='store_true',
+        dest='convert'
+    )
+
     return parser.parse_args(sys.argv[1:])
 
 
-def scrape(mode: DatasetType, output_path: str, threads: int):
+def scrape(
+        mode: DatasetType,
+        output_path: str,
+        threads: int,
+        store_format: str = 'gzip',
+        convert: bool = False
+):
     scraper = SCRAPER_MAP[mode](output_path, threads)
+    scraper.store_format = store_format
+    scraper.convert = convert
     scraper.scrape()
 
 
@@ -51,7 +79,9 @@ def main():
     scrape(
         DatasetType.parse(options.dataset_type),
         options.output,
-        options.thread_count
+        options.thread_count,
+        options.store_format,
+        options.convert
     )
 
 
@@ -0,0 +1,392 @@
+import argparse
+import hashlib
+import os
+import random
+import re
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import downloader
+import generic
+from downloader import DownloadError, DownloadManifest
+
+RANGE_REGEX = re.compile(r'^bytes=(\d+)-$')
+
+
+class StandInServer:
+    """
+    A local server standing in for the servers of the datasets. It serves a single
+    file, and records the requests it receives. The first transfers of the file
+    can be dropped after half of the requested bytes are sent, to simulate
+    interrupted connections.
+    """
+
+    def __init__(self, data: bytes):
+        self.data: bytes = data
+        self.lock: threading.Lock = threading.Lock()
+        self.drops: int = 0
+        self.requests: list[int | None] = []
+        self.server: socketserver.TCPServer | None = None
+
+    def reset(self, drops: int = 0):
+        """
+        Forget the received requests.
+        :param drops: The number of following transfers to drop.
+        """
+        with self.lock:
+            self.drops = drops
+            self.requests = []
+
+    def record(self, start: int | None) -> bool:
+        """
+        Record a request of the file.
+        :param start: The offset the file is requested from, if any.
+        :return: Whether the transfer is dropped.
+        """
+        with self.lock:
+            self.requests.append(start)
+            drop = self.drops > 0
+            self.drops -= drop
+            return drop
+
+    def start(self):
+        self.server = self.create_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_server(self) -> socketserver.TCPServer:
+        raise NotImplementedError()
+
+    def get_url(self, name: str) -> str:
+        raise NotImplementedError()
+
+
+class HTTPStandInServer(StandInServer):
+    """
+    An HTTP server supporting range requests. If ignore_range is set, the whole
+    file is sent regardless of the requested range, as some servers do. If missing
+    is set, the file is not found.
+    """
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.ignore_range: bool = False
+        self.missing: bool = False
+
+    def create_server(self) -> socketserver.TCPServer:
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = RANGE_REGEX.match(self.headers.get('Range', ''))
+                start = int(match.group(1)) if match else None
+                drop = stand_in.record(start)
+                size = len(stand_in.data)
+
+                if stand_in.missing:
+                    self.send_error(404)
+                    return
+
+                if start is None or stand_in.ignore_range:
+                    start = 0
+                    self.send_response(200)
+                elif start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                else:
+                    self.send_response(206)
+                    self.send_header(
+                        'Content-Range',
+                        f'bytes {start}-{size - 1}/{size}'
+                    )
+
+                body = stand_in.data[start:]
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body[:len(body) // 2] if drop else body)
+
+            def log_message(self, *args):
+                pass
+
+        return ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+    def get_url(self, name: str) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}/{name}'
+
+
+class FTPStandInServer(StandInServer):
+    """
+    A minimal passive mode FTP server, supporting the commands used by the
+    downloader, including REST to restart a transfer at an offset.
+    """
+
+    def create_server(self) -> socketserver.TCPServer:
+        stand_in = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str):
+                self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+            def handle(self):
+                rest = 0
+                listener = None
+                self.reply('220 Stand-in')
+
+                while line := self.rfile.readline():
+                    command, _, argument = line.decode('ascii').strip().partition(' ')
+                    command = command.upper()
+
+                    if command == 'USER':
+                        self.reply('331 Password required')
+                    elif command == 'PASS':
+                        self.reply('230 Logged in')
+                    elif command == 'TYPE':
+                        self.reply('200 Type set')
+                    elif command == 'SIZE':
+                        self.reply(f'213 {len(stand_in.data)}')
+                    elif command == 'REST':
+                        rest = int(argument)
+                        self.reply(f'350 Restarting at {rest}')
+                    elif command == 'PASV':
+                        listener = socket.create_server(('127.0.0.1', 0))
+                        port = listener.getsockname()[1]
+                        self.reply(
+                            '227 Entering Passive Mode '
+                            f'(127,0,0,1,{port >> 8},{port & 255})'
+                        )
+                    elif command == 'RETR' and listener is not None:
+                        drop = stand_in.record(rest)
+                        body = stand_in.data[rest:]
+                        self.reply('150 Opening data connection')
+
+                        connection, _ = listener.accept()
+                        with connection:
+                            connection.sendall(body[:len(body) // 2] if drop else body)
+
+                        listener.close()
+                        listener = None
+                        rest = 0
+                        self.reply('426 Transfer aborted' if drop else
+                                   '226 Transfer complete')
+                    elif command == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Not implemented')
+
+        socketserver.ThreadingTCPServer.daemon_threads = True
+        return socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+
+    def get_url(self, name: str) -> str:
+        return f'ftp://127.0.0.1:{self.server.server_address[1]}/{name}'
+
+
+def check_download(
+        server: StandInServer,
+        directory: str,
+        name: str,
+        partial: bytes | None = None
+) -> tuple[bool, bool, list[int | None]]:
+    """
+    Download the file of a server, and check the downloaded file.
+    :param server: The server to download from.
+    :param directory: The directory to download to.
+    :param name: The name to download the file as.
+    :param partial: The contents of a partial download to resume, if any.
+    :return: Whether the file was downloaded, whether it and its manifest entry
+    are correct, and the offsets requested from the server.
+    """
+    destination = os.path.join(directory, name)
+    if partial is not None:
+        with open(os.path.join(directory, f'.{name}.download'), 'wb') as file:
+            file.write(partial)
+
+    manifest = DownloadManifest(directory)
+    downloaded = downloader.download_file(
+        server.get_url(name),
+        destination,
+        manifest
+    )
+
+    with open(destination, 'rb') as file:
+        data = file.read()
+
+    entry = DownloadManifest(directory).get(destination)
+    correct = data == server.data and entry is not None and \
+        entry['sha256'] == hashlib.sha256(server.data).hexdigest()
+
+    return downloaded, correct, server.requests
+
+
+def check_kept(url: str, directory: str, name: str) -> bool:
+    """
+    Download a file that exists but is not in the manifest, such as a file
+    downloaded before the manifest existed, from a URL the download fails from.
+    :param url: The URL to download from.
+    :param directory: The directory to download to.
+    :param name: The name to download the file as.
+    :return: Whether the download failed, and the existing file is still part of
+    the dataset with its contents intact.
+    """
+    destination = os.path.join(directory, name)
+    contents = b'existing contents'
+    with open(destination, 'wb') as file:
+        file.write(contents)
+
+    try:
+        downloader.download_file(url, destination, DownloadManifest(directory))
+        return False
+    except DownloadError:
+        pass
+
+    with open(destination, 'rb') as file:
+        kept = file.read() == contents
+
+    return kept and generic.get_files(directory) == [(destination, None)]
+
+
+def get_closed_port() -> int:
+    """
+    Get a local port that refuses connections.
+    """
+    with socket.create_server(('127.0.0.1', 0)) as listener:
+        return listener.getsockname()[1]
+
+
+def run_checks(size: int) -> list[tuple[str, bool]]:
+    """
+    Run each check against fresh stand-in servers in a temporary directory.
+    :param size: The size of the served file.
+    :return: The name of each check, and whether it passed.
+    """
+    data = random.Random(0).randbytes(size)
+    http = HTTPStandInServer(data)
+    ftp = FTPStandInServer(data)
+    http.start()
+    ftp.start()
+
+    def resume_http(directory: str) -> bool:
+        http.reset(drops=1)
+        downloaded, correct, requests = check_download(http, directory, 'http')
+        return downloaded and correct and requests == [None, size // 2]
+
+    def resume_at_end(directory: str) -> bool:
+        http.reset()
+        downloaded, correct, requests = check_download(
+            http, directory, 'complete', partial=data
+        )
+        return downloaded and correct and requests == [size]
+
+    def ignored_range(directory: str) -> bool:
+        http.reset()
+        http.ignore_range = True
+        try:
+            downloaded, correct, requests = check_download(
+                http, directory, 'ignored', partial=bytes(size // 3)
+            )
+        finally:
+            http.ignore_range = False
+
+        return downloaded and correct and requests == [size // 3]
+
+    def resume_ftp(directory: str) -> bool:
+        ftp.reset(drops=1)
+        downloaded, correct, requests = check_download(ftp, directory, 'ftp')
+        return downloaded and correct and requests == [0, size // 2]
+
+    def skip_verified(directory: str) -> bool:
+        http.reset()
+        ftp.reset()
+        check_download(http, directory, 'http')
+        check_download(ftp, directory, 'ftp')
+
+        http.reset()
+        ftp.reset()
+        http_downloaded, http_correct, _ = check_download(http, directory, 'http')
+        ftp_downloaded, ftp_correct, _ = check_download(ftp, directory, 'ftp')
+        return not http_downloaded and not ftp_downloaded and http_correct and \
+            ftp_correct and not http.requests and not ftp.requests
+
+    def kept_refused(directory: str) -> bool:
+        url = f'http://127.0.0.1:{get_closed_port()}/refused'
+        return check_kept(url, directory, 'refused')
+
+    def kept_missing(directory: str) -> bool:
+        http.reset()
+        http.missing = True
+        try:
+            return check_kept(http.get_url('missing'), directory, 'missing')
+        finally:
+            http.missing = False
+
+    checks: list[tuple[str, Callable[[str], bool]]] = [
+        ('HTTP resume with Range', resume_http),
+        ('HTTP resume of a complete file (416)', resume_at_end),
+        ('HTTP server ignoring Range', ignored_range),
+        ('FTP resume with REST', resume_ftp),
+        ('Skip files verified by the manifest', skip_verified),
+        ('Keep an existing file when the connection is refused', kept_refused),
+        ('Keep an existing file when the server responds 404', kept_missing)
+    ]
+
+    results = []
+    try:
+        for name, check in checks:
+            with tempfile.TemporaryDirectory() as directory:
+                try:
+                    passed = check(directory)
+                except Exception as error:
+                    sys.stderr.write(f'{name}: {error}\n')
+                    passed = False
+
+            results.append((name, passed))
+    finally:
+        http.stop()
+        ftp.stop()
+
+    return results
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(
+        description='Check the downloader against local stand-in HTTP and FTP '
+                    'servers that drop connections mid-transfer.'
+    )
+
+    parser.add_argument(
+        '--size',
+        help='Size of the served file in bytes',
+        type=int,
+        dest='size',
+        default=1 << 20
+    )
+
+    return parser.parse_args(sys.argv[1:])
+
+
+def main():
+    options = parse_options()
+
+    # Retries of dropped transfers are not delayed
+    downloader.RETRY_DELAY = 0
+
+    results = run_checks(options.size)
+    for name, passed in results:
+        print(f'{"PASS" if passed else "FAIL"}  {name}')
+
+    sys.exit(0 if all(passed for _, passed in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
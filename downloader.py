@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import ftplib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import IO
+from urllib.error import HTTPError
+from urllib.parse import urlparse, unquote
+from urllib.request import Request, urlopen
+
+# The number of bytes read and written at a time
+CHUNK_SIZE = 1 << 16
+
+# The number of times a download is attempted before giving up
+ATTEMPTS = 5
+
+# The delay before the first retry of a download in seconds, doubled for every
+# following retry
+RETRY_DELAY = 1.
+
+# The timeout of network operations in seconds
+TIMEOUT = 60
+
+CONTENT_RANGE_REGEX = re.compile(r'^bytes\s+(?:\d+-\d+|\*)/(\d+)$')
+
+
+class DownloadError(OSError):
+    pass
+
+
+class DownloadManifest:
+    """
+    A manifest of the files downloaded to a directory, stored in a hidden JSON file
+    in the directory. For each file, it stores the SHA-256 checksum of the
+    downloaded contents, and the size and modification time of the stored file
+    when it was verified. A file whose size and modification time have not changed
+    since is considered verified without reading it or contacting the server.
+    """
+
+    FILE_NAME = '.downloads.json'
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        self.path: str = os.path.join(directory, self.FILE_NAME)
+        self.lock: threading.Lock = threading.Lock()
+        self.files: dict[str, dict] = dict()
+
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+
+            if data.get('version') == self.VERSION:
+                self.files = data.get('files', dict())
+        except (OSError, ValueError):
+            pass
+
+    def get(self, file_path: str) -> dict | None:
+        with self.lock:
+            return self.files.get(os.path.basename(file_path))
+
+    def is_verified(self, file_path: str) -> bool:
+        """
+        Check whether a file is complete, according to the manifest.
+        :param file_path: The path of the downloaded file.
+        :return: Whether the file has been verified, and has not changed since.
+        """
+        entry = self.get(file_path)
+        if entry is None:
+            return False
+
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+
+        return stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime']
+
+    def put(self, file_path: str, size: int, sha256: str):
+        """
+        Add a verified file to the manifest, and save the manifest.
+        :param file_path: The path of the downloaded file.
+        :param size: The size of the file.
+        :param sha256: The hex digest of the SHA-256 checksum of the downloaded
+        contents.
+        """
+        with self.lock:
+            self.files[os.path.basename(file_path)] = {
+                'size': size,
+                'sha256': sha256,
+                'mtime': os.stat(file_path).st_mtime_ns
+            }
+
+            self.save()
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'version': self.VERSION, 'files': self.files}, file, indent=1)
+
+        os.replace(temp_path, self.path)
+
+
+class DownloadSink:
+    """
+    Receives the contents of a file while it is downloaded, so that it can be
+    processed in the same pass, and stores the completed download. This base
+    class stores the file as it was downloaded.
+    """
+
+    def get_path(self, destination: str) -> str:
+        """
+        Get the path of the file stored for a download, which is the file the
+        manifest verifies.
+        :param destination: The path the file is downloaded to.
+        :return: The path of the stored file.
+        """
+        return destination
+
+    def write(self, data: bytes):
+        """
+        Receive the next downloaded data. When a partial download is resumed, the
+        data downloaded before is received first.
+        """
+        pass
+
+    def truncate(self):
+        """
+        Discard all data received so far, since the download restarts from the
+        beginning.
+        """
+        pass
+
+    def finish(self, temp_path: str, destination: str):
+        """
+        Store a completed download.
+        :param temp_path: The path of the downloaded file.
+        :param destination: The path the file is downloaded to.
+        """
+        os.replace(temp_path, destination)
+
+    def abort(self):
+        """
+        Discard any output, since the download failed.
+        """
+        pass
+
+
+class _HashingWriter:
+    """
+    Writes to a file and a sink while computing the checksum of everything written
+    to it, including the part of the file that existed before.
+    """
+
+    def __init__(self, file: IO[bytes], sink: DownloadSink):
+        self.file: IO[bytes] = file
+        self.sink: DownloadSink = sink
+        self.hash = hashlib.sha256()
+        self.size: int = 0
+
+        # Whether the contents that existed before have been discarded
+        self.truncated: bool = False
+
+        file.seek(0)
+        while chunk := file.read(CHUNK_SIZE):
+            self.hash.update(chunk)
+            self.size += len(chunk)
+            sink.write(chunk)
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+        self.sink.write(data)
+
+    def truncate(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.truncated = True
+        self.sink.truncate()
+
+
+def _fetch_http(url: str, writer: _HashingWriter) -> int | None:
+    """
+    Download the rest of a file over HTTP, requesting the part after what has
+    already been written with a range request.
+    :return: The size of the file on the server, if known.
+    """
+    headers = {'Range': f'bytes={writer.size}-'} if writer.size else dict()
+
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=TIMEOUT)
+    except HTTPError as error:
+        # The range starts at or after the end of the file
+        match = CONTENT_RANGE_REGEX.match(error.headers.get('Content-Range', ''))
+        if error.code == 416 and match:
+            return int(match.group(1))
+
+        raise
+
+    with response:
+        match = CONTENT_RANGE_REGEX.match(response.headers.get('Content-Range', ''))
+
+        if response.status == 206 and match:
+            size = int(match.group(1))
+        else:
+            # The server ignored the range, and sends the whole file
+            writer.truncate()
+            length = response.headers.get('Content-Length')
+            size = int(length) if length is not None else None
+
+        while chunk := response.read(CHUNK_SIZE):
+            writer.write(chunk)
+
+    return size
+
+
+def _fetch_ftp(url: str, writer: _HashingWriter) -> int | None:
+    """
+    Download the rest of a file over FTP, restarting the transfer after what has
+    already been written.
+    :return: The size of the file on the server, if known.
+    """
+    parsed = urlparse(url)
+    path = unquote(parsed.path)
+
+    with ftplib.FTP(timeout=TIMEOUT) as ftp:
+        ftp.connect(parsed.hostname, parsed.port or 21)
+        ftp.login(unquote(parsed.username or 'anonymous'),
+                  unquote(parsed.password or ''))
+        ftp.voidcmd('TYPE I')
+
+        try:
+            size = ftp.size(path)
+        except ftplib.error_perm:
+            size = None
+
+        if size is not None and writer.size >= size:
+            return size
+
+        ftp.retrbinary(
+            f'RETR {path}',
+            writer.write,
+            blocksize=CHUNK_SIZE,
+            rest=writer.size or None
+        )
+
+    return size
+
+
+def download_file(
+        url: str,
+        destination: str,
+        manifest: DownloadManifest | None = None,
+        attempts: int = ATTEMPTS,
+        sink: DownloadSink | None = None
+) -> bool:
+    """
+    Download a file over HTTP or FTP, resuming partial downloads. The file is
+    downloaded to a hidden temporary file next to the destination, which is kept
+    when the download fails, so the next attempt, or the next run, continues where
+    it stopped. The size of the downloaded file is checked against the size of
+    the file on the server before it is moved to the destination.
+    :param url: The URL of the file.
+    :param destination: The path to download the file to.
+    :param manifest: The manifest of the destination directory. Files verified by
+    the manifest are skipped without contacting the server, and downloaded files
+    are added to it. An existing file that is not in the manifest, such as a
+    truncated file from an earlier run, is resumed and verified.
+    :param attempts: The number of times to attempt the download.
+    :param sink: A sink receiving the downloaded data and storing the completed
+    file, for example in another format. The manifest verifies the stored file.
+    :return: Whether the file was downloaded, as opposed to already verified.
+    """
+    sink = sink or DownloadSink()
+    path = sink.get_path(destination)
+
+    if manifest is not None and manifest.is_verified(path):
+        return False
+
+    scheme = urlparse(url).scheme.lower()
+    if scheme in ('http', 'https'):
+        fetch = _fetch_http
+    elif scheme == 'ftp':
+        fetch = _fetch_ftp
+    else:
+        raise ValueError(f'Cannot download {url}, unsupported scheme {scheme}.')
+
+    directory, name = os.path.split(destination)
+    temp_path = os.path.join(directory, f'.{name}.download')
+
+    # A file that exists but is not verified, such as a file downloaded before the
+    # manifest existed, is resumed. Until the download completes, it is hidden as
+    # the temporary file, so it is moved back if the download fails.
+    existed = os.path.exists(destination)
+    if existed:
+        os.replace(destination, temp_path)
+
+    writer = None
+    try:
+        last_error = None
+        with open(temp_path, 'ab+') as file:
+            writer = _HashingWriter(file, sink)
+
+            for attempt in range(attempts):
+                if attempt > 0:
+                    time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+                try:
+                    size = fetch(url, writer)
+                except HTTPError as error:
+                    last_error = error
+
+                    # Client errors, such as a missing file, are not retried
+                    if 400 <= error.code < 500:
+                        break
+
+                    continue
+                except ftplib.error_perm as error:
+                    last_error = error
+                    break
+                except (OSError, EOFError, ftplib.Error) as error:
+                    last_error = error
+                    continue
+                finally:
+                    file.flush()
+
+                if size is None or writer.size == size:
+                    last_error = None
+                    break
+
+                last_error = DownloadError(
+                    f'Downloaded {writer.size} of {size} bytes.'
+                )
+
+                # More than the whole file cannot be resumed
+                if writer.size > size:
+                    writer.truncate()
+
+            sha256 = writer.hash.hexdigest()
+
+        if last_error is not None:
+            raise DownloadError(
+                f'Failed to download {url}: {last_error}'
+            ) from last_error
+
+        sink.finish(temp_path, destination)
+    except BaseException:
+        sink.abort()
+
+        # The existing file is kept as long as its contents have not been
+        # discarded, and the next run resumes it
+        if os.path.exists(temp_path):
+            if existed and (writer is None or not writer.truncated):
+                os.replace(temp_path, destination)
+            elif os.path.getsize(temp_path) == 0:
+                os.remove(temp_path)
+
+        raise
+
+    if manifest is not None:
+        manifest.put(path, os.path.getsize(path), sha256)
+
+    return True
@@ -3,10 +3,12 @@ from __future__ import annotations
 import gzip
 import os
 import shutil
+import threading
 import zipfile
+from collections import OrderedDict
 from datetime import timedelta
 from enum import Enum
-from typing import Tuple
+from typing import Tuple, IO
 
 
 def get_archive_format(file_path: str) -> str | None:
@@ -21,13 +23,168 @@ def get_archive_format(file_path: str) -> str | None:
     return ext if ext in formats else None
 
 
+class _GzipMemberFile(gzip.GzipFile):
+    """
+    A gzip file that is read from a member boundary within an underlying file, and
+    that closes the underlying file when closed.
+    """
+
+    def __init__(self, fileobj: IO[bytes]):
+        super().__init__(fileobj=fileobj, mode='rb')
+        self.source: IO[bytes] = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+class ArchivePool:
+    """
+    A pool of open zip archives, shared by everything reading members of them, so
+    that the central directory of an archive is parsed once instead of once per
+    opened member. The least recently used archive is closed when more than
+    max_size archives are open. Closing an archive that still has open members
+    only releases it, and the archive is closed when its last member is closed.
+
+    The pool is safe to use from multiple threads. A forked process, such as a
+    decoding worker, opens archives of its own, since the descriptors it inherits
+    share their file positions with the parent process.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size: int = max_size
+        self.lock: threading.Lock = threading.Lock()
+        self.archives: OrderedDict[str, Tuple[zipfile.ZipFile, Tuple[int, int]]] = \
+            OrderedDict()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """
+        Forget the archives inherited from the parent process, without closing
+        them, since members opened before the fork may still use them.
+        """
+        self.lock = threading.Lock()
+        self.archives = OrderedDict()
+
+    def get(self, archive: str) -> zipfile.ZipFile:
+        """
+        Get the open zip archive at a path, opening it if it is not open, or if the
+        file has changed since it was opened.
+        :param archive: The path of the zip archive.
+        :return: The open archive, which must not be closed by the caller.
+        """
+        with self.lock:
+            return self._get(archive)
+
+    def open(self, archive: str, file_name: str) -> IO[bytes]:
+        """
+        Open a member of a zip archive.
+        :param archive: The path of the zip archive.
+        :param file_name: The member to open.
+        :return: The opened member, which can be read while other members of the
+        archive are read, and closed without closing the archive.
+        """
+        # The member is opened before another thread can evict the archive
+        with self.lock:
+            return self._get(archive).open(file_name)
+
+    def _get(self, archive: str) -> zipfile.ZipFile:
+        path = os.path.abspath(archive)
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+
+        cached = self.archives.get(path)
+        if cached is not None and cached[1] == stamp:
+            self.archives.move_to_end(path)
+            return cached[0]
+
+        if cached is not None:
+            del self.archives[path]
+            cached[0].close()
+
+        file = zipfile.ZipFile(path, 'r')
+        self.archives[path] = (file, stamp)
+
+        while len(self.archives) > self.max_size:
+            _, (evicted, _) = self.archives.popitem(last=False)
+            evicted.close()
+
+        return file
+
+    def close(self):
+        """
+        Close all open archives. Archives are opened again when they are used.
+        """
+        with self.lock:
+            for file, _ in self.archives.values():
+                file.close()
+
+            self.archives.clear()
+
+
+# The archives opened by open_file, open_compressed and get_files
+archives: ArchivePool = ArchivePool()
+
+
+def close_archives():
+    """
+    Close the zip archives kept open for reading. See ArchivePool.
+    """
+    archives.close()
+
+
+def is_gzip(archive: str, file_name: str | None = None) -> bool:
+    ext = get_archive_format(archive)
+
+    if ext == '.zip':
+        return file_name is not None and get_archive_format(file_name) == '.gz'
+
+    return ext == '.gz'
+
+
+def open_compressed(archive: str, file_name: str | None = None) -> IO[bytes]:
+    """
+    Open the compressed stream of a gzip file, or of a gzip file within a zip
+    archive, without decompressing it.
+    :param archive: The gzip file or zip archive to open.
+    :param file_name: The gzip file within the zip archive, if any.
+    :return: The compressed stream.
+    """
+    if not is_gzip(archive, file_name):
+        raise ValueError('File is not a gzip file.')
+
+    if get_archive_format(archive) == '.zip':
+        return archives.open(archive, file_name)
+
+    return open(archive, 'rb')
+
+
 def open_file(
         archive: str,
         file_name: str | None = None,
-        read_flags: str | None = None
+        read_flags: str | None = None,
+        offset: int = 0
 ):
+    """
+    Open a file for reading, decompressing it if necessary.
+    :param archive: The file or archive to open.
+    :param file_name: The file within the archive, if the archive is a zip file.
+    :param read_flags: The flags to open the file with.
+    :param offset: For gzip files, the compressed offset of the gzip member to
+    start decompressing from, such as the offset of a GzipCheckpoint.
+    :return: The opened file.
+    """
     ext = get_archive_format(archive)
 
+    if offset and is_gzip(archive, file_name):
+        file = open_compressed(archive, file_name)
+        file.seek(offset)
+        return _GzipMemberFile(file)
+
     if not ext:
         return open(archive, read_flags or 'r')
     if ext == '.gz':
@@ -36,10 +193,11 @@ def open_file(
         if file_name is None:
             raise ValueError('No sub file specified')
 
-        archive = zipfile.ZipFile(archive, read_flags or 'r')
-        file = archive.open(file_name)
+        file = archives.open(archive, file_name)
 
-        return gzip.open(file, read_flags or 'rb') \
+        # Unlike gzip.open, the member file is closed with the gzip file, which
+        # releases the archive
+        return _GzipMemberFile(file) \
             if get_archive_format(file_name) == '.gz' else \
             file
     else:
@@ -80,7 +238,12 @@ def parse_duration(duration: str) -> timedelta:
 def get_files(file_path: str, exclude_empty: bool = True) -> list[
     Tuple[str, str | None]]:
     if os.path.isdir(file_path):
-        dir_files = [os.path.join(file_path, path) for path in os.listdir(file_path)]
+        # Hidden files, such as the time index of the directory, are not data files
+        dir_files = [
+            os.path.join(file_path, path)
+            for path in os.listdir(file_path)
+            if not path.startswith('.')
+        ]
         return [
             (path, None) \
             for path in dir_files \
@@ -89,12 +252,11 @@ def get_files(file_path: str, exclude_empty: bool = True) -> list[
 
     _, extension = os.path.splitext(file_path)
     if extension.lower() == '.zip':
-        with zipfile.ZipFile(file_path) as file:
-            return [
-                (file_path, part.filename) \
-                for part in file.filelist \
-                if not exclude_empty or part.file_size > 0
-            ]
+        return [
+            (file_path, part.filename) \
+            for part in archives.get(file_path).filelist \
+            if not exclude_empty or part.file_size > 0
+        ]
 
     if extension.lower() == '.gz':
         return [(file_path, '')]
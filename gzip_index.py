@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import sys
+import zlib
+from datetime import datetime
+from typing import IO, Iterable, Callable
+
+from generic import DatasetType
+
+# The default number of uncompressed bytes between checkpoints
+CHECKPOINT_SPACING = 4 << 20
+
+# The number of bytes of decompressed data to search for the first record after a
+# checkpoint
+HEAD_SIZE = 64 << 10
+
+RECORD_SIZES = {
+    DatasetType.WORLDCUP98: 20
+}
+
+
+class GzipCheckpoint:
+    """
+    A point within a gzip file where decompression can be started. Since Python's
+    zlib bindings cannot restore a decompressor in the middle of a deflate stream,
+    checkpoints are placed where a new gzip member starts, which requires no
+    decompressor state at all. Single-member files can be split into several
+    members with reblock_file to make them seekable this way.
+    """
+
+    def __init__(
+            self,
+            compressed_offset: int,
+            uncompressed_offset: int,
+            skip: int,
+            time: datetime
+    ):
+        """
+        Constructs a new checkpoint.
+        :param compressed_offset: The offset of the gzip member in the compressed
+        file.
+        :param uncompressed_offset: The offset of the start of the member in the
+        decompressed data.
+        :param skip: The number of decompressed bytes to skip after the start of
+        the member to reach the start of the first record.
+        :param time: The time of the first record after the checkpoint.
+        """
+        self.compressed_offset: int = compressed_offset
+        self.uncompressed_offset: int = uncompressed_offset
+        self.skip: int = skip
+        self.time: datetime = time
+
+    def to_list(self) -> list:
+        return [
+            self.compressed_offset,
+            self.uncompressed_offset,
+            self.skip,
+            self.time.isoformat()
+        ]
+
+    @staticmethod
+    def from_list(data: list) -> GzipCheckpoint:
+        compressed_offset, uncompressed_offset, skip, time = data
+        return GzipCheckpoint(
+            compressed_offset,
+            uncompressed_offset,
+            skip,
+            datetime.fromisoformat(time)
+        )
+
+
+def find_checkpoint(
+        checkpoints: list[GzipCheckpoint] | None,
+        time: datetime | None
+) -> GzipCheckpoint | None:
+    """
+    Find the last checkpoint before a specified time, i.e. the checkpoint to start
+    decompressing from to read all records at or after the time.
+    :param checkpoints: The checkpoints of a file, in order.
+    :param time: The time to find a checkpoint for.
+    :return: The checkpoint, or None if decompression should start from the
+    beginning of the file.
+    """
+    if not checkpoints or time is None:
+        return None
+
+    found = None
+    for checkpoint in checkpoints:
+        # Records with the same time as the checkpoint might be located before it,
+        # so only checkpoints strictly before the time can be used.
+        if checkpoint.time >= time:
+            break
+
+        found = checkpoint
+
+    return found
+
+
+class MemberDecompressor:
+    """
+    Decompresses a gzip stream that is passed to it in chunks, such as while it is
+    downloaded, while keeping track of where its members start.
+    """
+
+    def __init__(self):
+        self.position: int = 0
+        self.member_start: int = 0
+        self.uncompressed: int = 0
+        self.decompressor = zlib.decompressobj(wbits=31)
+
+    def decompress(self, chunk: bytes) -> list[tuple[int, int, bytes]]:
+        """
+        Decompress the next chunk of the stream.
+        :param chunk: The compressed data following the previous chunk.
+        :return: A list of tuples of the compressed offset of the member the data
+        belongs to, the uncompressed offset of the data, and the data.
+        """
+        result = []
+        self.position += len(chunk)
+
+        while chunk:
+            data = self.decompressor.decompress(chunk)
+
+            if data:
+                result.append((self.member_start, self.uncompressed, data))
+                self.uncompressed += len(data)
+
+            if not self.decompressor.eof:
+                break
+
+            # The member has ended, and any remaining data belongs to the next one.
+            # Like the gzip module, trailing zero padding is ignored.
+            chunk = self.decompressor.unused_data
+            self.member_start = self.position - len(chunk)
+            self.decompressor = zlib.decompressobj(wbits=31)
+
+            if not chunk.strip(b'\x00'):
+                chunk = b''
+
+        return result
+
+    def finish(self):
+        """
+        Check that the stream has ended at the end of a member.
+        """
+        if not self.decompressor.eof and self.position > self.member_start:
+            raise EOFError('Compressed file ended before the end-of-stream marker '
+                           'was reached')
+
+
+def read_members(
+        file: IO[bytes],
+        chunk_size: int = 1 << 20
+) -> Iterable[tuple[int, int, bytes]]:
+    """
+    Decompress a gzip stream while keeping track of where its members start.
+    :param file: The compressed stream.
+    :param chunk_size: The number of compressed bytes to read at a time.
+    :return: A generator yielding tuples of the compressed offset of the member
+    the data belongs to, the uncompressed offset of the data, and the data.
+    """
+    decompressor = MemberDecompressor()
+
+    while chunk := file.read(chunk_size):
+        yield from decompressor.decompress(chunk)
+
+    decompressor.finish()
+
+
+class CheckpointBuilder:
+    """
+    Creates checkpoints at the starts of the members of a gzip stream, at most one
+    per spacing bytes of decompressed data, from the decompressed data of the
+    stream passed to it in order.
+    """
+
+    def __init__(
+            self,
+            locate: Callable[[bytes, int, bytes], tuple[int, datetime] | None],
+            spacing: int = CHECKPOINT_SPACING
+    ):
+        """
+        Constructs a new checkpoint builder.
+        :param locate: A function receiving the first decompressed bytes of a
+        member, the uncompressed offset of the member and the byte preceding it (or
+        an empty bytes object at the start of the file). It should return the
+        number of bytes to skip to reach the first record of the member along with
+        the time of the record, or None if no record could be found.
+        :param spacing: The minimum number of decompressed bytes between
+        checkpoints.
+        """
+        self.locate: Callable[[bytes, int, bytes], tuple[int, datetime] | None] = \
+            locate
+        self.spacing: int = spacing
+        self.checkpoints: list[GzipCheckpoint] = []
+        self.current_member: int | None = None
+        self.previous: bytes = b''
+        self.pending: tuple[int, int, bytes] | None = None
+        self.head: bytes = b''
+
+    def add(self, member_start: int, offset: int, data: bytes):
+        """
+        Add the next decompressed data of the stream, as returned by read_members.
+        :param member_start: The compressed offset of the member of the data.
+        :param offset: The uncompressed offset of the data.
+        :param data: The decompressed data.
+        """
+        # Only the start of a member can be a checkpoint
+        if member_start != self.current_member:
+            self.current_member = member_start
+            self.pending = None
+
+            if not self.checkpoints or \
+                    offset - self.checkpoints[-1].uncompressed_offset >= self.spacing:
+                self.pending = (member_start, offset, self.previous)
+                self.head = b''
+
+        if self.pending is not None:
+            self.head += data
+            located = self.locate(self.head, self.pending[1], self.pending[2])
+
+            if located is not None:
+                skip, time = located
+                self.checkpoints.append(
+                    GzipCheckpoint(self.pending[0], self.pending[1], skip, time)
+                )
+                self.pending = None
+            elif len(self.head) >= HEAD_SIZE:
+                self.pending = None
+
+        self.previous = data[-1:]
+
+
+def build_checkpoints(
+        file: IO[bytes],
+        locate: Callable[[bytes, int, bytes], tuple[int, datetime] | None],
+        on_data: Callable[[bytes], None] | None = None,
+        spacing: int = CHECKPOINT_SPACING
+) -> list[GzipCheckpoint]:
+    """
+    Decompress a whole gzip stream and create checkpoints at the starts of its
+    members, at most one per spacing bytes of decompressed data.
+    :param file: The compressed stream.
+    :param locate: A function locating the first record of a member, see
+    CheckpointBuilder.
+    :param on_data: A function receiving all decompressed data, in order. Allows
+    the caller to inspect the data without decompressing it again.
+    :param spacing: The minimum number of decompressed bytes between checkpoints.
+    :return: A list of the checkpoints, in order.
+    """
+    builder = CheckpointBuilder(locate, spacing)
+
+    for member_start, offset, data in read_members(file):
+        if on_data is not None:
+            on_data(data)
+
+        builder.add(member_start, offset, data)
+
+    return builder.checkpoints
+
+
+class MemberWriter:
+    """
+    Writes data as a sequence of independent gzip members of roughly block_size
+    decompressed bytes each, which together form a valid gzip file that can be
+    checkpointed at each member. Members are split at record boundaries, or after
+    newlines if no record size is specified.
+    """
+
+    def __init__(
+            self,
+            file: IO[bytes],
+            block_size: int = CHECKPOINT_SPACING,
+            record_size: int | None = None,
+            on_member: Callable[[int, int, bytes], None] | None = None
+    ):
+        """
+        Constructs a new member writer.
+        :param file: The file to write the compressed members to.
+        :param block_size: The number of decompressed bytes per member.
+        :param record_size: The size of fixed-size records, or None for line-based
+        files.
+        :param on_member: A function receiving the compressed offset, the
+        uncompressed offset and the decompressed data of every written member, as
+        the arguments of CheckpointBuilder.add.
+        """
+        self.file: IO[bytes] = file
+        self.block_size: int = block_size
+        self.record_size: int | None = record_size
+        self.on_member: Callable[[int, int, bytes], None] | None = on_member
+        self.buffer: bytearray = bytearray()
+        self.compressed_offset: int = 0
+        self.uncompressed_offset: int = 0
+
+    def write(self, data: bytes):
+        self.buffer.extend(data)
+
+        if len(self.buffer) < self.block_size:
+            return
+
+        cut = self._split(self.buffer) or len(self.buffer)
+        self._write_member(bytes(self.buffer[:cut]))
+        del self.buffer[:cut]
+
+    def finish(self):
+        """
+        Write the remaining data as the last member. The file is not closed.
+        """
+        if self.buffer:
+            self._write_member(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _split(self, data: bytearray) -> int:
+        if self.record_size is not None:
+            return len(data) - len(data) % self.record_size
+
+        return data.rfind(b'\n') + 1
+
+    def _write_member(self, data: bytes):
+        member = gzip.compress(data, mtime=0)
+        self.file.write(member)
+
+        if self.on_member is not None:
+            self.on_member(self.compressed_offset, self.uncompressed_offset, data)
+
+        self.compressed_offset += len(member)
+        self.uncompressed_offset += len(data)
+
+
+def reblock_file(
+        file_path: str,
+        block_size: int = CHECKPOINT_SPACING,
+        record_size: int | None = None
+):
+    """
+    Rewrite a gzip file as a sequence of independent gzip members of roughly
+    block_size decompressed bytes each. The result is still a valid gzip file with
+    the same decompressed contents, but can be checkpointed at each member.
+    Members are split at record boundaries, or after newlines if no record size
+    is specified.
+    :param file_path: The gzip file to rewrite.
+    :param block_size: The number of decompressed bytes per member.
+    :param record_size: The size of fixed-size records, or None for line-based
+    files.
+    """
+    temp_path = file_path + '.reblock'
+
+    with gzip.open(file_path, 'rb') as source, open(temp_path, 'wb') as target:
+        writer = MemberWriter(target, block_size, record_size)
+
+        while data := source.read(block_size):
+            writer.write(data)
+
+        writer.finish()
+
+    os.replace(temp_path, file_path)
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(
+        description='Split gzip files into independent members so that they can '
+                    'be seeked by time.'
+    )
+
+    parser.add_argument(
+        '--dataset',
+        choices=DatasetType.get_option_names(),
+        help='The type of dataset the files belong to',
+        dest='dataset'
+    )
+
+    parser.add_argument(
+        '--input',
+        help='The gzip files to rewrite',
+        nargs='+',
+        dest='input'
+    )
+
+    parser.add_argument(
+        '--block-size',
+        help='Decompressed size of each member in megabytes',
+        type=int,
+        dest='block_size',
+        default=CHECKPOINT_SPACING >> 20
+    )
+
+    return parser.parse_args(sys.argv[1:])
+
+
+def main():
+    options = parse_options()
+    record_size = RECORD_SIZES.get(DatasetType.parse(options.dataset))
+
+    for file_path in options.input:
+        reblock_file(file_path, options.block_size << 20, record_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, tzinfo
+from typing import IO, Any, Iterable
+
+import numpy as np
+
+from record import Record
+
+# The metrics of each bin, in the order of the columns of Histogram.bins
+METRICS = [
+    'requests',
+    'bytes',
+    'status_1xx',
+    'status_2xx',
+    'status_3xx',
+    'status_4xx',
+    'status_5xx'
+]
+
+# Names of the status code column used by the different viewers
+STATUS_COLUMNS = ['status', 'code']
+
+# The number of records gathered from a stream of records before binning them
+BATCH_SIZE = 1 << 16
+
+
+class Histogram:
+    """
+    Streaming aggregation of records into fixed time intervals. Each bin holds the
+    number of requests, the number of bytes and the number of requests per status
+    class of its interval. Records are binned a batch at a time using bincount,
+    and only the bins themselves are kept in memory, so a stream of any length can
+    be aggregated in a single pass. Bins are aligned to multiples of the interval
+    since the start time, or since the epoch if no start time is given.
+    """
+
+    def __init__(
+            self,
+            interval: timedelta,
+            start: datetime | None = None,
+            stop: datetime | None = None
+    ):
+        """
+        Constructs a new, empty histogram.
+        :param interval: The length of the interval of each bin. Must be a whole
+        number of seconds.
+        :param start: The start of the first bin. If specified along with the stop
+        time, the histogram covers the whole time range, even if it contains no
+        records.
+        :param stop: The end of the last bin.
+        """
+        self.interval: int = int(interval.total_seconds())
+        if self.interval < 1 or self.interval != interval.total_seconds():
+            raise ValueError('Interval must be a positive whole number of seconds.')
+
+        self.origin: int = 0 if start is None else int(start.timestamp())
+        self.tzinfo: tzinfo | None = None if start is None else start.tzinfo
+
+        # The bin number of the first row of bins, and the range of bin numbers
+        # that have been used
+        self.offset: int = 0
+        self.low: int | None = None
+        self.high: int | None = None
+        self.bins: np.ndarray = np.zeros((0, len(METRICS)), dtype=np.int64)
+
+        if start is not None and stop is not None:
+            self._reserve(0, (int(stop.timestamp()) - self.origin - 1) // self.interval)
+
+    def _reserve(self, low: int, high: int):
+        """
+        Make sure bins low to high exist, growing the bins to at least twice their
+        size when they do not.
+        """
+        if self.low is None:
+            self.offset = low
+            self.low = low
+            self.high = high
+            self.bins = np.zeros((high - low + 1, len(METRICS)), dtype=np.int64)
+            return
+
+        self.low = min(self.low, low)
+        self.high = max(self.high, high)
+
+        capacity = len(self.bins)
+        if self.offset <= low and high < self.offset + capacity:
+            return
+
+        first = min(self.offset, self.low)
+        last = max(self.offset + capacity - 1, self.high)
+        size = max(2 * capacity, last - first + 1)
+        offset = first if low >= self.offset else last + 1 - size
+        bins = np.zeros((size, len(METRICS)), dtype=np.int64)
+
+        start = self.offset - offset
+        bins[start:start + capacity] = self.bins
+        self.offset = offset
+        self.bins = bins
+
+    def add_batch(
+            self,
+            times: np.ndarray,
+            sizes: np.ndarray | None = None,
+            statuses: np.ndarray | None = None
+    ):
+        """
+        Add a batch of records to the histogram.
+        :param times: The integer timestamps of the records.
+        :param sizes: The number of bytes of each record, if known.
+        :param statuses: The status code of each record, if known.
+        """
+        if len(times) == 0:
+            return
+
+        numbers = (np.asarray(times, dtype=np.int64) - self.origin) // self.interval
+        low = int(numbers.min())
+        high = int(numbers.max())
+        self._reserve(low, high)
+
+        indices = numbers - low
+        span = high - low + 1
+        bins = self.bins[low - self.offset:high - self.offset + 1]
+
+        bins[:, 0] += np.bincount(indices, minlength=span)
+
+        if sizes is not None:
+            bins[:, 1] += np.bincount(
+                indices,
+                weights=sizes,
+                minlength=span
+            ).round().astype(np.int64)
+
+        if statuses is not None:
+            # Class 0 collects status codes outside of the known classes
+            classes = np.asarray(statuses, dtype=np.int64) // 100
+            classes[(classes < 1) | (classes > 5)] = 0
+
+            counts = np.bincount(indices * 6 + classes, minlength=span * 6)
+            bins[:, 2:] += counts.reshape(span, 6)[:, 1:]
+
+    def add_counts(self, times: np.ndarray, counts: np.ndarray):
+        """
+        Add counts that have already been aggregated, such as the counts of a
+        rollup, to the histogram.
+        :param times: The integer timestamps of the counts, which are added to the
+        bins containing them.
+        :param counts: An array with a row per timestamp and a column per metric of
+        METRICS.
+        """
+        if len(times) == 0:
+            return
+
+        numbers = (np.asarray(times, dtype=np.int64) - self.origin) // self.interval
+        self._reserve(int(numbers.min()), int(numbers.max()))
+
+        np.add.at(self.bins, numbers - self.offset, counts)
+
+    def add_records(self, records: Iterable[Record | dict[str, Any]]):
+        """
+        Add a stream of records, as returned by Viewer.read, to the histogram.
+        Records are gathered into batches, converting each distinct time only
+        once.
+        :param records: The records to add.
+        """
+        times = []
+        sizes = []
+        statuses = []
+        status_column = None
+        last_time = None
+        last_timestamp = None
+
+        for record in records:
+            if status_column is None:
+                status_column = next(
+                    (column for column in STATUS_COLUMNS if column in record),
+                    ''
+                )
+
+            time = record['time']
+            if time != last_time:
+                last_time = time
+
+                if isinstance(time, str):
+                    time = datetime.fromisoformat(time)
+
+                if isinstance(time, datetime):
+                    if self.low is None and self.tzinfo is None:
+                        self.tzinfo = time.tzinfo
+
+                    last_timestamp = int(time.timestamp())
+                else:
+                    last_timestamp = int(time)
+
+            times.append(last_timestamp)
+            sizes.append(record.get('size') or 0)
+            statuses.append(record.get(status_column) or 0)
+
+            if len(times) >= BATCH_SIZE:
+                self.add_batch(np.array(times), np.array(sizes), np.array(statuses))
+                times.clear()
+                sizes.clear()
+                statuses.clear()
+
+        self.add_batch(np.array(times), np.array(sizes), np.array(statuses))
+
+    def resample(self, interval: timedelta) -> Histogram:
+        """
+        Create a histogram with a longer interval from this histogram.
+        :param interval: The interval of the new histogram. Must be a multiple of
+        the interval of this histogram.
+        :return: The new histogram.
+        """
+        seconds = int(interval.total_seconds())
+        if seconds % self.interval != 0:
+            raise ValueError('Interval must be a multiple of the current interval.')
+
+        factor = seconds // self.interval
+        histogram = Histogram(interval)
+        histogram.origin = self.origin
+        histogram.tzinfo = self.tzinfo
+
+        if self.low is None:
+            return histogram
+
+        low = self.low // factor
+        high = self.high // factor
+        bins = np.zeros(((high - low + 1) * factor, len(METRICS)), dtype=np.int64)
+
+        start = self.low - low * factor
+        bins[start:start + self.high - self.low + 1] = self.get_bins()
+
+        histogram._reserve(low, high)
+        histogram.bins[:] = bins.reshape(-1, factor, len(METRICS)).sum(axis=1)
+        return histogram
+
+    def get_bins(self) -> np.ndarray:
+        """
+        Get the used bins.
+        :return: An array with a row per bin and a column per metric.
+        """
+        if self.low is None:
+            return self.bins[:0]
+
+        return self.bins[self.low - self.offset:self.high - self.offset + 1]
+
+    def get_times(self) -> list[datetime]:
+        """
+        Get the start times of the used bins.
+        :return: The start time of each bin.
+        """
+        if self.low is None:
+            return []
+
+        return [
+            datetime.fromtimestamp(self.origin + number * self.interval, self.tzinfo)
+            for number in range(self.low, self.high + 1)
+        ]
+
+    def get_series(self) -> dict[str, np.ndarray]:
+        """
+        Get the histogram as a time series.
+        :return: A dictionary mapping the time column, holding the timestamp of
+        the start of each bin, and the metrics to arrays.
+        """
+        bins = self.get_bins()
+        series = {
+            'time': self.origin + self.interval * np.arange(
+                self.low or 0,
+                (self.low or 0) + len(bins),
+                dtype=np.int64
+            )
+        }
+
+        for index, metric in enumerate(METRICS):
+            series[metric] = bins[:, index]
+
+        return series
+
+    def write_csv(self, file: IO[str]):
+        """
+        Write the histogram as a time series with a header line and a line per
+        bin.
+        :param file: The file to write to.
+        """
+        file.write(','.join(['time'] + METRICS) + '\n')
+
+        for time, row in zip(self.get_times(), self.get_bins().tolist()):
+            file.write(time.isoformat() + ',' + ','.join(map(str, row)) + '\n')
+
+    def plot(self):
+        """
+        Plot the requests, bytes and status classes of the histogram over time.
+        """
+        import matplotlib.pyplot as plt
+
+        times = self.get_times()
+        bins = self.get_bins()
+
+        fig, (requests, size, statuses) = plt.subplots(3, 1, sharex=True)
+        requests.plot(times, bins[:, 0])
+        requests.set_ylabel('Requests')
+
+        size.plot(times, bins[:, 1])
+        size.set_ylabel('Bytes')
+
+        for index, metric in enumerate(METRICS[2:], start=2):
+            statuses.plot(times, bins[:, index], label=metric[-3:])
+
+        statuses.set_ylabel('Requests')
+        statuses.legend()
+        plt.show()
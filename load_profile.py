@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from abstract_viewer import Viewer
+from generic import DatasetType, parse_duration
+from histogram import Histogram
+from time_index import TimeIndex
+from view import viewer_map
+
+
+class LoadProfileCache:
+    """
+    A persistent cache of the number of requests per second of each part of a
+    dataset. The counts of each part are stored as a NumPy file in a hidden
+    directory next to the time index, along with a manifest mapping parts to their
+    files. Like the time index, entries are invalidated when the size or
+    modification time of their file changes.
+    """
+
+    VERSION = 1
+    DIRECTORY_NAME = '.load_profiles'
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, directory: str, entries: dict[str, dict] | None = None):
+        self.directory: str = directory
+        self.entries: dict[str, dict] = entries or dict()
+
+    @staticmethod
+    def load(input_path: str) -> LoadProfileCache:
+        """
+        Load the cache used for an input file or directory. If there is no cache,
+        or it cannot be read, an empty cache is returned.
+        :param input_path: The file or directory to load the cache for.
+        :return: The loaded cache.
+        """
+        directory = os.path.join(
+            os.path.dirname(TimeIndex.get_index_path(input_path)),
+            LoadProfileCache.DIRECTORY_NAME
+        )
+
+        try:
+            with open(os.path.join(directory, LoadProfileCache.MANIFEST_NAME)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return LoadProfileCache(directory)
+
+        if data.get('version') != LoadProfileCache.VERSION:
+            return LoadProfileCache(directory)
+
+        return LoadProfileCache(directory, data.get('entries'))
+
+    def save(self):
+        """
+        Save the manifest of the cache. Failing to write it is not considered an
+        error, as the cache can always be rebuilt.
+        """
+        path = os.path.join(self.directory, self.MANIFEST_NAME)
+        temp_path = path + '.tmp'
+
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, file)
+
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def get(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None
+    ) -> tuple[int, np.ndarray] | None:
+        """
+        Get the request counts of a part, if they are cached and the part has not
+        changed since.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :return: A tuple of the timestamp of the first second of the part and the
+        number of requests of each second, or None if there are no valid counts.
+        """
+        data = self.entries.get(TimeIndex.get_key(kind, file_path, part))
+        if data is None or data.get('stamp') != TimeIndex.get_stamp(file_path):
+            return None
+
+        try:
+            counts = np.load(os.path.join(self.directory, data['file']))
+        except (OSError, ValueError):
+            return None
+
+        return data['start'], counts
+
+    def put(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None,
+            start: int,
+            counts: np.ndarray
+    ):
+        """
+        Store the request counts of a part and save the manifest, so that the
+        counts of all parts stored so far are kept if aggregation is interrupted.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :param start: The timestamp of the first second of the part.
+        :param counts: The number of requests of each second of the part.
+        """
+        key = TimeIndex.get_key(kind, file_path, part)
+        file_name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy'
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(os.path.join(self.directory, file_name), counts)
+        except OSError:
+            return
+
+        self.entries[key] = {
+            'stamp': TimeIndex.get_stamp(file_path),
+            'start': start,
+            'file': file_name
+        }
+        self.save()
+
+
+class LoadProfile:
+    def __init__(self, start: datetime, interval: int, counts: np.ndarray):
+        """
+        Constructs a new load profile.
+        :param start: The start of the first interval of the profile.
+        :param interval: The length of each interval in seconds.
+        :param counts: The number of requests of each interval.
+        """
+        self.start: datetime = start
+        self.interval: int = interval
+        self.counts: np.ndarray = counts
+
+    def save(self, path: str):
+        """
+        Save the profile as a NumPy archive with the arrays counts, interval and
+        start, where start is an ISO formatted time.
+        :param path: The path to save the profile to.
+        """
+        with open(path, 'wb') as file:
+            np.savez(
+                file,
+                counts=self.counts,
+                interval=np.array(self.interval),
+                start=np.array(self.start.isoformat())
+            )
+
+    @staticmethod
+    def load(path: str) -> LoadProfile:
+        with np.load(path) as data:
+            return LoadProfile(
+                datetime.fromisoformat(str(data['start'])),
+                int(data['interval']),
+                data['counts']
+            )
+
+
+def count_part(
+        viewer: Viewer,
+        file_path: str,
+        part: str | None
+) -> tuple[int, np.ndarray]:
+    """
+    Count the requests per second of a whole part.
+    :param viewer: A viewer without start and stop times.
+    :param file_path: The path of the file containing the part.
+    :param part: The part within the file, if any.
+    :return: A tuple of the timestamp of the first second of the part and the
+    number of requests of each second.
+    """
+    histogram = Histogram(timedelta(seconds=1))
+
+    if hasattr(viewer, 'read_part_batches'):
+        for batch in viewer.read_part_batches(file_path, part):
+            histogram.add_batch(batch['time'])
+    else:
+        histogram.add_records(viewer.read_task((file_path, part, None, None)))
+
+    series = histogram.get_series()
+    start = int(series['time'][0]) if len(series['time']) else 0
+
+    return start, series['requests'].astype(np.int32)
+
+
+def build_load_profile(viewer: Viewer, interval: int = 1) -> LoadProfile:
+    """
+    Build the load profile of the parts of a viewer overlapping its start and stop
+    time. The requests per second of each part are read from the cache, and only
+    parts that are not cached are read and added to the cache.
+    :param viewer: The viewer to build the load profile of.
+    :param interval: The length of each interval of the profile in seconds.
+    :return: The load profile.
+    """
+    kind = type(viewer).__name__
+    cache = LoadProfileCache.load(viewer.input_path)
+    parts = viewer.get_parts()
+    reader = None
+
+    start = viewer.start_time
+    if start is None:
+        # Without a start time, intervals are aligned to the epoch, like the bins of
+        # a histogram
+        start = min(
+            (viewer.start_times[part] for part in parts),
+            default=datetime.now()
+        )
+        start -= timedelta(seconds=int(start.timestamp()) % interval)
+
+    stop = viewer.stop_time or max(
+        (viewer.end_times[part] + timedelta(seconds=1) for part in parts),
+        default=start
+    )
+
+    origin = int(start.timestamp())
+    length = math.ceil((stop - start).total_seconds() / interval)
+    counts = np.zeros(length, dtype=np.int64)
+
+    for file_path, part in parts:
+        cached = cache.get(kind, file_path, part)
+
+        if cached is None:
+            if reader is None:
+                reader = type(viewer)(viewer.input_path, None, None)
+
+            cached = count_part(reader, file_path, part)
+            cache.put(kind, file_path, part, *cached)
+
+        part_start, part_counts = cached
+        indices = (part_start - origin + np.arange(len(part_counts))) // interval
+        inside = (indices >= 0) & (indices < length)
+
+        counts += np.bincount(
+            indices[inside],
+            weights=part_counts[inside],
+            minlength=length
+        ).astype(np.int64)
+
+    return LoadProfile(start, interval, counts)
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(
+        description='Create a profile of the number of requests over time of a '
+                    'dataset, for replaying it in the simulation.'
+    )
+
+    parser.add_argument(
+        '--dataset',
+        help='The type of dataset to create a profile of',
+        choices=DatasetType.get_option_names(),
+        dest='dataset'
+    )
+
+    parser.add_argument(
+        '--input',
+        help='The input location to read from',
+        dest='input'
+    )
+
+    parser.add_argument(
+        '--start',
+        help='Start time',
+        dest='start_time',
+        default=None
+    )
+
+    parser.add_argument(
+        '--stop',
+        help='Stop time',
+        dest='stop_time',
+        default=None
+    )
+
+    parser.add_argument(
+        '--duration',
+        help='Duration of the profile. Start or stop time is required when this is '
+             'specified.',
+        dest='duration',
+        default=None
+    )
+
+    parser.add_argument(
+        '--interval',
+        help='Length of each interval of the profile, e.g. 1s or 1m',
+        dest='interval',
+        default='1s'
+    )
+
+    parser.add_argument(
+        '--output',
+        help='File to save the profile to',
+        dest='output_file',
+        default='load_profile.npz'
+    )
+
+    return parser.parse_args(sys.argv[1:])
+
+
+def main():
+    options = parse_options()
+    dataset = DatasetType.parse(options.dataset)
+    viewer = viewer_map[dataset](
+        options.input,
+        options.start_time,
+        options.stop_time,
+        options.duration
+    )
+
+    interval = int(parse_duration(options.interval).total_seconds())
+    profile = build_load_profile(viewer, interval)
+    profile.save(options.output_file)
+
+
+if __name__ == '__main__':
+    main()
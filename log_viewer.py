@@ -1,14 +1,27 @@
-import copy
+from __future__ import annotations
+
+import bisect
 import encodings
-import re
-from datetime import datetime
-from typing import Iterable, IO
+import json
+import os
+import struct
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, IO, Generator
+
+import numpy as np
 
-from abstract_viewer import Viewer
+import generic
+from abstract_viewer import Viewer, PartIndexer
 from generic import open_file
+from gzip_index import build_checkpoints, GzipCheckpoint
+from record import Record
+from time_index import TimeIndex, TimeIndexEntry
+
 
+class LogViewerDataPoint(Record):
+    __slots__ = ('host', 'time', 'method', 'path', 'code', 'size')
 
-class LogViewerDataPoint:
     def __init__(
             self,
             host: str,
@@ -25,13 +38,426 @@ class LogViewerDataPoint:
         self.code: int = code
         self.size: int = size
 
-    def to_dict(self):
-        return copy.deepcopy(self.__dict__)
+
+class CommonLogFormatParser:
+    """
+    Parser of lines in the Common Log Format, as used by the NASA and ClarkNet
+    logs. Lines are split at their fixed delimiters instead of using a regular
+    expression, and timestamps are parsed from fixed offsets. The time of the
+    start of the previous minute is cached, so that most timestamps only require
+    the seconds to be parsed.
+    """
+
+    MONTHS = {
+        'Jan': 1,
+        'Feb': 2,
+        'Mar': 3,
+        'Apr': 4,
+        'May': 5,
+        'Jun': 6,
+        'Jul': 7,
+        'Aug': 8,
+        'Sep': 9,
+        'Oct': 10,
+        'Nov': 11,
+        'Dec': 12
+    }
+
+    SECONDS = {f'{second:02}': timedelta(seconds=second) for second in range(60)}
+
+    def __init__(self):
+        self.last_minute: str | None = None
+        self.last_zone: str | None = None
+        self.last_minute_time: datetime | None = None
+        self.timezones: dict[str, timezone] = dict()
+
+    def parse_time(self, timestamp: str) -> datetime | None:
+        """
+        Parse a timestamp of the format 01/Aug/1995:00:00:01 -0400.
+        :param timestamp: The timestamp to parse.
+        :return: The parsed time, or None if the timestamp is malformed.
+        """
+        second = self.SECONDS.get(timestamp[18:20])
+        if second is None:
+            return None
+
+        if timestamp[:17] == self.last_minute and timestamp[20:] == self.last_zone:
+            return self.last_minute_time + second
+
+        if len(timestamp) != 26:
+            return None
+
+        try:
+            zone = timestamp[20:]
+            tz = self.timezones.get(zone)
+
+            if tz is None:
+                if zone[1] not in '+-' or not zone[2:].isdigit():
+                    return None
+
+                delta = timedelta(hours=int(zone[2:4]), minutes=int(zone[4:6]))
+                tz = timezone(-delta if zone[1] == '-' else delta)
+                self.timezones[zone] = tz
+
+            minute_time = datetime(
+                int(timestamp[7:11]),
+                self.MONTHS[timestamp[3:6]],
+                int(timestamp[0:2]),
+                int(timestamp[12:14]),
+                int(timestamp[15:17]),
+                tzinfo=tz
+            )
+        except (ValueError, KeyError):
+            return None
+
+        self.last_minute = timestamp[:17]
+        self.last_zone = zone
+        self.last_minute_time = minute_time
+        return minute_time + second
+
+    def parse_line(self, line: str) -> LogViewerDataPoint | None:
+        """
+        Parse a log line. Lines with a size of - are parsed as having a size of 0,
+        and truncated requests without a closing quote are parsed up to the status
+        code.
+        :param line: The line to parse.
+        :return: The parsed data point, or None if the line is malformed.
+        """
+        fields = line.split('"')
+        if len(fields) < 2:
+            return None
+
+        # The head is on the form: host - - [01/Aug/1995:00:00:01 -0400]
+        head = fields[0]
+        if len(head) < 35 or head[-2:] != '] ' or head[-34:-28] != ' - - [':
+            return None
+
+        time = self.parse_time(head[-28:-2])
+        if time is None:
+            return None
+
+        if len(fields) == 2:
+            # The request is missing its closing quote
+            request, *tail = fields[1].rsplit(None, 2)
+        else:
+            request = fields[1] if len(fields) == 3 else '"'.join(fields[1:-1])
+            tail = fields[-1].split()
+
+        if len(tail) != 2:
+            return None
+
+        method, _, path = request.partition(' ')
+        code, size = tail
+
+        if not method or not code.isdigit():
+            return None
+
+        if size == '-':
+            size = 0
+        elif size.isdigit():
+            size = int(size)
+        else:
+            return None
+
+        return LogViewerDataPoint(head[:-34], time, method, path, int(code), size)
+
+
+# The fixed-size records of converted logs. Times are epoch seconds, and hosts,
+# methods, paths and time zones are indices into the dictionaries of the store.
+STORE_DTYPE = np.dtype([
+    ('time', '<u4'),
+    ('host', '<u4'),
+    ('path', '<u4'),
+    ('size', '<u4'),
+    ('code', '<u2'),
+    ('method', '<u2'),
+    ('zone', '<u2')
+])
+
+
+class LogStore:
+    """
+    A log converted into a compact binary store, which can be read instead of
+    decompressing and parsing the log. The store is a hidden file next to the log,
+    containing the records of the log as fixed-size records of the STORE_DTYPE
+    data type, in the order of its lines, followed by a JSON footer, the length of
+    the footer and a magic number.
+
+    The footer holds the dictionaries of interned hosts, methods, paths and time
+    zones, and a time index storing the latest time of the records up to the end
+    of every block of BLOCK_SIZE records. Unlike the times of the records, the
+    times of the index are sorted, so the records within a time range can be found
+    by bisecting it even if the log is not strictly ordered by time. A store is
+    only used while the size and modification time of its log are unchanged.
+    """
+
+    MAGIC = b'CLFSTOR1'
+    VERSION = 1
+
+    # The number of records per block of the time index
+    BLOCK_SIZE = 1 << 12
+
+    # The number of records converted at a time
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, path: str, footer: dict):
+        """
+        Constructs a new store from its footer. Use load to open a store.
+        :param path: The path of the store.
+        :param footer: The footer of the store.
+        """
+        self.path: str = path
+        self.count: int = footer['count']
+        self.lines: int = footer['lines']
+        self.hosts: list[str] = footer['hosts']
+        self.methods: list[str] = footer['methods']
+        self.paths: list[str] = footer['paths']
+        self.zones: list[timezone] = [
+            timezone(timedelta(seconds=offset)) for offset in footer['zones']
+        ]
+        self.block_times: list[int] = footer['block_times']
+
+    @staticmethod
+    def get_path(file_path: str, part: str | None) -> str:
+        """
+        Get the path of the store of a log.
+        :param file_path: The path of the file containing the log.
+        :param part: The part within the file, if any.
+        :return: The path of the store.
+        """
+        directory, name = os.path.split(os.path.abspath(file_path))
+        if part:
+            name = f'{name}.{part.replace("/", "_")}'
+
+        return os.path.join(directory, f'.{name}.store')
+
+    @staticmethod
+    def load(file_path: str, part: str | None) -> LogStore | None:
+        """
+        Open the store of a log.
+        :param file_path: The path of the file containing the log.
+        :param part: The part within the file, if any.
+        :return: The store, or None if the log has not been converted, or has
+        changed since it was converted.
+        """
+        path = LogStore.get_path(file_path, part)
+        magic = LogStore.MAGIC
+
+        try:
+            with open(path, 'rb') as file:
+                file.seek(-(8 + len(magic)), os.SEEK_END)
+                length, = struct.unpack('<Q', file.read(8))
+
+                if file.read(len(magic)) != magic:
+                    return None
+
+                file.seek(-(8 + len(magic) + length), os.SEEK_END)
+                footer = json.loads(file.read(length))
+
+            if footer.get('version') != LogStore.VERSION or \
+                    footer.get('stamp') != TimeIndex.get_stamp(file_path):
+                return None
+        except (OSError, ValueError, struct.error):
+            return None
+
+        return LogStore(path, footer)
+
+    @staticmethod
+    def convert(file_path: str, part: str | None) -> LogStore:
+        """
+        Convert a log into a store, replacing any existing store of it. Malformed
+        lines are skipped, as they are when the log is read.
+        :param file_path: The path of the file containing the log.
+        :param part: The part within the file, if any.
+        :return: The store.
+        """
+        path = LogStore.get_path(file_path, part)
+        temp_path = path + '.tmp'
+        stamp = TimeIndex.get_stamp(file_path)
+        parser = CommonLogFormatParser()
+
+        dictionaries = {'host': dict(), 'method': dict(), 'path': dict()}
+        zones = dict()
+        block_times = []
+        count = 0
+        lines = 0
+
+        def write_chunk(columns: dict[str, list]):
+            records = np.empty(len(columns['time']), dtype=STORE_DTYPE)
+            for name, values in columns.items():
+                records[name] = values
+
+            file.write(records.tobytes())
+
+            # The chunk size is a multiple of the block size, so blocks never
+            # span chunks
+            times = records['time'].astype(np.int64)
+            blocks = np.maximum.reduceat(
+                times,
+                np.arange(0, len(times), LogStore.BLOCK_SIZE)
+            )
+            if block_times:
+                blocks[0] = max(blocks[0], block_times[-1])
+
+            block_times.extend(np.maximum.accumulate(blocks).tolist())
+
+        with open_file(file_path, part, read_flags='rb') as source, \
+                open(temp_path, 'wb') as file:
+            file.write(LogStore.MAGIC)
+            columns = {name: [] for name in STORE_DTYPE.names}
+
+            for line in source:
+                lines += 1
+                dp = parser.parse_line(line.decode('utf-8', 'replace'))
+                if dp is None:
+                    continue
+
+                time = dp.time
+                columns['time'].append(int(time.timestamp()))
+                columns['zone'].append(zones.setdefault(
+                    int(time.utcoffset().total_seconds()),
+                    len(zones)
+                ))
+                columns['code'].append(dp.code)
+                columns['size'].append(dp.size)
+
+                for name, dictionary in dictionaries.items():
+                    columns[name].append(dictionary.setdefault(
+                        getattr(dp, name),
+                        len(dictionary)
+                    ))
+
+                count += 1
+                if count % LogStore.CHUNK_SIZE == 0:
+                    write_chunk(columns)
+                    columns = {name: [] for name in STORE_DTYPE.names}
+
+            if columns['time']:
+                write_chunk(columns)
+
+            footer = {
+                'version': LogStore.VERSION,
+                'stamp': stamp,
+                'count': count,
+                'lines': lines,
+                'hosts': list(dictionaries['host']),
+                'methods': list(dictionaries['method']),
+                'paths': list(dictionaries['path']),
+                'zones': list(zones),
+                'block_times': block_times
+            }
+            data = json.dumps(footer).encode('utf-8')
+
+            file.write(data)
+            file.write(struct.pack('<Q', len(data)))
+            file.write(LogStore.MAGIC)
+
+        os.replace(temp_path, path)
+        return LogStore(path, footer)
+
+    def map_records(self) -> np.ndarray:
+        """
+        Memory-map the records of the store, without reading them.
+        :return: A read-only array of records of the STORE_DTYPE data type.
+        """
+        if self.count == 0:
+            return np.empty(0, dtype=STORE_DTYPE)
+
+        return np.memmap(
+            self.path,
+            dtype=STORE_DTYPE,
+            mode='r',
+            offset=len(self.MAGIC),
+            shape=(self.count,)
+        )
+
+    def find_range(
+            self,
+            start: float | None,
+            stop: float | None
+    ) -> tuple[int, int, bool]:
+        """
+        Find the records that are read for a time range, the way the lines of the
+        log are read: records before the start are skipped, and reading stops at
+        the first record after the stop. Blocks before the first block that
+        reaches the start are skipped without reading them.
+        :param start: The start timestamp, or None for no lower bound.
+        :param stop: The stop timestamp, or None for no upper bound.
+        :return: A tuple of the index of the first record to read, the index of
+        the first record after the stop, or the number of records if there is no
+        such record, and whether there is such a record. Records between the two
+        indices that are before the start must still be skipped.
+        """
+        block_size = self.BLOCK_SIZE
+        first = 0 if start is None else \
+            bisect.bisect_left(self.block_times, start) * block_size
+
+        block = len(self.block_times) if stop is None else \
+            bisect.bisect_right(self.block_times, stop)
+
+        if block == len(self.block_times):
+            return min(first, self.count), self.count, False
+
+        offset = block * block_size
+        times = self.map_records()['time'][offset:offset + block_size]
+        last = offset + int(np.argmax(times > stop))
+
+        return min(first, last), last, True
+
+    def decode(self, records: np.ndarray) -> Iterable[LogViewerDataPoint]:
+        """
+        Decode an array of records into data points. Hosts, methods and paths are
+        the strings of the dictionaries of the store, shared by all data points.
+        :param records: An array of records of the STORE_DTYPE data type.
+        :return: An iterator of the decoded data points.
+        """
+        return map(
+            LogViewerDataPoint,
+            map(self.hosts.__getitem__, records['host'].tolist()),
+            map(
+                datetime.fromtimestamp,
+                records['time'].tolist(),
+                map(self.zones.__getitem__, records['zone'].tolist())
+            ),
+            map(self.methods.__getitem__, records['method'].tolist()),
+            map(self.paths.__getitem__, records['path'].tolist()),
+            records['code'].tolist(),
+            records['size'].tolist()
+        )
+
+    def get_entry(self) -> TimeIndexEntry | None:
+        """
+        Get the time index entry of the log, without reading the log.
+        :return: The entry, or None if the log contains no records.
+        """
+        if self.count == 0:
+            return None
+
+        records = self.map_records()
+        first, last = self.decode(records[[0, -1]])
+
+        return TimeIndexEntry(first.time, last.time, self.lines)
 
 
 class LogViewer(Viewer):
-    LOG_LINE_REGEX = re.compile(
-        r'([\w\-.]+) - - \[([\w\/:\s-]+)] "(\w+) (.*)" (\d+) (\w+)')
+    PARSER = CommonLogFormatParser()
+    SCHEMA = {
+        'host': str,
+        'time': datetime,
+        'method': str,
+        'path': str,
+        'code': int,
+        'size': int
+    }
+
+    # Reading stops at the first record after the stop time
+    INCLUDES_STOP = True
+
+    # The number of lines at the end of a log to search for a valid last line
+    INDEX_TAIL_LINES = 64
+
+    # The maximum number of records decoded at a time from a store
+    CHUNK_SIZE = 1 << 16
 
     def __init__(
             self,
@@ -40,6 +466,10 @@ class LogViewer(Viewer):
             stop_time: str | None,
             duration: str | None = None
     ):
+        # The stores of the converted logs, or None for logs that have not been
+        # converted, loaded when the logs are first used
+        self.stores: dict[tuple[str, str | None], LogStore | None] = dict()
+
         super().__init__(
             input_path,
             start_time,
@@ -50,57 +480,268 @@ class LogViewer(Viewer):
 
     def read_last_time(self, file: IO[bytes]) -> datetime | None:
         last_line = None
-        with open(self.input_path) as file:
+        while line := file.readline():
+            last_line = line
+
+        return None if last_line is None else self._parse_time(last_line)
+
+    def index_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        store = self.get_store(file_path, part)
+        if store is not None:
+            return store.get_entry()
+
+        if generic.is_gzip(file_path, part):
+            return self._index_gzip_part(file_path, part)
+
+        first = None
+        count = 0
+        last_lines = deque(maxlen=self.INDEX_TAIL_LINES)
+
+        with open_file(file_path, part, read_flags=self.read_flags) as file:
             while line := file.readline():
-                last_line = line
+                count += 1
+                last_lines.append(line)
+
+                if first is None:
+                    first = self._parse_time(line)
+
+        last = None
+        while last is None and last_lines:
+            last = self._parse_time(last_lines.pop())
 
-        if last_line is None:
+        if first is None or last is None:
             return None
 
-        return self._convert_to_datapoint(last_line)
+        return TimeIndexEntry(first, last, count)
 
-    def read(self, part: str | None = None) -> Iterable[str]:
-        with open_file(self.input_path, read_flags=self.read_flags) as file:
-            while line := file.readline():
-                if isinstance(line, bytes):
-                    line = line.decode('utf-8', 'replace')
+    def _index_gzip_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        indexer = self.create_indexer()
 
-                dp = self._convert_to_datapoint(line)
-                if dp is None:
-                    continue
+        with generic.open_compressed(file_path, part) as file:
+            checkpoints = build_checkpoints(file, indexer.locate, indexer.update)
 
-                time = dp.time
-                if self.start_time is not None and time < self.start_time:
-                    continue
+        return indexer.get_entry(checkpoints)
 
-                if self.stop_time is not None and time > self.stop_time:
-                    break
+    @classmethod
+    def create_indexer(cls) -> PartIndexer:
+        return LogPartIndexer()
 
-                yield dp.to_dict()
+    def get_store(self, file_path: str, part: str | None) -> LogStore | None:
+        """
+        Get the store of a converted log, which is read instead of the log.
+        :param file_path: The path of the file containing the log.
+        :param part: The part within the file, if any.
+        :return: The store, or None if the log has not been converted, or has
+        changed since it was converted.
+        """
+        key = (file_path, part)
+        if key not in self.stores:
+            self.stores[key] = LogStore.load(file_path, part)
+
+        return self.stores[key]
+
+    def convert(
+            self,
+            parts: list[str] | str | None = None
+    ) -> list[tuple[str, str | None]]:
+        """
+        Convert logs into binary stores, see LogStore. From then on, the stores
+        are read instead of the logs, until the logs change. Logs that are already
+        converted are not converted again.
+        :param parts: Names of parts within the input. If not specified, all
+        parts of the input are converted.
+        :return: The converted parts.
+        """
+        converted = []
+
+        for file_path, part in self.resolve_parts(parts) if parts else self.files:
+            if self.get_store(file_path, part) is None:
+                self.stores[file_path, part] = LogStore.convert(file_path, part)
+                converted.append((file_path, part))
+
+        return converted
 
     @staticmethod
-    def _convert_to_datapoint(log_line: str) -> LogViewerDataPoint | None:
-        match = LogViewer.LOG_LINE_REGEX.match(log_line)
-        if not match:
-            return None
+    def _parse_time(line: str | bytes) -> datetime | None:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
 
-        host = str(match.group(1))
-        time = str(match.group(2))
-        method = str(match.group(3))
-        path = str(match.group(4))
-        code = int(match.group(5))
-        size = int(match.group(6))
-
-        time = datetime.strptime(time, '%d/%b/%Y:%H:%M:%S %z')
-
-        return LogViewerDataPoint(
-            host=host,
-            time=time,
-            method=method,
-            path=path,
-            code=code,
-            size=size
-        )
+        dp = LogViewer._convert_to_datapoint(line)
+        return None if dp is None else dp.time
+
+    def get_tasks(
+            self,
+            parts: list[str] | str | None = None,
+            count: int = 1
+    ) -> list[tuple[str, str | None, int | None, int | None]]:
+        # Converted logs are split into record ranges and uncompressed logs into
+        # byte ranges starting at line boundaries, while compressed logs and
+        # merged logs can only be read as a whole.
+        tasks = super().get_tasks(parts, count)
+        ranges = -(-count // max(1, len(tasks)))
+
+        return [
+            split_task
+            for task in tasks
+            for split_task in self._split_task(task, ranges)
+        ]
+
+    def _split_task(
+            self,
+            task: tuple[str, str | None, int | None, int | None],
+            count: int
+    ) -> list[tuple[str, str | None, int | None, int | None]]:
+        file_path, part, _, _ = task
+        if file_path is None:
+            return [task]
+
+        store = self.get_store(file_path, part)
+        if store is not None:
+            return self._split_store(file_path, part, store, count)
+
+        if count <= 1 or generic.get_archive_format(file_path) is not None:
+            return [task]
+
+        return self._split_file(file_path, part, count)
+
+    def _split_store(
+            self,
+            file_path: str,
+            part: str | None,
+            store: LogStore,
+            count: int
+    ) -> list[tuple[str, str | None, int | None, int | None]]:
+        first, last, _ = store.find_range(*self.time_bounds())
+        step = max(self.CHUNK_SIZE, -(-(last - first) // count))
+
+        # An empty range is still read, since it may end at a record after the
+        # stop time
+        return [
+            (file_path, part, begin, min(begin + step, last))
+            for begin in range(first, last, step)
+        ] or [(file_path, part, first, last)]
+
+    @staticmethod
+    def _split_file(
+            file_path: str,
+            part: str | None,
+            count: int
+    ) -> list[tuple[str, str | None, int | None, int | None]]:
+        size = os.path.getsize(file_path)
+        boundaries = [0]
+
+        with open(file_path, 'rb') as file:
+            for index in range(1, count):
+                file.seek(size * index // count)
+                file.readline()
+                boundaries.append(file.tell())
+
+        boundaries.append(size)
+
+        return [
+            (file_path, part, begin, end)
+            for begin, end in zip(boundaries, boundaries[1:])
+            if begin < end
+        ]
+
+    def read_task(
+            self,
+            task: tuple[str, str | None, int | None, int | None]
+    ) -> Generator[LogViewerDataPoint, None, bool]:
+        file_path, part, begin, end = task
+
+        if begin is None:
+            return (yield from super().read_task(task))
+
+        store = self.get_store(file_path, part)
+        if store is not None:
+            return (yield from self._read_store(store, begin, end))
+
+        def read_range():
+            position = begin
+
+            with open(file_path, 'rb') as file:
+                file.seek(begin)
+
+                while position < end and (line := file.readline()):
+                    position += len(line)
+                    yield line
+
+        return (yield from self._read_lines(read_range()))
+
+    def read_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> Generator[LogViewerDataPoint, None, bool]:
+        store = self.get_store(file_path, part)
+        if store is not None:
+            return (yield from self._read_store(store, 0, store.count))
+
+        with self.open_part(file_path, part, self.start_time) as file:
+            return (yield from self._read_lines(self._iterate_lines(file)))
+
+    def _read_store(
+            self,
+            store: LogStore,
+            begin: int,
+            end: int
+    ) -> Generator[LogViewerDataPoint, None, bool]:
+        # The records are selected the same way _read_lines selects lines, so
+        # the output is the same as the output of reading the log
+        start, stop = self.time_bounds()
+        first, last, stopped = store.find_range(start, stop)
+        records = store.map_records()[:last]
+
+        for offset in range(max(begin, first), min(end, last), self.CHUNK_SIZE):
+            chunk = records[offset:min(offset + self.CHUNK_SIZE, end)]
+
+            if start is not None:
+                chunk = chunk[chunk['time'] >= start]
+
+            yield from store.decode(chunk)
+
+        return stopped and end >= last
+
+    @staticmethod
+    def _iterate_lines(file: IO) -> Iterable[str | bytes]:
+        while line := file.readline():
+            yield line
+
+    def _read_lines(
+            self,
+            lines: Iterable[str | bytes]
+    ) -> Generator[LogViewerDataPoint, None, bool]:
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+
+            dp = self._convert_to_datapoint(line)
+            if dp is None:
+                continue
+
+            time = dp.time
+            if self.start_time is not None and time < self.start_time:
+                continue
+
+            if self.stop_time is not None and time > self.stop_time:
+                return True
+
+            yield dp
+
+        return False
+
+    @staticmethod
+    def _convert_to_datapoint(log_line: str) -> LogViewerDataPoint | None:
+        return LogViewer.PARSER.parse_line(log_line)
 
     def read_first_time(self, file: IO[bytes]) -> datetime | None:
         line = file.readline()
@@ -111,3 +752,78 @@ class LogViewer(Viewer):
             line = line.decode('utf-8', 'replace')
 
         return self._convert_to_datapoint(line).time
+
+
+class LogPartIndexer(PartIndexer):
+    # The number of bytes at the start and end of a log to search for a valid
+    # first and last line
+    TAIL_SIZE = LogViewer.INDEX_TAIL_LINES * 512
+
+    def __init__(self):
+        self.head: bytes = b''
+        self.tail: bytes = b''
+        self.count: int = 0
+
+        # Indexers of concurrent downloads run in separate threads, so each has its
+        # own parser instead of sharing the minute cache of LogViewer.PARSER
+        self.parser: CommonLogFormatParser = CommonLogFormatParser()
+
+    def _parse_time(self, line: bytes) -> datetime | None:
+        dp = self.parser.parse_line(line.decode('utf-8', 'replace'))
+        return None if dp is None else dp.time
+
+    def update(self, data: bytes):
+        tail_size = self.TAIL_SIZE
+
+        if len(self.head) < tail_size:
+            self.head += data[:tail_size - len(self.head)]
+
+        self.tail = (self.tail + data[-tail_size:])[-tail_size:]
+        self.count += data.count(b'\n')
+
+    def locate(
+            self,
+            head: bytes,
+            offset: int,
+            previous: bytes
+    ) -> tuple[int, datetime] | None:
+        skip = 0
+        if previous not in (b'', b'\n'):
+            skip = head.find(b'\n') + 1
+            if skip == 0:
+                return None
+
+        # Only complete lines are parsed, since the last one might be cut off
+        for line in head[skip:].split(b'\n')[:-1]:
+            time = self._parse_time(line)
+            if time is not None:
+                return skip, time
+
+        return None
+
+    def get_entry(
+            self,
+            checkpoints: list[GzipCheckpoint] | None = None
+    ) -> TimeIndexEntry | None:
+        count = self.count
+        if self.tail and not self.tail.endswith(b'\n'):
+            count += 1
+
+        first = None
+        first_lines = self.head.splitlines()
+        while first is None and first_lines:
+            first = self._parse_time(first_lines.pop(0))
+
+        last = None
+        # The first line of the tail is incomplete if the tail has been cut
+        last_lines = self.tail.splitlines()
+        if len(self.tail) == self.TAIL_SIZE:
+            last_lines = last_lines[1:]
+
+        while last is None and last_lines:
+            last = self._parse_time(last_lines.pop())
+
+        if first is None or last is None:
+            return None
+
+        return TimeIndexEntry(first, last, count, checkpoints)
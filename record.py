@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+
+class Record:
+    """
+    A compact record of a dataset. Fields are stored in slots instead of a
+    per-record dictionary, which keeps records small and cheap to create. Records
+    can be read like the dictionaries they replace, by column name, and a
+    dictionary is only created when to_dict is called.
+
+    Subclasses declare their columns, in output order, as __slots__.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, column: str) -> Any:
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.__slots__
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, column) == getattr(other, column)
+            for column in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def keys(self) -> Iterable[str]:
+        return self.__slots__
+
+    def get(self, column: str, default: Any = None) -> Any:
+        return getattr(self, column, default) if column in self.__slots__ \
+            else default
+
+    def to_dict(self) -> dict[str, Any]:
+        return {column: getattr(self, column) for column in self.__slots__}
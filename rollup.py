@@ -0,0 +1,856 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import IO, Any, Iterable
+
+import numpy as np
+
+from abstract_viewer import Viewer
+from generic import DatasetType
+from histogram import BATCH_SIZE, STATUS_COLUMNS
+from record import Record
+from time_index import TimeIndex
+
+# The lengths of the bins of the levels of a rollup in seconds, from the finest to
+# the coarsest level
+LEVELS = [1, 60, 3600]
+
+# The counted metrics of each row, in the order of the columns of
+# RollupTable.counts
+METRICS = [
+    'requests',
+    'bytes',
+    'method_get',
+    'method_head',
+    'method_post',
+    'method_other',
+    'status_1xx',
+    'status_2xx',
+    'status_3xx',
+    'status_4xx',
+    'status_5xx'
+]
+
+# The methods counted separately, while other methods are counted as method_other
+METHODS = ['GET', 'HEAD', 'POST']
+
+# Names of the columns identifying clients, and of the columns rows are grouped
+# by, used by the different viewers
+CLIENT_COLUMNS = ['client_id', 'host']
+GROUP_COLUMNS = ['server_region']
+
+# The number of bits of a client hash selecting a register of a client sketch.
+# The distinct clients are estimated with a standard error of about 6.5%.
+SKETCH_PRECISION = 8
+SKETCH_SIZE = 1 << SKETCH_PRECISION
+
+UNSIGNED_TYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def hash_clients(clients: np.ndarray) -> np.ndarray:
+    """
+    Hash client identifiers to 64-bit values that are the same in every process.
+    Strings are hashed with CRC-32 first, and the hashes are mixed with the
+    finalizer of SplitMix64.
+    :param clients: An array of integer or string client identifiers.
+    :return: An array of 64-bit hashes.
+    """
+    if clients.dtype.kind not in 'iu':
+        unique, inverse = np.unique(clients, return_inverse=True)
+        hashes = np.array(
+            [zlib.crc32(client.encode('utf-8')) for client in unique.tolist()],
+            dtype=np.uint64
+        )
+        clients = hashes[inverse]
+
+    values = clients.astype(np.uint64)
+
+    with np.errstate(over='ignore'):
+        values = values + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return values ^ (values >> np.uint64(31))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        lengths[mask] += shift
+        values[mask] >>= np.uint64(shift)
+
+    return lengths + (values > 0)
+
+
+def _reduce_segments(
+        ufunc: np.ufunc,
+        values: np.ndarray,
+        starts: np.ndarray
+) -> np.ndarray:
+    # Unlike ufunc.reduceat, which reduces one segment at a time, this reduces the
+    # n-th rows of all segments at a time, which is much faster for many short
+    # segments
+    lengths = np.diff(np.r_[starts, len(values)])
+    result = values[starts]
+
+    for offset in range(1, int(lengths.max(initial=1))):
+        segments = np.flatnonzero(lengths > offset)
+        result[segments] = ufunc(result[segments], values[starts[segments] + offset])
+
+    return result
+
+
+def estimate_clients(sketches: np.ndarray) -> np.ndarray:
+    """
+    Estimate the number of distinct clients of HyperLogLog sketches. Sketches with
+    few clients are estimated by linear counting of their empty registers.
+    :param sketches: An array with a row of SKETCH_SIZE registers per sketch.
+    :return: The estimated number of distinct clients of each sketch.
+    """
+    size = SKETCH_SIZE
+    alpha = 0.7213 / (1 + 1.079 / size)
+    raw = alpha * size * size / np.exp2(-sketches.astype(np.float64)).sum(axis=1)
+
+    zeros = np.count_nonzero(sketches == 0, axis=1)
+    linear = size * np.log(size / np.maximum(zeros, 1))
+    estimates = np.where((raw <= 2.5 * size) & (zeros > 0), linear, raw)
+
+    return np.rint(estimates).astype(np.int64)
+
+
+def _compact(values: np.ndarray) -> np.ndarray:
+    # Non-negative integers are stored using the smallest unsigned type fitting them
+    maximum = int(values.max(initial=0))
+    dtype = next(
+        dtype for dtype in UNSIGNED_TYPES
+        if maximum <= np.iinfo(dtype).max or dtype is np.uint64
+    )
+
+    return values.astype(dtype)
+
+
+class RollupTable:
+    """
+    Aggregated records, with a row per bin of a fixed length and group that
+    contains records. Rows are ordered by time and group. Besides the counted
+    METRICS, a row holds a HyperLogLog sketch of its clients, which can be merged
+    with the sketches of other rows, or only the estimated number of distinct
+    clients, which cannot.
+    """
+
+    def __init__(
+            self,
+            interval: int,
+            times: np.ndarray,
+            groups: np.ndarray,
+            counts: np.ndarray,
+            sketches: np.ndarray | None = None,
+            clients: np.ndarray | None = None,
+            tz: tzinfo | None = None
+    ):
+        """
+        Constructs a new table.
+        :param interval: The length of the bins in seconds.
+        :param times: The timestamp of the start of the bin of each row.
+        :param groups: The group of each row.
+        :param counts: An array with a row per row and a column per metric.
+        :param sketches: The client sketch of each row, if known.
+        :param clients: The estimated number of distinct clients of each row, if
+        known. Estimated from the sketches if not specified.
+        :param tz: The time zone of the aggregated records, if any.
+        """
+        self.interval: int = interval
+        self.times: np.ndarray = times
+        self.groups: np.ndarray = groups
+        self.counts: np.ndarray = counts
+        self.sketches: np.ndarray | None = sketches
+        self.clients: np.ndarray | None = clients
+        self.tz: tzinfo | None = tz
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @staticmethod
+    def empty(interval: int) -> RollupTable:
+        return RollupTable(
+            interval,
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty((0, len(METRICS)), dtype=np.int64),
+            np.empty((0, SKETCH_SIZE), dtype=np.uint8)
+        )
+
+    @staticmethod
+    def aggregate(
+            interval: int,
+            origin: int,
+            batch: dict[str, np.ndarray]
+    ) -> RollupTable:
+        """
+        Aggregate a batch of records.
+        :param interval: The length of the bins in seconds.
+        :param origin: The timestamp bins are aligned to.
+        :param batch: A dictionary of arrays of the integer timestamps (time),
+        sizes (size), status codes (status), methods (method), client identifiers
+        (client) and groups (group) of the records.
+        :return: The table of the records.
+        """
+        times = np.asarray(batch['time'], dtype=np.int64)
+        if len(times) == 0:
+            return RollupTable.empty(interval)
+
+        times = origin + (times - origin) // interval * interval
+        groups = np.asarray(batch['group'], dtype=np.int64)
+
+        order = np.lexsort((groups, times))
+        times = times[order]
+        groups = groups[order]
+        boundaries = np.r_[
+            True,
+            (times[1:] != times[:-1]) | (groups[1:] != groups[:-1])
+        ]
+        starts = np.flatnonzero(boundaries)
+        rows = len(starts)
+        inverse = np.cumsum(boundaries) - 1
+
+        counts = np.zeros((rows, len(METRICS)), dtype=np.int64)
+        counts[:, 0] = np.diff(np.r_[starts, len(times)])
+        counts[:, 1] = np.add.reduceat(
+            np.asarray(batch['size'], dtype=np.int64)[order],
+            starts
+        )
+
+        methods = np.asarray(batch['method'])[order]
+        method_indices = np.full(len(methods), len(METHODS), dtype=np.int64)
+        for index, method in enumerate(METHODS):
+            method_indices[methods == method] = index
+
+        method_count = len(METHODS) + 1
+        counts[:, 2:2 + method_count] = np.bincount(
+            inverse * method_count + method_indices,
+            minlength=rows * method_count
+        ).reshape(rows, method_count)
+
+        # Class 0 collects status codes outside of the known classes
+        classes = np.asarray(batch['status'], dtype=np.int64)[order] // 100
+        classes[(classes < 1) | (classes > 5)] = 0
+        counts[:, 2 + method_count:] = np.bincount(
+            inverse * 6 + classes,
+            minlength=rows * 6
+        ).reshape(rows, 6)[:, 1:]
+
+        hashes = hash_clients(np.asarray(batch['client'])[order])
+        registers = (hashes >> np.uint64(64 - SKETCH_PRECISION)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - SKETCH_PRECISION)) - 1)
+        ranks = 64 - SKETCH_PRECISION - _bit_length(rest) + 1
+
+        sketches = np.zeros((rows, SKETCH_SIZE), dtype=np.uint8)
+        np.maximum.at(
+            sketches.reshape(-1),
+            inverse * SKETCH_SIZE + registers,
+            ranks.astype(np.uint8)
+        )
+
+        return RollupTable(interval, times[starts], groups[starts], counts, sketches)
+
+    @staticmethod
+    def merge(interval: int, tables: list[RollupTable]) -> RollupTable:
+        """
+        Merge tables with bins of the same length into a single table, adding up
+        the rows with the same time and group. The estimated clients of merged
+        rows are only known if all tables have sketches.
+        :param interval: The length of the bins of the tables.
+        :param tables: The tables to merge.
+        :return: The merged table.
+        """
+        tables = [table for table in tables if len(table)]
+        tz = next((table.tz for table in tables if table.tz is not None), None)
+
+        if not tables:
+            table = RollupTable.empty(interval)
+            table.tz = tz
+            return table
+
+        times = np.concatenate([table.times for table in tables])
+        groups = np.concatenate([table.groups for table in tables])
+        counts = np.concatenate([table.counts for table in tables])
+        sketches = None
+        clients = None
+
+        if all(table.sketches is not None for table in tables):
+            sketches = np.concatenate([table.sketches for table in tables])
+        elif all(table.get_clients() is not None for table in tables):
+            clients = np.concatenate([table.get_clients() for table in tables])
+
+        order = np.lexsort((groups, times))
+        times = times[order]
+        groups = groups[order]
+        starts = np.flatnonzero(np.r_[
+            True,
+            (times[1:] != times[:-1]) | (groups[1:] != groups[:-1])
+        ])
+
+        if sketches is not None:
+            sketches = _reduce_segments(np.maximum, sketches[order], starts)
+        elif clients is not None and len(starts) == len(times):
+            clients = clients[order]
+        else:
+            clients = None
+
+        return RollupTable(
+            interval,
+            times[starts],
+            groups[starts],
+            _reduce_segments(np.add, counts[order], starts),
+            sketches,
+            clients,
+            tz
+        )
+
+    def resample(self, interval: int, origin: int = 0) -> RollupTable:
+        """
+        Create a table with longer bins from this table.
+        :param interval: The length of the bins of the new table. Must be a
+        multiple of the length of the bins of this table.
+        :param origin: The timestamp the bins of the new table are aligned to,
+        which must be aligned to the bins of this table.
+        :return: The new table.
+        """
+        if interval % self.interval != 0 or origin % self.interval != 0:
+            raise ValueError('Bins must be a multiple of the current bins.')
+
+        table = RollupTable(
+            interval,
+            origin + (self.times - origin) // interval * interval,
+            self.groups,
+            self.counts,
+            self.sketches,
+            self.clients,
+            self.tz
+        )
+
+        if interval == self.interval:
+            return table
+
+        return RollupTable.merge(interval, [table])
+
+    def select(self, start: int | None, stop: int | None) -> RollupTable:
+        """
+        Select the rows of the bins within a time range.
+        :param start: The first timestamp of the range, or None for no lower bound.
+        :param stop: The timestamp where the range ends (exclusive), or None for no
+        upper bound.
+        :return: A table of the rows.
+        """
+        first = 0 if start is None else int(np.searchsorted(self.times, start))
+        last = len(self.times) if stop is None else \
+            int(np.searchsorted(self.times, stop))
+
+        return RollupTable(
+            self.interval,
+            self.times[first:last],
+            self.groups[first:last],
+            self.counts[first:last],
+            None if self.sketches is None else self.sketches[first:last],
+            None if self.clients is None else self.clients[first:last],
+            self.tz
+        )
+
+    def get_clients(self) -> np.ndarray | None:
+        """
+        Get the estimated number of distinct clients of each row.
+        :return: The estimates, or None if they are not known.
+        """
+        if self.clients is None and self.sketches is not None:
+            self.clients = estimate_clients(self.sketches)
+
+        return self.clients
+
+    def get_columns(self, metrics: list[str]) -> np.ndarray:
+        """
+        Get the counts of some metrics.
+        :param metrics: The names of the metrics.
+        :return: An array with a row per row and a column per metric.
+        """
+        return self.counts[:, [METRICS.index(metric) for metric in metrics]]
+
+    def write_csv(
+            self,
+            file: IO[str],
+            group_column: str | None = None,
+            tz: tzinfo | None = None
+    ):
+        """
+        Write the table as a header line and a line per row.
+        :param file: The file to write to.
+        :param group_column: The name of the group column, or None to leave it out,
+        for tables with a single group.
+        :param tz: The time zone of the times, if different from the time zone of
+        the table.
+        """
+        tz = tz or self.tz
+        clients = self.get_clients()
+        columns = ['time'] + ([group_column] if group_column else []) + METRICS
+
+        file.write(','.join(columns + ['clients']) + '\n')
+
+        for index, (time, group, row) in enumerate(zip(
+                self.times.tolist(),
+                self.groups.tolist(),
+                self.counts.tolist()
+        )):
+            values = [datetime.fromtimestamp(time, tz).isoformat()]
+            if group_column:
+                values.append(str(group))
+
+            values.extend(map(str, row))
+            values.append('' if clients is None else str(clients[index]))
+            file.write(','.join(values) + '\n')
+
+
+class RollupAggregator:
+    """
+    Streaming aggregation of the records of a viewer into a RollupTable, a batch
+    at a time, like Histogram. Records are grouped by the first of GROUP_COLUMNS in
+    the schema of the viewer, if any.
+    """
+
+    def __init__(self, interval: int, origin: int, schema: dict[str, type]):
+        """
+        Constructs a new aggregator.
+        :param interval: The length of the bins in seconds.
+        :param origin: The timestamp bins are aligned to.
+        :param schema: The schema of the records, see Viewer.SCHEMA.
+        """
+        self.interval: int = interval
+        self.origin: int = origin
+        self.status_column: str = next(
+            column for column in STATUS_COLUMNS if column in schema
+        )
+        self.client_column: str = next(
+            column for column in CLIENT_COLUMNS if column in schema
+        )
+        self.group_column: str | None = next(
+            (column for column in GROUP_COLUMNS if column in schema),
+            None
+        )
+        self.tables: list[RollupTable] = []
+        self.tz: tzinfo | None = None
+
+    def add_batch(self, batch: dict[str, np.ndarray]):
+        """
+        Add a batch of columns, as returned by WorldCup98Viewer.read_batches.
+        """
+        times = batch['time']
+        self.tables.append(RollupTable.aggregate(self.interval, self.origin, {
+            'time': times,
+            'size': batch['size'],
+            'status': batch[self.status_column],
+            'method': batch['method'],
+            'client': batch[self.client_column],
+            'group': np.zeros(len(times), dtype=np.int64)
+            if self.group_column is None else batch[self.group_column]
+        }))
+
+    def add_records(self, records: Iterable[Record | dict[str, Any]]):
+        """
+        Add a stream of records, as returned by Viewer.read, a batch at a time.
+        The time zone of the first record with a time zone is kept.
+        """
+        columns = ['time', 'size', self.status_column, 'method', self.client_column]
+        if self.group_column is not None:
+            columns.append(self.group_column)
+
+        batch = {column: [] for column in columns}
+        last_time = None
+        last_timestamp = None
+
+        for record in records:
+            time = record['time']
+            if time != last_time:
+                last_time = time
+
+                if isinstance(time, datetime):
+                    if self.tz is None:
+                        self.tz = time.tzinfo
+
+                    last_timestamp = int(time.timestamp())
+                else:
+                    last_timestamp = int(time)
+
+            batch['time'].append(last_timestamp)
+            for column in columns[1:]:
+                batch[column].append(record[column])
+
+            if len(batch['time']) >= BATCH_SIZE:
+                self.add_batch(
+                    {name: np.array(values) for name, values in batch.items()}
+                )
+                batch = {column: [] for column in columns}
+
+        if batch['time']:
+            self.add_batch(
+                {name: np.array(values) for name, values in batch.items()}
+            )
+
+    def get_table(self) -> RollupTable:
+        table = RollupTable.merge(self.interval, self.tables)
+        table.tz = self.tz
+        self.tables = [table]
+        return table
+
+
+class RollupCache:
+    """
+    A persistent cache of the rollups of the parts of a dataset. The rollup of a
+    part holds a table per level of LEVELS, stored as a compressed NumPy archive in
+    a hidden directory next to the time index, along with a manifest mapping parts
+    to their archives. The rows of the finest level only store their estimated
+    clients, while the coarser levels store client sketches, so they can be
+    merged. Like the time index, entries are invalidated when the size or
+    modification time of their file changes.
+    """
+
+    VERSION = 1
+    DIRECTORY_NAME = '.rollups'
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, directory: str, entries: dict[str, dict] | None = None):
+        self.directory: str = directory
+        self.entries: dict[str, dict] = entries or dict()
+
+    @staticmethod
+    def load(input_path: str) -> RollupCache:
+        """
+        Load the cache used for an input file or directory. If there is no cache,
+        or it cannot be read, an empty cache is returned.
+        :param input_path: The file or directory to load the cache for.
+        :return: The loaded cache.
+        """
+        directory = os.path.join(
+            os.path.dirname(TimeIndex.get_index_path(input_path)),
+            RollupCache.DIRECTORY_NAME
+        )
+
+        try:
+            with open(os.path.join(directory, RollupCache.MANIFEST_NAME)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return RollupCache(directory)
+
+        if data.get('version') != RollupCache.VERSION:
+            return RollupCache(directory)
+
+        return RollupCache(directory, data.get('entries'))
+
+    def save(self):
+        """
+        Save the manifest of the cache. Failing to write it is not considered an
+        error, as the cache can always be rebuilt.
+        """
+        path = os.path.join(self.directory, self.MANIFEST_NAME)
+        temp_path = path + '.tmp'
+
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, file)
+
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def contains(self, kind: str, file_path: str, part: str | None) -> bool:
+        """
+        Check whether the rollup of a part is cached, and the part has not changed
+        since.
+        """
+        data = self.entries.get(TimeIndex.get_key(kind, file_path, part))
+        return data is not None and data.get('stamp') == TimeIndex.get_stamp(file_path)
+
+    def get(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None,
+            level: int
+    ) -> RollupTable | None:
+        """
+        Get a level of the rollup of a part, if it is cached and the part has not
+        changed since.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :param level: The length of the bins of the level, one of LEVELS.
+        :return: The table of the level, or None if there is no valid rollup.
+        """
+        if not self.contains(kind, file_path, part):
+            return None
+
+        data = self.entries[TimeIndex.get_key(kind, file_path, part)]
+        zone = data.get('zone')
+
+        try:
+            with np.load(os.path.join(self.directory, data['file'])) as arrays:
+                columns = {
+                    name: arrays[f'{level}_{name}'].astype(np.int64)
+                    for name in ('times', 'groups')
+                }
+                columns['counts'] = np.column_stack([
+                    arrays[f'{level}_{metric}'].astype(np.int64)
+                    for metric in METRICS
+                ])
+
+                if f'{level}_sketches' in arrays:
+                    columns['sketches'] = arrays[f'{level}_sketches']
+                else:
+                    columns['clients'] = arrays[f'{level}_clients'].astype(np.int64)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return RollupTable(
+            level,
+            tz=None if zone is None else timezone(timedelta(seconds=zone)),
+            **columns
+        )
+
+    def put(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None,
+            levels: dict[int, RollupTable]
+    ):
+        """
+        Store the rollup of a part and save the manifest, so that the rollups of
+        all parts stored so far are kept if building is interrupted.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :param levels: The table of each level of LEVELS.
+        """
+        key = TimeIndex.get_key(kind, file_path, part)
+        file_name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz'
+        arrays = dict()
+
+        for level, table in levels.items():
+            arrays[f'{level}_times'] = table.times
+            arrays[f'{level}_groups'] = _compact(table.groups)
+
+            for index, metric in enumerate(METRICS):
+                arrays[f'{level}_{metric}'] = _compact(table.counts[:, index])
+
+            if level == LEVELS[0]:
+                arrays[f'{level}_clients'] = _compact(table.get_clients())
+            else:
+                arrays[f'{level}_sketches'] = table.sketches
+
+        tz = levels[LEVELS[0]].tz
+        offset = None if tz is None else tz.utcoffset(None)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, file_name), 'wb') as file:
+                np.savez_compressed(file, **arrays)
+        except OSError:
+            return
+
+        self.entries[key] = {
+            'stamp': TimeIndex.get_stamp(file_path),
+            'file': file_name,
+            'zone': None if offset is None else int(offset.total_seconds())
+        }
+        self.save()
+
+
+def build_part(
+        viewer: Viewer,
+        file_path: str,
+        part: str | None
+) -> dict[int, RollupTable]:
+    """
+    Aggregate all records of a part into the levels of a rollup, reading the part
+    once.
+    :param viewer: A viewer without start and stop times.
+    :param file_path: The path of the file containing the part.
+    :param part: The part within the file, if any.
+    :return: The table of each level of LEVELS.
+    """
+    aggregator = RollupAggregator(LEVELS[0], 0, viewer.SCHEMA)
+
+    if hasattr(viewer, 'read_part_batches'):
+        for batch in viewer.read_part_batches(file_path, part):
+            aggregator.add_batch(batch)
+    else:
+        aggregator.add_records(viewer.read_task((file_path, part, None, None)))
+
+    table = aggregator.get_table()
+    levels = dict()
+
+    # Each level is resampled from the previous one, so that few rows are merged
+    # at a time
+    coarser = table
+    for level in LEVELS[1:]:
+        coarser = coarser.resample(level)
+        levels[level] = coarser
+
+    # The finest level only keeps its estimated clients, since sketches of single
+    # seconds take more space than all other columns
+    table.get_clients()
+    table.sketches = None
+    levels[LEVELS[0]] = table
+
+    return levels
+
+
+def build_rollups(viewer: Viewer) -> list[tuple[str, str | None]]:
+    """
+    Build the rollups of all parts of the input of a viewer that are not cached.
+    :param viewer: The viewer of the input.
+    :return: The parts whose rollups were built.
+    """
+    kind = type(viewer).__name__
+    cache = RollupCache.load(viewer.input_path)
+    reader = type(viewer)(viewer.input_path, None, None)
+    built = []
+
+    for file_path, part in viewer.ordered_files:
+        if not cache.contains(kind, file_path, part):
+            cache.put(kind, file_path, part, build_part(reader, file_path, part))
+            built.append((file_path, part))
+
+    return built
+
+
+def query_rollups(
+        viewer: Viewer,
+        interval: int,
+        parts: list[str] | str | None = None,
+        clients: bool = True
+) -> RollupTable | None:
+    """
+    Aggregate the records of some parts within the start and stop time of a
+    viewer from the rollups of the parts, into bins aligned to the start time, or
+    to the epoch if there is no start time, like the bins of Histogram. The
+    coarsest level of the rollups whose bins fit the bins is used, and the end of
+    the time range that does not fill a bin of the level is taken from the finest
+    level. The rollups count all records of a part within the time range, which is
+    what the viewer reads if the part is ordered by time.
+    :param viewer: The viewer to aggregate the records of.
+    :param interval: The length of the bins in seconds.
+    :param parts: The parts to aggregate, as passed to Viewer.read.
+    :param clients: Whether the distinct clients of the bins are required.
+    :return: The aggregated records, or None if the records have to be aggregated
+    by reading them, since a part has no rollup, the time range does not start at
+    a whole second, or the clients are required but cannot be estimated from the
+    rollups.
+    """
+    start, stop = viewer.time_bounds()
+    if start is not None and start != int(start):
+        return None
+
+    origin = 0 if start is None else int(start)
+    first = None if start is None else origin
+    level = max(
+        level for level in LEVELS
+        if origin % level == 0 and interval % level == 0
+    )
+
+    # The end of the time range in whole seconds, exclusive
+    end = None
+    if stop is not None:
+        end = int(stop) + 1 if viewer.INCLUDES_STOP else -int(-stop // 1)
+
+    aligned = None if end is None else end - (end - origin) % level
+    kind = type(viewer).__name__
+    cache = RollupCache.load(viewer.input_path)
+    tables = []
+
+    for file_path, part in viewer.resolve_parts(parts):
+        table = cache.get(kind, file_path, part, level)
+        if table is None:
+            return None
+
+        tables.append(table.select(first, aligned))
+
+        if aligned != end:
+            tail = cache.get(kind, file_path, part, LEVELS[0])
+            tables.append(tail.select(aligned, end).resample(level))
+
+    table = RollupTable.merge(level, tables).resample(interval, origin)
+    if clients and table.get_clients() is None:
+        return None
+
+    return table
+
+
+def aggregate_records(
+        viewer: Viewer,
+        interval: int,
+        parts: list[str] | str | None = None
+) -> RollupTable:
+    """
+    Aggregate the records of some parts within the start and stop time of a
+    viewer by reading them, into the same bins as query_rollups.
+    :param viewer: The viewer to aggregate the records of.
+    :param interval: The length of the bins in seconds.
+    :param parts: The parts to aggregate, as passed to Viewer.read.
+    :return: The aggregated records.
+    """
+    origin = 0 if viewer.start_time is None else int(viewer.start_time.timestamp())
+    aggregator = RollupAggregator(interval, origin, viewer.SCHEMA)
+
+    if hasattr(viewer, 'read_batches'):
+        for batch in viewer.read_batches(parts):
+            aggregator.add_batch(batch)
+    else:
+        aggregator.add_records(viewer.read(parts))
+
+    return aggregator.get_table()
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(
+        description='Build the rollups of a dataset, which view.py uses to '
+                    'aggregate records per second, minute or hour without reading '
+                    'them.'
+    )
+
+    parser.add_argument(
+        '--dataset',
+        help='The type of dataset to build the rollups of',
+        choices=DatasetType.get_option_names(),
+        dest='dataset'
+    )
+
+    parser.add_argument(
+        '--input',
+        help='The input location to read from',
+        dest='input'
+    )
+
+    return parser.parse_args(sys.argv[1:])
+
+
+def main():
+    # The view module uses this module, so it is only imported when run
+    from view import viewer_map
+
+    options = parse_options()
+    dataset = DatasetType.parse(options.dataset)
+    viewer = viewer_map[dataset](options.input, None, None)
+
+    for file_path, part in build_rollups(viewer):
+        sys.stderr.write(f'Built {file_path}{f" ({part})" if part else ""}\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta
+from typing import Callable
+
+import numpy as np
+
+from scaling_time_options import ScalingTimeOptions
+from service_instance_state import ServiceInstanceState
+from service_snapshot import ServiceSnapshot
+
+# Times are stored as integer microseconds since the creation of the service, which
+# is the resolution of datetime, so comparisons are exact
+MICROSECOND = timedelta(microseconds=1)
+
+# The time of transitions that have not been scheduled
+NEVER = np.iinfo(np.int64).max
+
+# The states entered at the started, ready, terminate and off times, in order
+TRANSITIONS = [
+    ServiceInstanceState.STARTING,
+    ServiceInstanceState.READY,
+    ServiceInstanceState.TERMINATING,
+    ServiceInstanceState.OFF
+]
+
+
+class ArrayTargetService:
+    """
+    A target service storing its instances as arrays of their transition times
+    rather than as TargetServiceInstance objects. States are computed for all
+    instances at once by comparing the transition times with the current time,
+    and states are counted with bincount. The service behaves exactly like
+    TargetService: given the same random numbers, updates result in the same
+    loads, states and counts.
+
+    The arrays are ordered like the instance deque of TargetService, but reversed,
+    so that the new instances TargetService adds to the left of the deque can be
+    appended to the end of the arrays.
+    """
+
+    def __init__(
+            self,
+            current_time: datetime,
+            applied_load: float,
+            scale_up_time: ScalingTimeOptions,
+            scale_down_time: ScalingTimeOptions,
+            starting_instances: int = 0,
+            ready_instances: int = 0,
+            instance_load: float = 1,
+            instance_baseline_load: float = 0.05,
+            starting_load: float = 1,
+            terminating_load: float = 1,
+            rng: random.Random | None = None
+    ):
+        """
+        Constructs a new array-backed target service. The parameters are the same
+        as those of TargetService.
+        """
+        self.current_time: datetime = current_time
+        self.applied_load: float = applied_load
+        self.scale_up_time: ScalingTimeOptions = scale_up_time
+        self.scale_down_time: ScalingTimeOptions = scale_down_time
+        self.instance_load_capability: float = instance_load
+        self.instance_baseline_load: float = instance_baseline_load
+        self.starting_load: float = starting_load
+        self.terminating_load: float = terminating_load
+        self.experienced_load: float = 0
+        self.processed_load: float = 0
+        self.start_time: datetime = datetime.now()
+        self.base_time: datetime = current_time
+        self.rng: random.Random | None = rng
+
+        # The times of the state transitions scheduled by the last update, or by
+        # the constructor, in the order they were scheduled
+        self.transitions: list[datetime] = []
+
+        # The load of an instance in each state, indexed by state value
+        self.state_loads: np.ndarray = np.zeros(len(ServiceInstanceState))
+        self.state_loads[ServiceInstanceState.STARTING.value] = starting_load
+        self.state_loads[ServiceInstanceState.READY.value] = instance_baseline_load
+        self.state_loads[ServiceInstanceState.TERMINATING.value] = terminating_load
+
+        # The transition times of the instances, one row per transition in the
+        # order of TRANSITIONS, and the state of each instance
+        self.size: int = 0
+        self.times: np.ndarray = np.full((len(TRANSITIONS), 16), NEVER, dtype=np.int64)
+        self.states: np.ndarray = np.zeros(16, dtype=np.int8)
+
+        self.transitions.extend(
+            scale_up_time.random(start_time=current_time, rng=rng)
+            for _ in range(starting_instances)
+        )
+
+        ready = [(0, 0) for _ in range(ready_instances)]
+        starting = [(0, self._get_time(time)) for time in self.transitions]
+
+        for started, ready_time in reversed(starting + ready):
+            self._append(started, ready_time, 0)
+
+        self.counts: dict[ServiceInstanceState, int] = self._count_states()
+        self.total_load_capability: float = self._sum_repeated(
+            instance_load,
+            self.count(ServiceInstanceState.READY)
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def elapsed(self) -> timedelta:
+        return self.current_time - self.start_time
+
+    def _get_time(self, time: datetime) -> int:
+        return (time - self.base_time) // MICROSECOND
+
+    def _append(self, started: int, ready: int, now: int):
+        """
+        Add an instance to the end of the arrays, i.e. the left of the deque.
+        """
+        if self.size == len(self.states):
+            self.times = np.concatenate(
+                (self.times, np.full_like(self.times, NEVER)),
+                axis=1
+            )
+            self.states = np.concatenate((self.states, np.zeros_like(self.states)))
+
+        self.times[0, self.size] = started
+        self.times[1, self.size] = ready
+        self.states[self.size] = ServiceInstanceState.READY.value if ready <= now \
+            else ServiceInstanceState.STARTING.value
+
+        self.size += 1
+
+    def _update_states(self, now: int):
+        """
+        Compute the state of each instance at a time. Like
+        TargetServiceInstance._get_state, the state is the last state in the order
+        of TRANSITIONS whose transition time has passed.
+        """
+        times = self.times[:, :self.size]
+        states = np.full(self.size, ServiceInstanceState.PENDING.value, dtype=np.int8)
+
+        for row, state in enumerate(TRANSITIONS):
+            states[times[row] <= now] = state.value
+
+        self.states[:self.size] = states
+
+    def _count_states(self) -> dict[ServiceInstanceState, int]:
+        counts = np.bincount(
+            self.states[:self.size],
+            minlength=len(ServiceInstanceState)
+        )
+
+        return {state: int(counts[state.value]) for state in ServiceInstanceState}
+
+    def count(self, state: ServiceInstanceState) -> int:
+        """
+        Counts the current number of services of a specified state.
+        :param state: The state to count service instances of.
+        :return: The number of instances of the service with the specified state.
+        """
+        return int(np.count_nonzero(self.states[:self.size] == state.value))
+
+    def get_snapshot(self) -> ServiceSnapshot:
+        """
+        Get the current state of the service as seen by a scaling policy, like
+        TargetService.get_snapshot.
+        """
+        return ServiceSnapshot(
+            time=self.current_time,
+            applied_load=self.applied_load,
+            processed_load=self.processed_load,
+            experienced_load=self.experienced_load,
+            total_load_capability=self.total_load_capability,
+            instance_capability=self.instance_load_capability -
+                                self.instance_baseline_load,
+            counts=np.bincount(
+                self.states[:self.size],
+                minlength=len(ServiceInstanceState)
+            )
+        )
+
+    def get_victims(self, count: int) -> np.ndarray:
+        """
+        Get the most viable instances to be terminated, in the same order as
+        TargetService.get_victims.
+        :param count: The number of instances to return
+        :return: An array of the indices of the victim instances.
+        """
+        # Reverse the arrays to deque order, so that the stable sorts order
+        # instances with the same times like TargetService does
+        states = self.states[self.size - 1::-1] if self.size else self.states[:0]
+        indices = np.arange(self.size - 1, -1, -1)
+        victims = []
+
+        for row, state in [(0, ServiceInstanceState.STARTING),
+                           (1, ServiceInstanceState.READY)]:
+            candidates = indices[states == state.value]
+            order = np.argsort(self.times[row, candidates], kind='stable')
+            victims.append(candidates[order])
+
+        return np.concatenate(victims)[:count]
+
+    def cleanup(self):
+        """
+        Remove instances in the OFF state.
+        """
+        keep = self.states[:self.size] != ServiceInstanceState.OFF.value
+        size = int(np.count_nonzero(keep))
+
+        if size == self.size:
+            return
+
+        self.times[:, :size] = self.times[:, :self.size][:, keep]
+        self.times[:, size:self.size] = NEVER
+        self.states[:size] = self.states[:self.size][keep]
+        self.size = size
+
+    @staticmethod
+    def _sum_repeated(value: float, count: int) -> float:
+        """
+        Sum a value a number of times, with the same rounding as adding it one by
+        one to 0.
+        """
+        if count == 0:
+            return 0
+
+        return float(np.cumsum(np.full(count, value))[-1])
+
+    def _calculate_experienced_load(self):
+        """
+        Get the total and processed loads, like
+        TargetService._calculate_experienced_load. The loads are summed in the
+        order of the deque using cumsum, which unlike sum adds the values one by
+        one, so the results are exactly the same.
+        """
+        states = self.states[self.size - 1::-1] if self.size else self.states[:0]
+        loads = self.state_loads[states]
+        total_load = float(np.cumsum(loads)[-1]) if self.size else 0.
+
+        total_load_capability = self._sum_repeated(
+            self.instance_load_capability - self.instance_baseline_load,
+            int(np.count_nonzero(states == ServiceInstanceState.READY.value))
+        )
+
+        processed_load = min(self.applied_load, total_load_capability)
+        total_load += processed_load
+
+        return total_load, processed_load, total_load_capability
+
+    def update(self, current_time: datetime, applied_load: float,
+               delta_instances: int | Callable[[ArrayTargetService], int]):
+        """
+        Updates the instances of the service with the current time, and scales the
+        system if necessary, like TargetService.update.
+        :param current_time: The current simulated time.
+        :param applied_load: The current load applied to the system.
+        :param delta_instances: The number of instances to add/remove, or a function
+        receiving this class instance that returns the number of instances to
+        add/remove.
+        """
+        self.current_time = current_time
+        self.applied_load = applied_load
+        self.transitions = []
+        now = self._get_time(current_time)
+
+        self._update_states(now)
+
+        self.experienced_load, self.processed_load, self.total_load_capability = \
+            self._calculate_experienced_load()
+
+        if not isinstance(delta_instances, int):
+            delta_instances = delta_instances(self)
+
+        # Victims keep their current state until the next update, like instances
+        # of TargetService, whose state is only updated with the time
+        if delta_instances < 0:
+            for victim in self.get_victims(abs(delta_instances)):
+                off_time = self.scale_down_time.random(
+                    start_time=current_time,
+                    rng=self.rng
+                )
+                self.times[2, victim] = now
+                self.times[3, victim] = self._get_time(off_time)
+                self.transitions.append(off_time)
+        elif delta_instances > 0:
+            ready_time = self.scale_up_time.random(
+                start_time=current_time,
+                rng=self.rng
+            )
+            self._append(now, self._get_time(ready_time), now)
+            self.transitions.append(ready_time)
+
+        self.counts = self._count_states()
+        self.cleanup()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+from datetime import datetime, timedelta
+from typing import Callable
+
+import numpy as np
+
+from array_target_service import ArrayTargetService
+from service_instance_state import ServiceInstanceState
+from target_service import TargetService
+
+# The metrics sampled by simulate_events
+METRICS = [
+    'experienced_load',
+    'processed_load',
+    'total_load_capability',
+    'ready_instances',
+    'instances'
+]
+
+# The metrics summed over the ticks of each sample by simulate_events. Overloaded
+# ticks are ticks where the service could not process all of the applied load.
+TOTALS = [
+    'overloaded_ticks',
+    'instance_ticks'
+]
+
+
+def add_span(totals: np.ndarray, first: int, end: int, value: float, resolution: int):
+    """
+    Add a value to the totals of the samples for every tick from first to end.
+    :param totals: The totals of each sample, where sample i covers the ticks from
+    i * resolution to (i + 1) * resolution.
+    :param first: The first tick.
+    :param end: The tick after the last tick.
+    :param value: The value of each tick.
+    :param resolution: The number of ticks per sample.
+    """
+    first_sample = first // resolution
+    last_sample = (end - 1) // resolution
+
+    if first_sample == last_sample:
+        totals[first_sample] += value * (end - first)
+        return
+
+    totals[first_sample] += value * ((first_sample + 1) * resolution - first)
+    totals[first_sample + 1:last_sample] += value * resolution
+    totals[last_sample] += value * (end - last_sample * resolution)
+
+
+class EventScheduler:
+    """
+    A priority queue of the ticks at which the state of a service changes on its
+    own, i.e. at which a scheduled instance transition has passed. Transitions are
+    added as the service schedules them, and are never removed, so the queue may
+    contain ticks of instances that have since been terminated or removed. Such
+    ticks only cause an unnecessary update, which does not change the result.
+    """
+
+    def __init__(self, start_time: datetime, step: timedelta):
+        """
+        Constructs a new scheduler.
+        :param start_time: The time before the first tick.
+        :param step: The time between ticks, where tick i is at start_time plus
+        i + 1 steps.
+        """
+        self.start_time: datetime = start_time
+        self.step: timedelta = step
+        self.queue: list[int] = []
+
+    def get_tick(self, time: datetime) -> int:
+        """
+        Get the first tick at or after a time.
+        """
+        return max(0, -((self.start_time - time) // self.step) - 1)
+
+    def add(self, times: list[datetime]):
+        for time in times:
+            heapq.heappush(self.queue, self.get_tick(time))
+
+    def next_tick(self, tick: int) -> int | None:
+        """
+        Get the first scheduled tick after a tick, discarding earlier ticks.
+        :param tick: The current tick.
+        :return: The next scheduled tick, or None if nothing is scheduled.
+        """
+        while self.queue and self.queue[0] <= tick:
+            heapq.heappop(self.queue)
+
+        return self.queue[0] if self.queue else None
+
+
+def simulate_events(
+        service: TargetService | ArrayTargetService,
+        per_second_loads: list[float] | np.ndarray,
+        delta_instances: int | Callable[[TargetService | ArrayTargetService], int],
+        step: timedelta = timedelta(seconds=1),
+        resolution: int = 1
+) -> dict[str, np.ndarray]:
+    """
+    Simulate a service like updating it once per tick with the applied load of
+    the tick, but only update the service at ticks where its state can change.
+    After an update that did not scale the service or turn off any instances, the
+    service keeps the same loads and counts until either an instance transition
+    or a change of the applied load, so the ticks in between are skipped. This
+    requires delta_instances to depend only on the loads and counts of the
+    service, which calculate_instances does. The result is exactly the same as
+    updating the service every tick, including the random scaling times, since
+    skipped ticks never scale the service.
+    :param service: The service to simulate, at the time before the first tick.
+    :param per_second_loads: The applied load of each tick.
+    :param delta_instances: The number of instances to add/remove, or a function
+    receiving the service returning the number of instances to add/remove, as
+    passed to update.
+    :param step: The time between ticks.
+    :param resolution: The number of ticks between samples of the metrics.
+    :return: A dictionary mapping the names of the METRICS to arrays of their
+    values, sampled every resolution ticks starting with the first tick, and the
+    names of the TOTALS to arrays of their sums over the ticks of each sample.
+    """
+    start_time = service.current_time
+    loads = np.asarray(per_second_loads)
+    tick_count = len(loads)
+
+    # The ticks at which the applied load changes
+    load_changes = (np.flatnonzero(loads[1:] != loads[:-1]) + 1).tolist()
+
+    scheduler = EventScheduler(start_time, step)
+    scheduler.add(service.transitions)
+
+    samples = {
+        metric: np.zeros(math.ceil(tick_count / resolution))
+        for metric in METRICS + TOTALS
+    }
+
+    delta = 0
+
+    def get_delta(target: TargetService | ArrayTargetService) -> int:
+        nonlocal delta
+        delta = delta_instances if isinstance(delta_instances, int) else \
+            delta_instances(target)
+        return delta
+
+    tick = 0
+    while tick < tick_count:
+        service.update(
+            current_time=start_time + step * (tick + 1),
+            applied_load=loads[tick].item(),
+            delta_instances=get_delta
+        )
+        scheduler.add(service.transitions)
+
+        if delta != 0 or service.counts[ServiceInstanceState.OFF] > 0:
+            next_tick = tick + 1
+        else:
+            next_change = bisect.bisect_right(load_changes, tick)
+            next_tick = min(
+                scheduler.next_tick(tick) or tick_count,
+                load_changes[next_change] if next_change < len(load_changes)
+                else tick_count,
+                tick_count
+            )
+
+        # Fill the samples of the ticks until the next update, which all have the
+        # same values
+        first = -(-tick // resolution)
+        last = -(-next_tick // resolution)
+
+        samples['experienced_load'][first:last] = service.experienced_load
+        samples['processed_load'][first:last] = service.processed_load
+        samples['total_load_capability'][first:last] = service.total_load_capability
+        samples['ready_instances'][first:last] = \
+            service.counts[ServiceInstanceState.READY]
+        samples['instances'][first:last] = len(service)
+
+        if service.processed_load < service.applied_load:
+            add_span(samples['overloaded_ticks'], tick, next_tick, 1, resolution)
+
+        add_span(samples['instance_ticks'], tick, next_tick, len(service), resolution)
+
+        tick = next_tick
+
+    return samples
@@ -1,10 +1,15 @@
 import argparse
-import math
 import sys
 from datetime import datetime, timedelta
+from typing import Callable
 
 from matplotlib import pyplot as plt
 
+from array_target_service import ArrayTargetService
+from event_simulation import simulate_events
+from load_replay import read_load_profile
+from scaling_policy import ThresholdPolicy, TargetTrackingPolicy, StepPolicy, \
+    PredictivePolicy
 from scaling_time_options import ScalingTimeOptions
 from service_instance_state import ServiceInstanceState
 from target_service import TargetService
@@ -16,6 +21,12 @@ SCALE_DOWN_TIME = ScalingTimeOptions(mean_time=10, std_dev=5)
 # average instance load is within this threshold of 0.5, i.e. 0.3 to 0.7
 SCALING_THRESHOLD = 0.2
 
+# The desired average load of each instance
+DESIRED_MEAN_LOAD = 0.5
+
+# The scaling policies that can be simulated
+POLICIES = ['threshold', 'target', 'step', 'predictive']
+
 # The minutes of the simulation
 SIMULATION_MINUTES = 35
 
@@ -36,40 +47,31 @@ LOW_LOAD = 0.2
 
 
 def calculate_instances(
-        service: TargetService
+        service: TargetService | ArrayTargetService,
+        scaling_threshold: float = SCALING_THRESHOLD,
+        desired_mean_load: float = DESIRED_MEAN_LOAD
 ) -> int:
-    processed_load = service.processed_load
-    process_capability = service.total_load_capability
-
-    process_utilization = 0 if processed_load == 0 else \
-        processed_load / process_capability
-
-    desired_mean_load = 0.5
-    upper_threshold = desired_mean_load + SCALING_THRESHOLD
-    lower_threshold = desired_mean_load - SCALING_THRESHOLD
-
-    if lower_threshold < process_utilization < upper_threshold:
-        return 0
-
-    scaling_factor = process_utilization / desired_mean_load
-    current_instances = service.count(ServiceInstanceState.READY)
-    starting_instances = service.count(ServiceInstanceState.STARTING)
-    terminating_instances = service.count(ServiceInstanceState.TERMINATING)
-
-    down_instances = math.ceil(
-        (current_instances - terminating_instances) * scaling_factor
-    )
-
-    up_instances = math.ceil(
-        (current_instances + starting_instances) * scaling_factor
-    )
-
-    if scaling_factor > 1:
-        return up_instances
-    elif current_instances - down_instances > 0:
-        return -down_instances
+    policy = ThresholdPolicy(scaling_threshold, desired_mean_load)
+    return policy.decide(service.get_snapshot())
+
+
+def create_policy(name: str) -> Callable[[TargetService | ArrayTargetService], int]:
+    """
+    Create one of the POLICIES, configured like calculate_instances where possible.
+    :param name: The name of the policy.
+    :return: The policy, to pass as delta_instances.
+    """
+    if name == 'target':
+        return TargetTrackingPolicy(DESIRED_MEAN_LOAD)
+    elif name == 'step':
+        return StepPolicy()
+    elif name == 'predictive':
+        return PredictivePolicy(
+            horizon=SCALE_UP_TIME.mean_time,
+            target_utilization=DESIRED_MEAN_LOAD
+        )
 
-    return 0
+    return calculate_instances
 
 
 def plot_loads(
@@ -106,17 +108,25 @@ def plot_loads(
         plt.show()
 
 
-def simulate_run():
+def generate_loads() -> list[float]:
     # High load for a minute every 5 minutes
-    per_second_loads = [
+    return [
         HIGH_LOAD if (i // PEAK_FREQUENCY) % PEAK_DIVISOR == PEAK_PHASE else LOW_LOAD
         for i in range(SIMULATION_MINUTES * 60)
     ]
 
+
+def simulate_run(
+        per_second_loads: list[float],
+        service_type: type[TargetService | ArrayTargetService] = TargetService,
+        event_driven: bool = False,
+        policy: Callable[[TargetService | ArrayTargetService], int] =
+        calculate_instances
+):
     current_time = datetime.now()
     step = timedelta(seconds=1)
 
-    service = TargetService(
+    service = service_type(
         current_time=current_time,
         applied_load=per_second_loads[0],
         scale_up_time=SCALE_UP_TIME,
@@ -124,6 +134,21 @@ def simulate_run():
         ready_instances=1
     )
 
+    minutes = [
+        i / 60
+        for i in range(len(per_second_loads))
+    ]
+
+    if event_driven:
+        samples = simulate_events(service, per_second_loads, policy)
+        return (
+            minutes,
+            per_second_loads,
+            samples['experienced_load'].tolist(),
+            samples['instances'].astype(int).tolist(),
+            samples['ready_instances'].astype(int).tolist()
+        )
+
     experienced_loads = []
     ready_instances = []
     instances = []
@@ -133,17 +158,12 @@ def simulate_run():
         service.update(
             current_time=current_time,
             applied_load=load,
-            delta_instances=calculate_instances
+            delta_instances=policy
         )
 
         experienced_loads.append(service.experienced_load)
         ready_instances.append(service.count(ServiceInstanceState.READY))
-        instances.append(len(service.instances))
-
-    minutes = [
-        i / 60
-        for i in range(SIMULATION_MINUTES * 60)
-    ]
+        instances.append(len(service))
 
     return minutes, per_second_loads, experienced_loads, instances, ready_instances
 
@@ -173,12 +193,74 @@ def parse_args(args):
         default='example-result.png'
     )
 
+    parser.add_argument(
+        '--load-profile',
+        dest='load_profile',
+        type=str,
+        help='A load profile created by load_profile.py to replay instead of the '
+             'generated load.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--requests-per-load',
+        dest='requests_per_load',
+        type=float,
+        help='The number of requests per second of the load profile one instance '
+             'can handle. Default is 1.',
+        default=1.
+    )
+
+    parser.add_argument(
+        '--arrays',
+        dest='use_arrays',
+        help='Whether to simulate the service using the array-backed '
+             'ArrayTargetService, which is faster for many instances.',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--events',
+        dest='event_driven',
+        help='Whether to only update the service when its state can change, '
+             'instead of every second. The result is the same.',
+        action='store_true'
+    )
+
+    parser.add_argument(
+        '--policy',
+        dest='policy',
+        choices=POLICIES,
+        help='The scaling policy to simulate. Default is threshold.',
+        default='threshold'
+    )
+
     return parser.parse_args(args)
 
 
 def main():
     options = parse_args(sys.argv[1:])
-    args = simulate_run()
+
+    if options.load_profile is not None:
+        per_second_loads = read_load_profile(
+            options.load_profile,
+            options.requests_per_load
+        ).tolist()
+    else:
+        per_second_loads = generate_loads()
+
+    policy = create_policy(options.policy)
+    if options.event_driven and getattr(policy, 'history_size', 1) > 1:
+        sys.exit(f'The {options.policy} policy cannot be simulated with --events, '
+                 f'as it depends on the history of every update.')
+
+    service_type = ArrayTargetService if options.use_arrays else TargetService
+    args = simulate_run(
+        per_second_loads,
+        service_type,
+        options.event_driven,
+        policy
+    )
     plot_loads(
         *args,
         show_plot=options.show_figure,
@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from event_simulation import METRICS, TOTALS, simulate_events
+from example import SCALE_DOWN_TIME, SCALE_UP_TIME, SCALING_THRESHOLD, \
+    DESIRED_MEAN_LOAD, generate_loads
+from load_replay import read_load_profile
+from scaling_policy import ThresholdPolicy
+from scaling_time_options import ScalingTimeOptions
+from service_instance_state import ServiceInstanceState
+from service_snapshot import ServiceSnapshot, SnapshotBatch
+from target_service import TargetService
+
+
+def get_delay(options: ScalingTimeOptions, step: timedelta) -> int:
+    """
+    Get the number of ticks a deterministic scaling time takes, i.e. the number of
+    ticks after the tick an instance is started or terminated at which its next
+    state is reached.
+    """
+    if options.std_dev != 0:
+        raise ValueError('Fast simulations require scaling times with a standard '
+                         'deviation of 0.')
+
+    return -(-timedelta(seconds=max(0., options.mean_time)) // step)
+
+
+class CapabilityTable:
+    """
+    The total load capability of each number of ready instances, computed by adding
+    the capability of an instance one by one like TargetService does, so the
+    capabilities are exactly the same as those of the service.
+    """
+
+    def __init__(self, instance_capability: float):
+        self.instance_capability: float = instance_capability
+        self.values: np.ndarray = np.zeros(1)
+
+    def get(self, ready: np.ndarray) -> np.ndarray:
+        if ready.max() >= len(self.values):
+            size = max(2 * len(self.values), int(ready.max()) + 1)
+            self.values = np.concatenate(
+                ([0.], np.cumsum(np.full(size - 1, self.instance_capability)))
+            )
+
+        return self.values[ready]
+
+
+def simulate_config(
+        loads: np.ndarray,
+        up_delay: int,
+        down_delay: int,
+        policy: ThresholdPolicy,
+        capabilities: CapabilityTable,
+        starting_instances: int = 0,
+        ready_instances: int = 1
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Simulate a configuration, only stopping at the ticks at which instances change
+    state or the policy scales the service. In between, the counts of instances
+    are constant, so the policy is evaluated for all ticks until the next
+    transition with one call to decide_batch, to find the first tick at which it
+    scales the service.
+    :param loads: The applied load of each tick.
+    :param up_delay: The number of ticks it takes to start an instance.
+    :param down_delay: The number of ticks it takes to terminate an instance.
+    :param policy: The policy scaling the service.
+    :param capabilities: The total load capabilities of the service.
+    :param starting_instances: The number of starting instances at the start.
+    :param ready_instances: The number of ready instances at the start.
+    :return: The changes of the number of ready, starting and terminating instances
+    at each tick, before the policy is applied, with a row per state, and whether
+    an instance was added at each tick.
+    """
+    tick_count = len(loads)
+    changes = np.zeros((3, tick_count), dtype=np.int32)
+    added = np.zeros(tick_count, dtype=np.int8)
+
+    # Terminated instances are off at the earliest at the next update, as their
+    # state is only updated then
+    down_delay = max(down_delay, 1)
+
+    # The ticks at which starting instances become ready, which are in the order
+    # the instances were started, and the ticks at which terminating instances
+    # become off with the number of instances
+    ready_ticks: deque[int] = deque()
+    off_ticks: deque[list[int]] = deque()
+
+    # Instances started by the constructor are started the tick before the first
+    ready, starting, terminating = 0, 0, 0
+    if up_delay == 0:
+        ready_instances += starting_instances
+    else:
+        ready_ticks.extend([up_delay - 1] * starting_instances)
+
+    # The changes caused by the policy at the last tick, which take effect at the
+    # next tick, as the number of ready, starting and terminating instances
+    pending = (ready_instances, starting_instances, 0)
+    ready_victims, starting_victims = 0, 0
+
+    tick = 0
+    while tick < tick_count:
+        previous = (ready, starting, terminating)
+
+        ready += pending[0] - ready_victims
+        starting += pending[1] - starting_victims
+        terminating += pending[2] + ready_victims + starting_victims
+        pending = (0, 0, 0)
+        ready_victims, starting_victims = 0, 0
+
+        while ready_ticks and ready_ticks[0] == tick:
+            ready_ticks.popleft()
+            ready += 1
+            starting -= 1
+
+        off_count = off_ticks.popleft()[1] \
+            if off_ticks and off_ticks[0][0] == tick else 0
+        terminating -= off_count
+
+        changes[:, tick] = (
+            ready - previous[0],
+            starting - previous[1],
+            terminating - previous[2]
+        )
+
+        next_transition = min(
+            ready_ticks[0] if ready_ticks else tick_count,
+            off_ticks[0][0] if off_ticks else tick_count,
+            tick_count
+        )
+        total_load_capability = float(capabilities.get(np.array([ready]))[0])
+
+        counts = np.zeros(len(ServiceInstanceState), dtype=np.int64)
+        counts[ServiceInstanceState.READY.value] = ready
+        counts[ServiceInstanceState.STARTING.value] = starting
+        counts[ServiceInstanceState.TERMINATING.value] = terminating
+        counts[ServiceInstanceState.OFF.value] = off_count
+
+        # The policy is likely to scale the service again right after a transition
+        # or scaling, so the current tick is evaluated on its own first
+        decision_tick = tick
+        delta = policy.decide(ServiceSnapshot(
+            time=None,
+            applied_load=float(loads[tick]),
+            processed_load=min(float(loads[tick]), total_load_capability),
+            experienced_load=None,
+            total_load_capability=total_load_capability,
+            instance_capability=capabilities.instance_capability,
+            counts=counts
+        ))
+
+        # Otherwise, find the first tick before the next transition at which the
+        # service is scaled, evaluating the policy for growing spans of ticks
+        counts[ServiceInstanceState.OFF.value] = 0
+        first = tick + 1
+        span = 16
+
+        while delta == 0 and first < next_transition:
+            end = min(next_transition, first + span)
+            applied_loads = loads[first:end]
+
+            deltas = policy.decide_batch(SnapshotBatch(
+                applied_loads,
+                np.minimum(applied_loads, total_load_capability),
+                np.full(end - first, total_load_capability),
+                capabilities.instance_capability,
+                np.broadcast_to(counts, (end - first, len(counts)))
+            ))
+
+            scaled = np.flatnonzero(deltas)
+            if len(scaled) > 0:
+                decision_tick, delta = first + scaled[0], int(deltas[scaled[0]])
+
+            first = end
+            span *= 2
+
+        if delta < 0:
+            # Victims are the oldest starting instances, which with deterministic
+            # scaling times are the ones that become ready first, and then ready
+            # instances, which are all alike
+            victims = min(-delta, starting + ready)
+            starting_victims = min(victims, starting)
+            ready_victims = victims - starting_victims
+
+            for _ in range(starting_victims):
+                ready_ticks.popleft()
+
+            off_tick = decision_tick + down_delay
+            if off_ticks and off_ticks[-1][0] == off_tick:
+                off_ticks[-1][1] += victims
+            else:
+                off_ticks.append([off_tick, victims])
+        elif delta > 0:
+            added[decision_tick] = 1
+
+            if up_delay == 0:
+                pending = (1, 0, 0)
+            else:
+                pending = (0, 1, 0)
+                ready_ticks.append(decision_tick + up_delay)
+
+        tick = decision_tick + 1 if delta != 0 else next_transition
+
+    return changes, added
+
+
+def simulate_fast(
+        per_second_loads: list[float] | np.ndarray,
+        scale_up_time: ScalingTimeOptions | list[ScalingTimeOptions],
+        scale_down_time: ScalingTimeOptions | list[ScalingTimeOptions],
+        scaling_threshold: float | list[float] = SCALING_THRESHOLD,
+        desired_mean_load: float | list[float] = DESIRED_MEAN_LOAD,
+        starting_instances: int = 0,
+        ready_instances: int = 1,
+        instance_load: float = 1,
+        instance_baseline_load: float = 0.05,
+        starting_load: float = 1,
+        terminating_load: float = 1,
+        step: timedelta = timedelta(seconds=1),
+        resolution: int = 1
+) -> dict[str, np.ndarray]:
+    """
+    Simulate a service scaled by a ThresholdPolicy with deterministic scaling
+    times, for one or more configurations of the policy. As every instance takes
+    the same time to start or terminate, instances are not tracked individually,
+    and the simulation only stops at the ticks at which the state of the service
+    changes, see simulate_config. The number of instances in each state at every
+    tick is then computed with cumulative sums, and the loads and capabilities of
+    all ticks from those with array operations. The results are the same as
+    updating a TargetService once per tick with the policy, with the experienced
+    load only differing by rounding.
+    :param per_second_loads: The applied load of each tick.
+    :param scale_up_time: The time it takes to start an instance, with a standard
+    deviation of 0, or a list of such times per configuration.
+    :param scale_down_time: The time it takes to terminate an instance, with a
+    standard deviation of 0, or a list of such times per configuration.
+    :param scaling_threshold: The scaling threshold of the policy, or a list of
+    thresholds per configuration.
+    :param desired_mean_load: The desired mean load of the policy, or a list of
+    loads per configuration.
+    :param starting_instances: The number of starting instances at the start.
+    :param ready_instances: The number of ready instances at the start.
+    :param instance_load: How much load one instance of the service can handle.
+    :param instance_baseline_load: The load of an instance when ready.
+    :param starting_load: The load of an instance when starting.
+    :param terminating_load: The load of an instance when terminating.
+    :param step: The time between ticks.
+    :param resolution: The number of ticks between samples of the metrics.
+    :return: A dictionary mapping the names of the METRICS and TOTALS of
+    simulate_events to arrays with a row of samples per configuration.
+    """
+    loads = np.asarray(per_second_loads, dtype=float)
+    tick_count = len(loads)
+
+    if not isinstance(scale_up_time, list):
+        scale_up_time = [scale_up_time]
+    if not isinstance(scale_down_time, list):
+        scale_down_time = [scale_down_time]
+
+    up_delays, down_delays, scaling_thresholds, desired_mean_loads = \
+        np.broadcast_arrays(
+            np.array([get_delay(options, step) for options in scale_up_time]),
+            np.array([get_delay(options, step) for options in scale_down_time]),
+            np.asarray(scaling_threshold, dtype=float),
+            np.asarray(desired_mean_load, dtype=float)
+        )
+
+    capabilities = CapabilityTable(instance_load - instance_baseline_load)
+    sample_ticks = np.arange(0, tick_count, resolution)
+    rows = []
+
+    for up_delay, down_delay, threshold, mean_load in zip(
+            up_delays,
+            down_delays,
+            scaling_thresholds,
+            desired_mean_loads
+    ):
+        changes, added = simulate_config(
+            loads,
+            int(up_delay),
+            int(down_delay),
+            ThresholdPolicy(float(threshold), float(mean_load)),
+            capabilities,
+            starting_instances,
+            ready_instances
+        )
+
+        ready, starting, terminating = np.cumsum(changes, axis=1, dtype=np.int64)
+        total_load_capability = capabilities.get(ready)
+        processed_load = np.minimum(loads, total_load_capability)
+
+        # The samples of the metrics are the values after the update, where an
+        # added instance is starting, or ready without a scale up time
+        instances = ready + starting + terminating + added
+        ready_after = ready + added if up_delay == 0 else ready
+
+        rows.append({
+            'experienced_load': (
+                starting * starting_load +
+                ready * instance_baseline_load +
+                terminating * terminating_load + processed_load
+            )[sample_ticks],
+            'processed_load': processed_load[sample_ticks],
+            'total_load_capability': total_load_capability[sample_ticks],
+            'ready_instances': ready_after[sample_ticks],
+            'instances': instances[sample_ticks],
+            'overloaded_ticks': np.add.reduceat(processed_load < loads, sample_ticks),
+            'instance_ticks': np.add.reduceat(instances, sample_ticks)
+        })
+
+    return {
+        name: np.array([row[name] for row in rows], dtype=float)
+        for name in METRICS + TOTALS
+    }
+
+
+def check_fast(
+        per_second_loads: list[float] | np.ndarray,
+        scale_up_time: ScalingTimeOptions,
+        scale_down_time: ScalingTimeOptions,
+        scaling_threshold: float = SCALING_THRESHOLD,
+        desired_mean_load: float = DESIRED_MEAN_LOAD,
+        ready_instances: int = 1,
+        resolution: int = 1
+) -> list[str]:
+    """
+    Cross-check simulate_fast against TargetService for a configuration.
+    :return: The names of the metrics that differ. The experienced load may differ
+    by rounding.
+    """
+    service = TargetService(
+        current_time=datetime(2000, 1, 1),
+        applied_load=float(per_second_loads[0]),
+        scale_up_time=scale_up_time,
+        scale_down_time=scale_down_time,
+        ready_instances=ready_instances,
+        rng=random.Random(0)
+    )
+    expected = simulate_events(
+        service,
+        per_second_loads,
+        ThresholdPolicy(scaling_threshold, desired_mean_load),
+        resolution=resolution
+    )
+    actual = simulate_fast(
+        per_second_loads,
+        scale_up_time,
+        scale_down_time,
+        scaling_threshold,
+        desired_mean_load,
+        ready_instances=ready_instances,
+        resolution=resolution
+    )
+
+    return [
+        name for name in METRICS + TOTALS
+        if not (
+            np.allclose(actual[name][0], expected[name], rtol=1e-9)
+            if name == 'experienced_load' else
+            np.array_equal(actual[name][0], expected[name])
+        )
+    ]
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Simulate the threshold policy with deterministic scaling times '
+                    'using simulate_fast, and cross-check the result against '
+                    'TargetService.'
+    )
+
+    parser.add_argument(
+        '--load-profile',
+        dest='load_profile',
+        type=str,
+        help='A load profile created by load_profile.py to replay instead of the '
+             'generated load.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--requests-per-load',
+        dest='requests_per_load',
+        type=float,
+        help='The number of requests per second of the load profile one instance '
+             'can handle. Default is 1.',
+        default=1.
+    )
+
+    parser.add_argument(
+        '--resolution',
+        dest='resolution',
+        type=int,
+        help='The number of seconds between samples. Default is 60.',
+        default=60
+    )
+
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+
+    if options.load_profile is not None:
+        per_second_loads = read_load_profile(
+            options.load_profile,
+            options.requests_per_load
+        )
+    else:
+        per_second_loads = generate_loads()
+
+    scale_up_time = ScalingTimeOptions(SCALE_UP_TIME.mean_time, 0)
+    scale_down_time = ScalingTimeOptions(SCALE_DOWN_TIME.mean_time, 0)
+
+    start = time.perf_counter()
+    samples = simulate_fast(
+        per_second_loads,
+        scale_up_time,
+        scale_down_time,
+        resolution=options.resolution
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f'Simulated {len(per_second_loads)} seconds in {elapsed:.2f} s: '
+          f'overloaded {samples["overloaded_ticks"].sum():.0f} s, '
+          f'{samples["instance_ticks"].sum():,.0f} instance-seconds')
+
+    mismatches = check_fast(
+        per_second_loads,
+        scale_up_time,
+        scale_down_time,
+        resolution=options.resolution
+    )
+    if mismatches:
+        sys.exit(f'Differs from TargetService in {", ".join(mismatches)}')
+
+    print('Same as TargetService')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def read_load_profile(
+        path: str,
+        requests_per_load: float = 1.
+) -> np.ndarray:
+    """
+    Read a load profile created by load_profile.py from a trace, as loads to apply
+    to the simulated service each second.
+    :param path: The path of the saved load profile.
+    :param requests_per_load: The number of requests per second corresponding to a
+    load of 1, i.e. the number of requests per second one instance can handle.
+    :return: An array of the applied load of each second. Profiles with longer
+    intervals are spread evenly over the seconds of each interval.
+    """
+    with np.load(path) as data:
+        counts = data['counts']
+        interval = int(data['interval'])
+
+    per_second = np.repeat(counts / interval, interval)
+    return per_second / requests_per_load
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+
+from array_target_service import ArrayTargetService
+from event_simulation import METRICS, TOTALS, simulate_events
+from example import SCALE_DOWN_TIME, SCALE_UP_TIME, calculate_instances, \
+    generate_loads
+from load_replay import read_load_profile
+from scaling_time_options import ScalingTimeOptions
+
+# The percentiles of the confidence bands, by default
+PERCENTILES = [5, 50, 95]
+
+
+class Simulation:
+    def __init__(
+            self,
+            scale_up_time: ScalingTimeOptions,
+            scale_down_time: ScalingTimeOptions,
+            delta_instances: int | Callable[[ArrayTargetService], int],
+            ready_instances: int = 1,
+            resolution: int = 60,
+            **service_options
+    ):
+        """
+        Constructs a new description of a simulation, which can be run with
+        different random seeds.
+        :param scale_up_time: Options specifying how long starting a new instance
+        takes.
+        :param scale_down_time: Options specifying how long terminating an instance
+        takes.
+        :param delta_instances: The scaling policy, as passed to
+        ArrayTargetService.update. Must be picklable to run replicas in other
+        processes, e.g. a module level function.
+        :param ready_instances: The number of ready instances at the start.
+        :param resolution: The number of seconds between samples of the metrics.
+        :param service_options: Other parameters of ArrayTargetService.
+        """
+        self.scale_up_time: ScalingTimeOptions = scale_up_time
+        self.scale_down_time: ScalingTimeOptions = scale_down_time
+        self.delta_instances: int | Callable[[ArrayTargetService], int] = \
+            delta_instances
+        self.ready_instances: int = ready_instances
+        self.resolution: int = resolution
+        self.service_options: dict = service_options
+
+    def run(self, per_second_loads: np.ndarray, seed: int) -> dict[str, np.ndarray]:
+        """
+        Run the simulation with a seed.
+        :param per_second_loads: The applied load of each second.
+        :param seed: The seed of the random scaling times.
+        :return: The samples of the simulation, as returned by simulate_events.
+        """
+        service = ArrayTargetService(
+            current_time=datetime(2000, 1, 1),
+            applied_load=float(per_second_loads[0]),
+            scale_up_time=self.scale_up_time,
+            scale_down_time=self.scale_down_time,
+            ready_instances=self.ready_instances,
+            rng=random.Random(seed),
+            **self.service_options
+        )
+
+        return simulate_events(
+            service,
+            per_second_loads,
+            self.delta_instances,
+            resolution=self.resolution
+        )
+
+
+class MonteCarloResult:
+    def __init__(
+            self,
+            seeds: list[int],
+            samples: dict[str, np.ndarray],
+            resolution: int,
+            duration: int
+    ):
+        """
+        Constructs a new result of a Monte Carlo run.
+        :param seeds: The seed of each replica.
+        :param samples: The samples of each metric, with a row per replica.
+        :param resolution: The number of seconds between samples.
+        :param duration: The number of simulated seconds.
+        """
+        self.seeds: list[int] = seeds
+        self.samples: dict[str, np.ndarray] = samples
+        self.resolution: int = resolution
+        self.duration: int = duration
+
+    def get_bands(
+            self,
+            metric: str,
+            percentiles: list[float] | None = None
+    ) -> dict[float, np.ndarray]:
+        """
+        Get confidence bands of a metric over time.
+        :param metric: The name of the metric.
+        :param percentiles: The percentiles to compute, PERCENTILES by default.
+        :return: A dictionary mapping each percentile to the value of the metric at
+        that percentile of the replicas, for each sample.
+        """
+        percentiles = percentiles or PERCENTILES
+        values = np.percentile(self.samples[metric], percentiles, axis=0)
+
+        return dict(zip(percentiles, values))
+
+    def get_overload_percentages(self) -> np.ndarray:
+        """
+        Get the percentage of the time each replica was overloaded, i.e. violated
+        its service level by not processing all of the applied load.
+        """
+        return self.samples['overloaded_ticks'].sum(axis=1) / self.duration * 100
+
+    def get_instance_seconds(self) -> np.ndarray:
+        """
+        Get the total number of instance-seconds of each replica, i.e. its cost.
+        """
+        return self.samples['instance_ticks'].sum(axis=1)
+
+    def save(self, path: str, percentiles: list[float] | None = None):
+        """
+        Save the confidence bands of all metrics as a NumPy archive, with an
+        array named <metric>_p<percentile> per metric and percentile.
+        :param path: The path to save the bands to.
+        :param percentiles: The percentiles to save, PERCENTILES by default.
+        """
+        arrays = {
+            f'{metric}_p{percentile:g}': values
+            for metric in METRICS + TOTALS
+            for percentile, values in self.get_bands(metric, percentiles).items()
+        }
+
+        with open(path, 'wb') as file:
+            np.savez(file, seeds=np.array(self.seeds, dtype=np.uint64), **arrays)
+
+
+def get_seeds(seed: int, count: int) -> list[int]:
+    """
+    Get independent seeds for a number of replicas. The seed of each replica only
+    depends on the base seed and the index of the replica.
+    :param seed: The base seed.
+    :param count: The number of replicas.
+    :return: A seed per replica.
+    """
+    return [
+        int(child.generate_state(1, np.uint64)[0])
+        for child in np.random.SeedSequence(seed).spawn(count)
+    ]
+
+
+_worker_simulation: Simulation | None = None
+_worker_loads: np.ndarray | None = None
+
+
+def _init_worker(simulation: Simulation, per_second_loads: np.ndarray):
+    global _worker_simulation, _worker_loads
+
+    _worker_simulation = simulation
+    _worker_loads = per_second_loads
+
+
+def _run_replica(seed: int) -> dict[str, np.ndarray]:
+    return _worker_simulation.run(_worker_loads, seed)
+
+
+def run_monte_carlo(
+        simulation: Simulation,
+        per_second_loads: list[float] | np.ndarray,
+        replicas: int,
+        seed: int = 0,
+        workers: int | None = None
+) -> MonteCarloResult:
+    """
+    Run replicas of a simulation with different seeds in a pool of processes.
+    Each replica uses its own random number generator, seeded by get_seeds, so
+    the result is the same regardless of the number of processes.
+    :param simulation: The simulation to run.
+    :param per_second_loads: The applied load of each second.
+    :param replicas: The number of replicas to run.
+    :param seed: The base seed of the replicas.
+    :param workers: The number of processes. Defaults to the number of CPUs.
+    :return: The samples of all replicas.
+    """
+    loads = np.asarray(per_second_loads, dtype=float)
+    seeds = get_seeds(seed, replicas)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = [simulation.run(loads, replica_seed) for replica_seed in seeds]
+    else:
+        with ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(simulation, loads)
+        ) as executor:
+            results = list(executor.map(_run_replica, seeds))
+
+    samples = {
+        metric: np.stack([result[metric] for result in results])
+        for metric in METRICS + TOTALS
+    }
+
+    return MonteCarloResult(seeds, samples, simulation.resolution, len(loads))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Run replicas of the example simulation with different random '
+                    'scaling times.'
+    )
+
+    parser.add_argument(
+        '--replicas',
+        dest='replicas',
+        type=int,
+        help='The number of replicas to run. Default is 100.',
+        default=100
+    )
+
+    parser.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        help='The base seed of the replicas. Default is 0.',
+        default=0
+    )
+
+    parser.add_argument(
+        '--workers',
+        dest='workers',
+        type=int,
+        help='The number of processes to run replicas in. Default is the number '
+             'of CPUs.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--resolution',
+        dest='resolution',
+        type=int,
+        help='The number of seconds between samples. Default is 60.',
+        default=60
+    )
+
+    parser.add_argument(
+        '--load-profile',
+        dest='load_profile',
+        type=str,
+        help='A load profile created by load_profile.py to replay instead of the '
+             'generated load.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--requests-per-load',
+        dest='requests_per_load',
+        type=float,
+        help='The number of requests per second of the load profile one instance '
+             'can handle. Default is 1.',
+        default=1.
+    )
+
+    parser.add_argument(
+        '--output',
+        dest='output_path',
+        type=str,
+        help='The path to save the confidence bands of all metrics to.',
+        default=None
+    )
+
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+
+    if options.load_profile is not None:
+        per_second_loads = read_load_profile(
+            options.load_profile,
+            options.requests_per_load
+        )
+    else:
+        per_second_loads = generate_loads()
+
+    simulation = Simulation(
+        SCALE_UP_TIME,
+        SCALE_DOWN_TIME,
+        calculate_instances,
+        resolution=options.resolution
+    )
+
+    start = time.perf_counter()
+    result = run_monte_carlo(
+        simulation,
+        per_second_loads,
+        options.replicas,
+        options.seed,
+        options.workers
+    )
+    elapsed = time.perf_counter() - start
+
+    overload = np.percentile(result.get_overload_percentages(), PERCENTILES)
+    cost = np.percentile(result.get_instance_seconds(), PERCENTILES)
+
+    print(f'Ran {options.replicas} replicas in {elapsed:.1f} s')
+    for percentile, overload_value, cost_value in zip(PERCENTILES, overload, cost):
+        print(f'p{percentile}: overloaded {overload_value:.2f} % of the time, '
+              f'{cost_value:,.0f} instance-seconds')
+
+    if options.output_path is not None:
+        result.save(options.output_path)
+
+
+if __name__ == '__main__':
+    main()
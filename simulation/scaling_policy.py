@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import bisect
+import math
+from abc import abstractmethod
+from collections import deque
+
+import numpy as np
+
+from service_instance_state import ServiceInstanceState
+from service_snapshot import ServiceSnapshot, SnapshotBatch
+
+
+class ScalingPolicy:
+    """
+    A scaling policy, deciding how many instances to add or remove from a snapshot
+    of the service. A policy can be passed as delta_instances to the update method
+    of a service, in which case it is called with the service at every update,
+    takes a snapshot of it and adds the applied loads of the last history_size
+    updates to the snapshot.
+
+    Policies with a history of more than one update depend on every update of the
+    service, so they cannot be used with simulate_events, which skips updates.
+    """
+
+    def __init__(self, history_size: int = 1):
+        """
+        Constructs a new scaling policy.
+        :param history_size: The number of applied loads in the history of the
+        snapshots the policy decides from.
+        """
+        self.history_size: int = history_size
+        self.history: deque[float] = deque(maxlen=history_size)
+
+    def __call__(self, service) -> int:
+        snapshot = service.get_snapshot()
+        self.history.append(snapshot.applied_load)
+        snapshot.history = np.array(self.history)
+
+        return self.decide(snapshot)
+
+    @abstractmethod
+    def decide(self, snapshot: ServiceSnapshot) -> int:
+        """
+        Decide how to scale the service.
+        :param snapshot: The current state of the service.
+        :return: The number of instances to add/remove, as passed to update.
+        """
+        pass
+
+    def decide_batch(self, batch: SnapshotBatch) -> np.ndarray:
+        """
+        Decide how to scale the service for every snapshot of a batch, as if the
+        policy was called at each of the updates. Policies override this to decide
+        for all snapshots with array operations, returning the same decisions.
+        :param batch: The snapshots of consecutive updates.
+        :return: The number of instances to add/remove for each snapshot.
+        """
+        return np.array(
+            [
+                self.decide(batch.get(index, self.history_size))
+                for index in range(len(batch))
+            ],
+            dtype=np.int64
+        )
+
+
+def limit_scale_down(delta: int, current: int, min_instances: int) -> int:
+    """
+    Limit the number of instances to remove, so that at least a number of starting
+    or ready instances remain.
+    """
+    if delta < 0:
+        return min(0, max(delta, min_instances - current))
+
+    return delta
+
+
+def limit_scale_down_batch(
+        deltas: np.ndarray,
+        currents: np.ndarray,
+        min_instances: int
+) -> np.ndarray:
+    return np.where(
+        deltas < 0,
+        np.minimum(0, np.maximum(deltas, min_instances - currents)),
+        deltas
+    )
+
+
+class ThresholdPolicy(ScalingPolicy):
+    """
+    Scales the service in proportion to its utilization, when the utilization is
+    outside of a band around the desired utilization. The decisions are the same as
+    those of calculate_instances in example.py.
+    """
+
+    def __init__(self, scaling_threshold: float = 0.2, desired_mean_load: float = 0.5):
+        """
+        Constructs a new threshold policy.
+        :param scaling_threshold: How far the utilization can be from the desired
+        utilization without scaling.
+        :param desired_mean_load: The desired utilization of each instance.
+        """
+        super().__init__()
+        self.scaling_threshold: float = scaling_threshold
+        self.desired_mean_load: float = desired_mean_load
+
+    def decide(self, snapshot: ServiceSnapshot) -> int:
+        utilization = snapshot.utilization
+        upper_threshold = self.desired_mean_load + self.scaling_threshold
+        lower_threshold = self.desired_mean_load - self.scaling_threshold
+
+        if lower_threshold < utilization < upper_threshold:
+            return 0
+
+        scaling_factor = utilization / self.desired_mean_load
+        current_instances = snapshot.count(ServiceInstanceState.READY)
+        starting_instances = snapshot.count(ServiceInstanceState.STARTING)
+        terminating_instances = snapshot.count(ServiceInstanceState.TERMINATING)
+
+        down_instances = math.ceil(
+            (current_instances - terminating_instances) * scaling_factor
+        )
+
+        up_instances = math.ceil(
+            (current_instances + starting_instances) * scaling_factor
+        )
+
+        if scaling_factor > 1:
+            return up_instances
+        elif current_instances - down_instances > 0:
+            return -down_instances
+
+        return 0
+
+    def decide_batch(self, batch: SnapshotBatch) -> np.ndarray:
+        utilizations = batch.utilizations
+        upper_threshold = self.desired_mean_load + self.scaling_threshold
+        lower_threshold = self.desired_mean_load - self.scaling_threshold
+
+        scaling_factors = utilizations / self.desired_mean_load
+        current_instances = batch.count(ServiceInstanceState.READY)
+        starting_instances = batch.count(ServiceInstanceState.STARTING)
+        terminating_instances = batch.count(ServiceInstanceState.TERMINATING)
+
+        down_instances = np.ceil(
+            (current_instances - terminating_instances) * scaling_factors
+        ).astype(np.int64)
+
+        up_instances = np.ceil(
+            (current_instances + starting_instances) * scaling_factors
+        ).astype(np.int64)
+
+        deltas = np.where(
+            scaling_factors > 1,
+            up_instances,
+            np.where(current_instances - down_instances > 0, -down_instances, 0)
+        )
+        deltas[(lower_threshold < utilizations) & (utilizations < upper_threshold)] = 0
+
+        return deltas
+
+
+class TargetTrackingPolicy(ScalingPolicy):
+    """
+    Scales the service to the number of instances that would process the applied
+    load at a target utilization.
+    """
+
+    def __init__(
+            self,
+            target_utilization: float = 0.5,
+            min_instances: int = 1,
+            history_size: int = 1
+    ):
+        """
+        Constructs a new target tracking policy.
+        :param target_utilization: The desired utilization of each instance.
+        :param min_instances: The number of starting or ready instances never to
+        scale below.
+        :param history_size: The number of applied loads in the history of the
+        snapshots.
+        """
+        super().__init__(history_size)
+        self.target_utilization: float = target_utilization
+        self.min_instances: int = min_instances
+
+    def get_load(self, snapshot: ServiceSnapshot) -> float:
+        """
+        Get the load to provision instances for.
+        """
+        return snapshot.applied_load
+
+    def get_loads(self, batch: SnapshotBatch) -> np.ndarray:
+        return batch.applied_loads
+
+    def decide(self, snapshot: ServiceSnapshot) -> int:
+        desired_instances = max(
+            self.min_instances,
+            math.ceil(
+                self.get_load(snapshot) /
+                (self.target_utilization * snapshot.instance_capability)
+            )
+        )
+        current_instances = snapshot.count(ServiceInstanceState.READY) + \
+            snapshot.count(ServiceInstanceState.STARTING)
+
+        return desired_instances - current_instances
+
+    def decide_batch(self, batch: SnapshotBatch) -> np.ndarray:
+        desired_instances = np.maximum(
+            self.min_instances,
+            np.ceil(
+                self.get_loads(batch) /
+                (self.target_utilization * batch.instance_capability)
+            ).astype(np.int64)
+        )
+        current_instances = batch.count(ServiceInstanceState.READY) + \
+            batch.count(ServiceInstanceState.STARTING)
+
+        return desired_instances - current_instances
+
+
+class StepPolicy(ScalingPolicy):
+    """
+    Adds or removes a fixed number of instances depending on which of a number of
+    ranges the demanded utilization falls in, i.e. the applied load relative to the
+    capability of the ready instances.
+    """
+
+    def __init__(
+            self,
+            steps: list[tuple[float, int]] | None = None,
+            min_instances: int = 1
+    ):
+        """
+        Constructs a new step scaling policy.
+        :param steps: The steps, as pairs of the upper bound of a range of
+        utilizations and the number of instances to add/remove when the utilization
+        is below it and at or above the bound of the previous step, in order of
+        their bounds. Utilizations at or above the last bound do not scale the
+        service. By default, an instance is removed below a utilization of 0.3, one
+        is added from 0.7, and two are added from 1.
+        :param min_instances: The number of starting or ready instances never to
+        scale below.
+        """
+        super().__init__()
+        self.steps: list[tuple[float, int]] = steps or [
+            (0.3, -1),
+            (0.7, 0),
+            (1, 1),
+            (math.inf, 2)
+        ]
+        self.bounds: list[float] = [bound for bound, _ in self.steps]
+        self.deltas: np.ndarray = np.array(
+            [delta for _, delta in self.steps] + [0],
+            dtype=np.int64
+        )
+        self.min_instances: int = min_instances
+
+    def decide(self, snapshot: ServiceSnapshot) -> int:
+        if snapshot.applied_load == 0:
+            utilization = 0
+        elif snapshot.total_load_capability == 0:
+            utilization = math.inf
+        else:
+            utilization = snapshot.applied_load / snapshot.total_load_capability
+
+        delta = int(self.deltas[bisect.bisect_right(self.bounds, utilization)])
+        current_instances = snapshot.count(ServiceInstanceState.READY) + \
+            snapshot.count(ServiceInstanceState.STARTING)
+
+        return limit_scale_down(delta, current_instances, self.min_instances)
+
+    def decide_batch(self, batch: SnapshotBatch) -> np.ndarray:
+        utilizations = np.full(len(batch), math.inf)
+        np.divide(
+            batch.applied_loads,
+            batch.total_load_capabilities,
+            out=utilizations,
+            where=batch.total_load_capabilities != 0
+        )
+        utilizations[batch.applied_loads == 0] = 0
+
+        deltas = self.deltas[np.searchsorted(self.bounds, utilizations, side='right')]
+        current_instances = batch.count(ServiceInstanceState.READY) + \
+            batch.count(ServiceInstanceState.STARTING)
+
+        return limit_scale_down_batch(deltas, current_instances, self.min_instances)
+
+
+class PredictivePolicy(TargetTrackingPolicy):
+    """
+    Tracks a target utilization for the load predicted some time ahead, e.g. the
+    time it takes to start an instance, so that instances are ready when the load
+    arrives. The load is predicted by fitting a line to the applied loads of the
+    history window. Instances are never provisioned for less than the current
+    applied load, so the service only scales down once the load has decreased.
+    """
+
+    def __init__(
+            self,
+            window: int = 60,
+            horizon: float = 10,
+            target_utilization: float = 0.5,
+            min_instances: int = 1
+    ):
+        """
+        Constructs a new predictive policy.
+        :param window: The number of updates to fit the trend of the load to, at
+        least 2. Until the service has been updated this many times, the current
+        applied load is used instead of a prediction.
+        :param horizon: The number of updates ahead to predict the load.
+        :param target_utilization: The desired utilization of each instance.
+        :param min_instances: The number of starting or ready instances never to
+        scale below.
+        """
+        if window < 2:
+            raise ValueError('The window of a predictive policy must be at least 2.')
+
+        super().__init__(target_utilization, min_instances, history_size=window)
+        self.window: int = window
+        self.horizon: float = horizon
+
+        # The least squares prediction is linear in the loads of the window, so it
+        # is computed as a weighted sum of them
+        x = np.arange(window, dtype=float)
+        design = np.stack((np.ones(window), x), axis=1)
+        self.weights: np.ndarray = np.array([1, window - 1 + horizon]) @ \
+            np.linalg.pinv(design)
+
+    def get_load(self, snapshot: ServiceSnapshot) -> float:
+        if len(snapshot.history) < self.window:
+            return snapshot.applied_load
+
+        prediction = float((snapshot.history * self.weights).sum())
+        return max(snapshot.applied_load, prediction)
+
+    def get_loads(self, batch: SnapshotBatch) -> np.ndarray:
+        predictions = (batch.get_history(self.window) * self.weights).sum(axis=1)
+
+        return np.where(
+            np.isnan(predictions),
+            batch.applied_loads,
+            np.maximum(batch.applied_loads, predictions)
+        )
+
+
+class RecordingPolicy(ScalingPolicy):
+    """
+    Wraps a policy, recording the snapshot of every update it is called with, for
+    comparing other policies on the same snapshots afterwards with decide_batch.
+    """
+
+    def __init__(self, policy: ScalingPolicy):
+        super().__init__(policy.history_size)
+        self.policy: ScalingPolicy = policy
+        self.snapshots: list[ServiceSnapshot] = []
+
+    def decide(self, snapshot: ServiceSnapshot) -> int:
+        self.snapshots.append(snapshot)
+        return self.policy.decide(snapshot)
+
+    def get_batch(self) -> SnapshotBatch:
+        return SnapshotBatch.from_snapshots(self.snapshots)
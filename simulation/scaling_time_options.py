@@ -12,17 +12,23 @@ class ScalingTimeOptions:
             if isinstance(std_dev, float) or isinstance(std_dev, int) else \
             std_dev.total_seconds()
 
-    def random(self, start_time: datetime | None = None) -> float | datetime:
+    def random(
+            self,
+            start_time: datetime | None = None,
+            rng: random.Random | None = None
+    ) -> float | datetime:
         """
         Randomize a new time based on the mean and standard deviation of this
         options instance.
         :param start_time: A starting time to add the randomized time to.
+        :param rng: The random number generator to use. If not specified, the
+        global generator of the random module is used.
         :return: The start time with the randomized time added if a start time is
         specified. Otherwise a float of the number of generated seconds is returned.
         """
         dt = max(
             0.,
-            random.normalvariate(
+            (rng or random).normalvariate(
                 mu=self.mean_time,
                 sigma=self.std_dev
             )
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import numpy as np
+
+from service_instance_state import ServiceInstanceState
+
+
+class ServiceSnapshot:
+    def __init__(
+            self,
+            time: datetime,
+            applied_load: float,
+            processed_load: float,
+            experienced_load: float,
+            total_load_capability: float,
+            instance_capability: float,
+            counts: np.ndarray,
+            history: np.ndarray | None = None
+    ):
+        """
+        Constructs a new snapshot of the state of a target service, as seen by a
+        scaling policy.
+        :param time: The current simulated time.
+        :param applied_load: The load applied to the service.
+        :param processed_load: The part of the applied load the service processes.
+        :param experienced_load: The total resource utilization of the service.
+        :param total_load_capability: The load the ready instances can process.
+        :param instance_capability: The load a single ready instance can process.
+        :param counts: The number of instances in each state, indexed by the value
+        of the state.
+        :param history: The applied loads of the most recent updates, oldest
+        first and including the current one.
+        """
+        self.time: datetime = time
+        self.applied_load: float = applied_load
+        self.processed_load: float = processed_load
+        self.experienced_load: float = experienced_load
+        self.total_load_capability: float = total_load_capability
+        self.instance_capability: float = instance_capability
+        self.counts: np.ndarray = counts
+        self.history: np.ndarray = np.array([applied_load]) if history is None \
+            else history
+
+    @property
+    def utilization(self) -> float:
+        """
+        The part of the capability of the service used to process load.
+        """
+        return 0 if self.processed_load == 0 else \
+            self.processed_load / self.total_load_capability
+
+    def count(self, state: ServiceInstanceState) -> int:
+        return int(self.counts[state.value])
+
+
+class SnapshotBatch:
+    """
+    Snapshots of a service at consecutive updates, stored as arrays, for
+    evaluating a scaling policy for all of them at once.
+    """
+
+    def __init__(
+            self,
+            applied_loads: np.ndarray,
+            processed_loads: np.ndarray,
+            total_load_capabilities: np.ndarray,
+            instance_capability: float,
+            counts: np.ndarray
+    ):
+        """
+        Constructs a new batch of snapshots.
+        :param applied_loads: The applied load of each snapshot.
+        :param processed_loads: The processed load of each snapshot.
+        :param total_load_capabilities: The load the ready instances can process in
+        each snapshot.
+        :param instance_capability: The load a single ready instance can process.
+        :param counts: The number of instances in each state of each snapshot, with
+        a row per snapshot and a column per state value.
+        """
+        self.applied_loads: np.ndarray = np.asarray(applied_loads, dtype=float)
+        self.processed_loads: np.ndarray = np.asarray(processed_loads, dtype=float)
+        self.total_load_capabilities: np.ndarray = np.asarray(
+            total_load_capabilities,
+            dtype=float
+        )
+        self.instance_capability: float = instance_capability
+        self.counts: np.ndarray = np.asarray(counts, dtype=np.int64)
+
+    @staticmethod
+    def from_snapshots(snapshots: list[ServiceSnapshot]) -> SnapshotBatch:
+        return SnapshotBatch(
+            np.array([snapshot.applied_load for snapshot in snapshots]),
+            np.array([snapshot.processed_load for snapshot in snapshots]),
+            np.array([snapshot.total_load_capability for snapshot in snapshots]),
+            snapshots[0].instance_capability if snapshots else 0,
+            np.array([snapshot.counts for snapshot in snapshots]).reshape(
+                len(snapshots),
+                len(ServiceInstanceState)
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.applied_loads)
+
+    @property
+    def utilizations(self) -> np.ndarray:
+        utilizations = np.zeros(len(self))
+        np.divide(
+            self.processed_loads,
+            self.total_load_capabilities,
+            out=utilizations,
+            where=self.processed_loads != 0
+        )
+
+        return utilizations
+
+    def count(self, state: ServiceInstanceState) -> np.ndarray:
+        return self.counts[:, state.value]
+
+    def get_history(self, size: int) -> np.ndarray:
+        """
+        Get the history window of each snapshot, like the history of the
+        snapshots a policy receives when it is called for every update.
+        :param size: The number of applied loads in each window.
+        :return: An array with a row per snapshot, holding its most recent applied
+        loads, oldest first. Windows at the start, where fewer updates have been
+        made, are padded with NaN.
+        """
+        padded = np.concatenate((np.full(size - 1, np.nan), self.applied_loads))
+        return np.lib.stride_tricks.sliding_window_view(padded, size)
+
+    def get(self, index: int, history_size: int = 1) -> ServiceSnapshot:
+        """
+        Get a single snapshot of the batch.
+        :param index: The index of the snapshot.
+        :param history_size: The size of the history window of the snapshot.
+        :return: The snapshot. Its time and experienced load are not part of the
+        batch, and are set to None.
+        """
+        first = max(0, index + 1 - history_size)
+
+        return ServiceSnapshot(
+            time=None,
+            applied_load=float(self.applied_loads[index]),
+            processed_load=float(self.processed_loads[index]),
+            experienced_load=None,
+            total_load_capability=float(self.total_load_capabilities[index]),
+            instance_capability=self.instance_capability,
+            counts=self.counts[index],
+            history=self.applied_loads[first:index + 1]
+        )
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+import numpy as np
+
+from example import SCALE_DOWN_TIME, SCALE_UP_TIME, SCALING_THRESHOLD, \
+    DESIRED_MEAN_LOAD, calculate_instances, generate_loads
+from fast_simulation import simulate_fast
+from load_replay import read_load_profile
+from monte_carlo import Simulation, get_seeds
+from scaling_time_options import ScalingTimeOptions
+
+# The parameters of a configuration, and their values in example.py
+DEFAULT_CONFIG = {
+    'scaling_threshold': SCALING_THRESHOLD,
+    'desired_mean_load': DESIRED_MEAN_LOAD,
+    'scale_up_mean': SCALE_UP_TIME.mean_time,
+    'scale_up_std_dev': SCALE_UP_TIME.std_dev,
+    'scale_down_mean': SCALE_DOWN_TIME.mean_time,
+    'scale_down_std_dev': SCALE_DOWN_TIME.std_dev
+}
+
+
+def grid_search(space: dict[str, list[float]]) -> list[dict[str, float]]:
+    """
+    Create all combinations of the values of some parameters.
+    :param space: A dictionary mapping parameter names to their values.
+    :return: A configuration per combination. Parameters not in the space have
+    their default values.
+    """
+    names = list(space)
+
+    return [
+        {**DEFAULT_CONFIG, **dict(zip(names, values))}
+        for values in itertools.product(*(space[name] for name in names))
+    ]
+
+
+def random_search(
+        space: dict[str, tuple[float, float]],
+        count: int,
+        seed: int = 0
+) -> list[dict[str, float]]:
+    """
+    Create configurations with parameter values drawn uniformly from ranges. The
+    same seed always creates the same configurations, and a larger count creates
+    the same configurations followed by new ones.
+    :param space: A dictionary mapping parameter names to the lowest and highest
+    value of the parameter.
+    :param count: The number of configurations to create.
+    :param seed: The seed of the random values.
+    :return: The configurations. Parameters not in the space have their default
+    values.
+    """
+    rng = random.Random(seed)
+    configs = []
+
+    for _ in range(count):
+        config = dict(DEFAULT_CONFIG)
+
+        for name, (low, high) in space.items():
+            config[name] = rng.uniform(low, high)
+
+        configs.append(config)
+
+    return configs
+
+
+def create_simulation(config: dict[str, float]) -> Simulation:
+    """
+    Create the simulation of a configuration, using calculate_instances as policy.
+    :param config: The configuration.
+    :return: The simulation, sampled once over the whole run.
+    """
+    return Simulation(
+        ScalingTimeOptions(config['scale_up_mean'], config['scale_up_std_dev']),
+        ScalingTimeOptions(config['scale_down_mean'], config['scale_down_std_dev']),
+        functools.partial(
+            calculate_instances,
+            scaling_threshold=config['scaling_threshold'],
+            desired_mean_load=config['desired_mean_load']
+        ),
+        resolution=sys.maxsize
+    )
+
+
+class SweepCache:
+    """
+    A cache of simulation results on disk. Each result is stored as a JSON file
+    named by the hash of its configuration, seed and load profile, so results can
+    be reused by any later sweep with the same inputs.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+
+    @staticmethod
+    def hash_loads(per_second_loads: np.ndarray) -> str:
+        return hashlib.sha256(per_second_loads.tobytes()).hexdigest()
+
+    def get_key(self, config: dict[str, float], seed: int, loads_hash: str) -> str:
+        content = json.dumps({
+            'version': self.VERSION,
+            'config': config,
+            'seed': seed,
+            'loads': loads_hash
+        }, sort_keys=True)
+
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> dict[str, float] | None:
+        try:
+            with open(os.path.join(self.directory, key + '.json')) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, result: dict[str, float]):
+        """
+        Store a result. Failing to write it is not considered an error, as the
+        result can always be computed again.
+        """
+        path = os.path.join(self.directory, key + '.json')
+        temp_path = path + '.tmp'
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'w') as file:
+                json.dump(result, file)
+
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+
+_worker_loads: np.ndarray | None = None
+
+
+def _init_worker(per_second_loads: np.ndarray):
+    global _worker_loads
+    _worker_loads = per_second_loads
+
+
+def _run_point(point: tuple[dict[str, float], int]) -> dict[str, float]:
+    config, seed = point
+
+    # Deterministic scaling times do not depend on the seed, and are simulated
+    # with the much faster simulate_fast, which has the same results
+    if config['scale_up_std_dev'] == 0 and config['scale_down_std_dev'] == 0:
+        samples = simulate_fast(
+            _worker_loads,
+            ScalingTimeOptions(config['scale_up_mean'], 0),
+            ScalingTimeOptions(config['scale_down_mean'], 0),
+            config['scaling_threshold'],
+            config['desired_mean_load'],
+            resolution=sys.maxsize
+        )
+        samples = {name: values[0] for name, values in samples.items()}
+    else:
+        samples = create_simulation(config).run(_worker_loads, seed)
+
+    return {
+        'instance_seconds': float(samples['instance_ticks'].sum()),
+        'overload_seconds': float(samples['overloaded_ticks'].sum())
+    }
+
+
+def run_sweep(
+        configs: list[dict[str, float]],
+        per_second_loads: list[float] | np.ndarray,
+        seeds: list[int],
+        cache: SweepCache | None = None,
+        workers: int | None = None
+) -> list[dict]:
+    """
+    Simulate every configuration with every seed, computing only the results that
+    are not in the cache.
+    :param configs: The configurations to simulate.
+    :param per_second_loads: The applied load of each second.
+    :param seeds: The seeds to simulate each configuration with.
+    :param cache: The cache of results. If not specified, nothing is cached.
+    :param workers: The number of processes. Defaults to the number of CPUs.
+    :return: A row per configuration, with the parameters of the configuration,
+    its mean instance-seconds and the mean percentage of time it was overloaded
+    over the seeds, and whether no other configuration is both cheaper and less
+    overloaded. Rows are ranked by overload and then by cost.
+    """
+    loads = np.asarray(per_second_loads, dtype=float)
+    loads_hash = SweepCache.hash_loads(loads)
+    points = [(config, seed) for config in configs for seed in seeds]
+    keys = [
+        cache.get_key(config, seed, loads_hash) if cache is not None else None
+        for config, seed in points
+    ]
+
+    results = [cache.get(key) if cache is not None else None for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    workers = workers or os.cpu_count() or 1
+
+    def store(computed: Iterable[dict[str, float]]):
+        # Results are cached as they arrive, so an interrupted sweep keeps them
+        for index, result in zip(missing, computed):
+            results[index] = result
+
+            if cache is not None:
+                cache.put(keys[index], result)
+
+    if workers == 1 or len(missing) <= 1:
+        _init_worker(loads)
+        store(map(_run_point, (points[index] for index in missing)))
+    else:
+        with ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(loads,)
+        ) as executor:
+            store(executor.map(_run_point, (points[index] for index in missing)))
+
+    rows = []
+    for number, config in enumerate(configs):
+        config_results = results[number * len(seeds):(number + 1) * len(seeds)]
+        rows.append({
+            **config,
+            'instance_seconds': np.mean(
+                [result['instance_seconds'] for result in config_results]
+            ),
+            'overload_percent': np.mean(
+                [result['overload_seconds'] for result in config_results]
+            ) / len(loads) * 100
+        })
+
+    # Going from the cheapest configuration to the most expensive one, a
+    # configuration is on the Pareto front if it is less overloaded than all
+    # cheaper ones, or equal to the last configuration on the front
+    best = None
+    for row in sorted(
+            rows,
+            key=lambda row: (row['instance_seconds'], row['overload_percent'])
+    ):
+        point = (row['instance_seconds'], row['overload_percent'])
+        row['pareto'] = best is None or point[1] < best[1] or point == best
+
+        if row['pareto']:
+            best = point
+
+    return sorted(
+        rows,
+        key=lambda row: (row['overload_percent'], row['instance_seconds'])
+    )
+
+
+def format_table(rows: list[dict]) -> str:
+    """
+    Format sweep results as a text table.
+    :param rows: The rows returned by run_sweep.
+    :return: The table.
+    """
+    columns = list(DEFAULT_CONFIG) + ['instance_seconds', 'overload_percent', 'pareto']
+    lines = [' '.join(f'{column:>18}' for column in columns)]
+
+    for row in rows:
+        lines.append(' '.join(
+            f'{row[column]:>18.4g}' if isinstance(row[column], float) else
+            f'{str(row[column]):>18}'
+            for column in columns
+        ))
+
+    return '\n'.join(lines)
+
+
+def parse_space(values: list[str], parse_value) -> dict:
+    space = dict()
+
+    for value in values or []:
+        name, _, definition = value.partition('=')
+        if name not in DEFAULT_CONFIG:
+            raise ValueError(f'Unknown parameter {name}, use one of '
+                             f'{", ".join(DEFAULT_CONFIG)}.')
+
+        space[name] = parse_value(definition)
+
+    return space
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Simulate combinations of scaling parameters and rank them by '
+                    'overload and cost. Configurations with deterministic scaling '
+                    'times, i.e. scale_up_std_dev=0 and scale_down_std_dev=0, are '
+                    'simulated much faster.'
+    )
+
+    parser.add_argument(
+        '--grid',
+        dest='grid',
+        action='append',
+        help='A parameter and the values to try, e.g. scaling_threshold=0.1,0.2. '
+             'Can be repeated, in which case all combinations are tried.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--random',
+        dest='random',
+        action='append',
+        help='A parameter and the range to draw values from, e.g. '
+             'desired_mean_load=0.3:0.8. Can be repeated. Used instead of --grid.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--samples',
+        dest='samples',
+        type=int,
+        help='The number of configurations to draw for --random. Default is 20.',
+        default=20
+    )
+
+    parser.add_argument(
+        '--seeds',
+        dest='seeds',
+        type=int,
+        help='The number of seeds to simulate each configuration with. Default is '
+             '4.',
+        default=4
+    )
+
+    parser.add_argument(
+        '--seed',
+        dest='seed',
+        type=int,
+        help='The base seed of the configurations and simulations. Default is 0.',
+        default=0
+    )
+
+    parser.add_argument(
+        '--workers',
+        dest='workers',
+        type=int,
+        help='The number of processes to simulate in. Default is the number of '
+             'CPUs.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--cache',
+        dest='cache',
+        type=str,
+        help='The directory to cache results in. Default is .sweep_cache.',
+        default='.sweep_cache'
+    )
+
+    parser.add_argument(
+        '--load-profile',
+        dest='load_profile',
+        type=str,
+        help='A load profile created by load_profile.py to replay instead of the '
+             'generated load.',
+        default=None
+    )
+
+    parser.add_argument(
+        '--requests-per-load',
+        dest='requests_per_load',
+        type=float,
+        help='The number of requests per second of the load profile one instance '
+             'can handle. Default is 1.',
+        default=1.
+    )
+
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+
+    if options.load_profile is not None:
+        per_second_loads = read_load_profile(
+            options.load_profile,
+            options.requests_per_load
+        )
+    else:
+        per_second_loads = generate_loads()
+
+    if options.random:
+        space = parse_space(
+            options.random,
+            lambda value: tuple(float(bound) for bound in value.split(':'))
+        )
+        configs = random_search(space, options.samples, options.seed)
+    else:
+        space = parse_space(
+            options.grid,
+            lambda value: [float(item) for item in value.split(',')]
+        )
+        configs = grid_search(space)
+
+    rows = run_sweep(
+        configs,
+        per_second_loads,
+        get_seeds(options.seed, options.seeds),
+        SweepCache(options.cache),
+        options.workers
+    )
+
+    print(format_table(rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,11 @@ from datetime import datetime, timedelta
 from enum import Enum
 from typing import Generator, Callable
 
+import numpy as np
+
 from scaling_time_options import ScalingTimeOptions
 from service_instance_state import ServiceInstanceState
+from service_snapshot import ServiceSnapshot
 from target_service_instance import TargetServiceInstance
 
 
@@ -24,7 +27,8 @@ class TargetService:
             instance_load: float = 1,
             instance_baseline_load: float = 0.05,
             starting_load: float = 1,
-            terminating_load: float = 1
+            terminating_load: float = 1,
+            rng: random.Random | None = None
     ):
         """
         Constructor for the target service class. Initializes the class with a
@@ -50,6 +54,8 @@ class TargetService:
         therefore does not contribute towards lowering the applied system load, but
         does still use system resources to shut down safely. This number specifies
         the load applied (i.e. resources used) by this instance when in this state.
+        :param rng: The random number generator to draw scaling times with. If not
+        specified, the global generator of the random module is used.
         """
         self.current_time: datetime = current_time
         self.applied_load: float = applied_load
@@ -62,12 +68,18 @@ class TargetService:
         self.experienced_load: float = 0
         self.processed_load: float = 0
         self.start_time: datetime = datetime.now()
+        self.rng: random.Random | None = rng
+
+        # The times of the state transitions scheduled by the last update, or by
+        # the constructor, in the order they were scheduled
+        self.transitions: list[datetime] = []
 
         starting = [
             TargetServiceInstance.start_new(
                 current_time,
                 scale_up_time,
-                self.instance_load_capability
+                self.instance_load_capability,
+                rng
             )
             for _ in range(starting_instances)
         ]
@@ -82,6 +94,7 @@ class TargetService:
             for _ in range(ready_instances)
         ]
 
+        self.transitions.extend(instance.ready_time for instance in starting)
         self.instances: deque[TargetServiceInstance] = deque(starting + ready)
         self.counts: dict[ServiceInstanceState, int] = {
             state: self.count(state)
@@ -94,6 +107,9 @@ class TargetService:
             if instance.state == ServiceInstanceState.READY
         )
 
+    def __len__(self) -> int:
+        return len(self.instances)
+
     def elapsed(self) -> timedelta:
         return self.current_time - self.start_time
 
@@ -105,6 +121,27 @@ class TargetService:
         """
         return sum(1 for instance in self.instances if instance.state == state)
 
+    def get_snapshot(self) -> ServiceSnapshot:
+        """
+        Get the current state of the service as seen by a scaling policy, counting
+        the instances of all states in a single pass.
+        :return: The snapshot, without any history but the current applied load.
+        """
+        counts = [0] * len(ServiceInstanceState)
+        for instance in self.instances:
+            counts[instance.state.value] += 1
+
+        return ServiceSnapshot(
+            time=self.current_time,
+            applied_load=self.applied_load,
+            processed_load=self.processed_load,
+            experienced_load=self.experienced_load,
+            total_load_capability=self.total_load_capability,
+            instance_capability=self.instance_load_capability -
+                                self.instance_baseline_load,
+            counts=np.array(counts)
+        )
+
     def get_victims(
             self,
             count: int
@@ -204,6 +241,7 @@ class TargetService:
         """
         self.current_time = current_time
         self.applied_load = applied_load
+        self.transitions = []
 
         # Update all running instances with the current time
         for instance in self.instances:
@@ -221,14 +259,17 @@ class TargetService:
             victims = self.get_victims(abs(delta_instances))
 
             for victim in victims:
-                victim.terminate(self.scale_down_time)
+                victim.terminate(self.scale_down_time, self.rng)
+                self.transitions.append(victim.off_time)
         elif delta_instances > 0:
             # If we need to scale up, add some new instances
             self.instances.appendleft(TargetServiceInstance.start_new(
                 current_time=current_time,
                 handled_load=self.instance_load_capability,
-                options=self.scale_up_time
+                options=self.scale_up_time,
+                rng=self.rng
             ))
+            self.transitions.append(self.instances[0].ready_time)
 
         # Update the state of all running instances to reflect the current time
         for state in ServiceInstanceState:
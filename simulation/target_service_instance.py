@@ -1,4 +1,6 @@
 from __future__ import annotations
+
+import random
 from datetime import datetime
 
 from scaling_time_options import ScalingTimeOptions
@@ -48,17 +50,19 @@ class TargetServiceInstance:
     def start_new(
             current_time: datetime,
             options: ScalingTimeOptions,
-            handled_load: float
+            handled_load: float,
+            rng: random.Random | None = None
     ) -> TargetServiceInstance:
         """
         Create a new instance, in the STARTING state.
         :param current_time: The current simulated time
         :param options: Options specifying how quickly the instance is started.
         :param handled_load: The load this instance is capable of processing.
+        :param rng: The random number generator to draw the startup time with.
         :return: The newly created instance
         """
         start_time = current_time
-        ready_time = options.random(start_time=current_time)
+        ready_time = options.random(start_time=current_time, rng=rng)
 
         return TargetServiceInstance(
             current_time=current_time,
@@ -76,30 +80,36 @@ class TargetServiceInstance:
         """
         self.current_time = current_time
 
-    def start(self, options: ScalingTimeOptions):
+    def start(self, options: ScalingTimeOptions, rng: random.Random | None = None):
         """
         Starts the instance if not already started.
         :param options: Options specifying how much time starting the instance takes.
+        :param rng: The random number generator to draw the startup time with.
         :return:
         """
         if self.started_time is not None:
             raise Exception('Service instance is already started.')
 
         self.started_time = self.current_time
-        self.ready_time = options.random(start_time=self.current_time)
+        self.ready_time = options.random(start_time=self.current_time, rng=rng)
 
-    def terminate(self, terminate_time: ScalingTimeOptions):
+    def terminate(
+            self,
+            terminate_time: ScalingTimeOptions,
+            rng: random.Random | None = None
+    ):
         """
         Terminates the service instance if not already terminated.
         :param terminate_time: Options specifying how much time terminating the
         instance takes.
+        :param rng: The random number generator to draw the shutdown time with.
         :return:
         """
         if self.terminate_time is not None:
             raise Exception('Service instance is already terminated.')
 
         self.terminate_time = self.current_time
-        self.off_time = terminate_time.random(start_time=self.current_time)
+        self.off_time = terminate_time.random(start_time=self.current_time, rng=rng)
 
     def _get_state(self) -> ServiceInstanceState:
         """
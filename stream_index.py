@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import IO
+
+from abstract_viewer import Viewer, PartIndexer
+from downloader import DownloadSink
+from gzip_index import CHECKPOINT_SPACING, CheckpointBuilder, MemberDecompressor, \
+    MemberWriter
+from time_index import TimeIndex
+
+# The formats gzip files can be stored in while they are downloaded: as
+# downloaded, re-encoded as independent gzip members that can be checkpointed, or
+# decompressed
+STORE_FORMATS = ['gzip', 'reblock', 'extract']
+
+
+class StreamIndexSink(DownloadSink):
+    """
+    Decompresses a gzip file while it is downloaded, and indexes its records in
+    the same pass. The file is stored in one of the STORE_FORMATS, and added to
+    the time index of its directory, so that it can be viewed without reading it
+    again.
+    """
+
+    # Serializes updates of the time index by concurrent downloads
+    index_lock: threading.Lock = threading.Lock()
+
+    def __init__(
+            self,
+            viewer: type[Viewer],
+            store_format: str = 'gzip',
+            record_size: int | None = None,
+            block_size: int = CHECKPOINT_SPACING
+    ):
+        """
+        Constructs a new sink.
+        :param viewer: The viewer of the downloaded records, which indexes them.
+        :param store_format: The format to store the file in.
+        :param record_size: The size of fixed-size records, or None for line-based
+        files. Re-encoded members are split at record boundaries.
+        :param block_size: The number of decompressed bytes per re-encoded member.
+        """
+        if store_format not in STORE_FORMATS:
+            raise ValueError(f'Unknown store format {store_format}.')
+
+        self.viewer: type[Viewer] = viewer
+        self.store_format: str = store_format
+        self.record_size: int | None = record_size
+        self.block_size: int = block_size
+        self.path: str | None = None
+        self.temp_path: str | None = None
+        self.file: IO[bytes] | None = None
+
+        self.decompressor: MemberDecompressor | None = None
+        self.indexer: PartIndexer | None = None
+        self.builder: CheckpointBuilder | None = None
+        self.writer: MemberWriter | IO[bytes] | None = None
+
+    def get_path(self, destination: str) -> str:
+        if self.store_format == 'extract':
+            self.path = os.path.splitext(destination)[0]
+        else:
+            self.path = destination
+
+        directory, name = os.path.split(self.path)
+        self.temp_path = os.path.join(directory, f'.{name}.stream')
+        return self.path
+
+    def write(self, data: bytes):
+        if self.decompressor is None:
+            self.truncate()
+
+        for member_start, offset, data in self.decompressor.decompress(data):
+            self.indexer.update(data)
+
+            if self.writer is not None:
+                self.writer.write(data)
+            else:
+                self.builder.add(member_start, offset, data)
+
+    def truncate(self):
+        self.decompressor = MemberDecompressor()
+        self.indexer = self.viewer.create_indexer()
+        self.builder = None
+        self.writer = None
+
+        if self.store_format != 'extract':
+            self.builder = CheckpointBuilder(self.indexer.locate)
+
+        if self.store_format == 'gzip':
+            return
+
+        if self.file is None:
+            self.file = open(self.temp_path, 'wb')
+
+        self.file.seek(0)
+        self.file.truncate()
+
+        if self.store_format == 'reblock':
+            self.writer = MemberWriter(
+                self.file,
+                self.block_size,
+                self.record_size,
+                on_member=self.builder.add
+            )
+        else:
+            self.writer = self.file
+
+    def finish(self, temp_path: str, destination: str):
+        if self.decompressor is None:
+            self.truncate()
+
+        self.decompressor.finish()
+
+        if self.file is None:
+            os.replace(temp_path, self.path)
+        else:
+            if isinstance(self.writer, MemberWriter):
+                self.writer.finish()
+
+            self.file.close()
+            self.file = None
+            os.replace(self.temp_path, self.path)
+            os.remove(temp_path)
+
+        entry = self.indexer.get_entry(
+            None if self.builder is None else self.builder.checkpoints
+        )
+
+        if entry is None:
+            return
+
+        with self.index_lock:
+            index = TimeIndex.load(self.path)
+            index.put(self.viewer.__name__, self.path, None, entry)
+            index.save()
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.temp_path)
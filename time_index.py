@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+
+from gzip_index import GzipCheckpoint
+
+
+class TimeIndexEntry:
+    def __init__(
+            self,
+            first: datetime,
+            last: datetime,
+            count: int,
+            checkpoints: list[GzipCheckpoint] | None = None
+    ):
+        """
+        Constructs a new entry of the time index, describing a single file or part.
+        :param first: The time of the first record of the part.
+        :param last: The time of the last record of the part.
+        :param count: The number of records in the part.
+        :param checkpoints: For gzip compressed parts, the checkpoints decompression
+        can be started from.
+        """
+        self.first: datetime = first
+        self.last: datetime = last
+        self.count: int = count
+        self.checkpoints: list[GzipCheckpoint] | None = checkpoints
+
+    def to_dict(self) -> dict:
+        data = {
+            'first': self.first.isoformat(),
+            'last': self.last.isoformat(),
+            'count': self.count
+        }
+
+        if self.checkpoints is not None:
+            data['checkpoints'] = [
+                checkpoint.to_list() for checkpoint in self.checkpoints
+            ]
+
+        return data
+
+    @staticmethod
+    def from_dict(data: dict) -> TimeIndexEntry:
+        checkpoints = data.get('checkpoints')
+
+        return TimeIndexEntry(
+            first=datetime.fromisoformat(data['first']),
+            last=datetime.fromisoformat(data['last']),
+            count=data['count'],
+            checkpoints=None if checkpoints is None else [
+                GzipCheckpoint.from_list(checkpoint) for checkpoint in checkpoints
+            ]
+        )
+
+
+class TimeIndex:
+    """
+    A persistent index of the first and last record times and record counts of
+    the files of a dataset. The index is stored as a sidecar file in the directory
+    of the indexed files, and entries are invalidated when the size or
+    modification time of their file changes.
+    """
+
+    VERSION = 2
+    FILE_NAME = '.time_index.json'
+
+    def __init__(self, path: str, entries: dict[str, dict] | None = None):
+        self.path: str = path
+        self.entries: dict[str, dict] = entries or dict()
+        self.changed: bool = False
+
+    @staticmethod
+    def get_index_path(input_path: str) -> str:
+        """
+        Get the path of the index file used for an input file or directory.
+        :param input_path: The file or directory to get the index path for.
+        :return: The path of the index file.
+        """
+        input_path = os.path.abspath(input_path)
+        directory = input_path if os.path.isdir(input_path) else \
+            os.path.dirname(input_path)
+
+        return os.path.join(directory, TimeIndex.FILE_NAME)
+
+    @staticmethod
+    def load(input_path: str) -> TimeIndex:
+        """
+        Load the index used for an input file or directory. If there is no index,
+        or it cannot be read, an empty index is returned.
+        :param input_path: The file or directory to load the index for.
+        :return: The loaded index.
+        """
+        path = TimeIndex.get_index_path(input_path)
+
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return TimeIndex(path)
+
+        if data.get('version') != TimeIndex.VERSION:
+            return TimeIndex(path)
+
+        return TimeIndex(path, data.get('entries'))
+
+    def save(self):
+        """
+        Save the index if it has been changed since it was loaded. Failing to write
+        the index, for example since the dataset is on a read-only volume, is not
+        considered an error, as the index can always be rebuilt.
+        """
+        if not self.changed:
+            return
+
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'version': self.VERSION, 'entries': self.entries}, file)
+
+            os.replace(temp_path, self.path)
+            self.changed = False
+        except OSError:
+            pass
+
+    @staticmethod
+    def get_key(kind: str, file_path: str, part: str | None) -> str:
+        return '|'.join((kind, os.path.abspath(file_path), part or ''))
+
+    @staticmethod
+    def get_stamp(file_path: str) -> list[int]:
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def get(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        """
+        Get the entry of a file or part, if it is indexed and has not changed since
+        it was indexed.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :return: The entry, or None if there is no valid entry.
+        """
+        data = self.entries.get(self.get_key(kind, file_path, part))
+        if data is None or data.get('stamp') != self.get_stamp(file_path):
+            return None
+
+        return TimeIndexEntry.from_dict(data)
+
+    def put(
+            self,
+            kind: str,
+            file_path: str,
+            part: str | None,
+            entry: TimeIndexEntry
+    ):
+        """
+        Add or replace the entry of a file or part.
+        :param kind: The kind of records in the file, i.e. the name of its viewer.
+        :param file_path: The path of the file.
+        :param part: The part within the file, if any.
+        :param entry: The entry to store.
+        """
+        data = entry.to_dict()
+        data['stamp'] = self.get_stamp(file_path)
+
+        self.entries[self.get_key(kind, file_path, part)] = data
+        self.changed = True
@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import argparse
 import datetime
+import itertools
 import json
+import multiprocessing
 import re
 import sys
+from abc import abstractmethod
 from enum import Enum
-from typing import Any
+from typing import Any, Callable, Iterable
+
+import numpy as np
 
 import worldcup98.viewer
 from abstract_viewer import Viewer
-from generic import DatasetType
+from columnar import ColumnarWriter
+from generic import DatasetType, parse_duration, close_archives
+from histogram import Histogram, METRICS, STATUS_COLUMNS
 from log_viewer import LogViewer
+from record import Record
+from rollup import GROUP_COLUMNS, aggregate_records, query_rollups
 
 viewer_map = {
     DatasetType.WORLDCUP98: worldcup98.viewer.WorldCup98Viewer,
@@ -24,10 +33,14 @@ class OutputOption(Enum):
     JSON = 1
     PLOT = 2
     SQL = 3
+    COLUMNAR = 4
+    CSV = 5
+    TSV = 6
+    ROLLUP = 7
 
     @staticmethod
     def get_option_names():
-        list(option.name for option in OutputOption)
+        return list(option.name for option in OutputOption)
 
     @staticmethod
     def parse(name: str) -> OutputOption:
@@ -94,6 +107,7 @@ def parse_options():
         '--format',
         help='Output format.',
         choices=OutputOption.get_option_names(),
+        type=str.upper,
         default=OutputOption.JSON.name,
         dest='output_format'
     )
@@ -106,6 +120,42 @@ def parse_options():
         default='data'
     )
 
+    parser.add_argument(
+        '--batch-size',
+        help='Number of records per INSERT statement when outputting data in SQL '
+             'format',
+        type=int,
+        dest='batch_size',
+        default=1000
+    )
+
+    parser.add_argument(
+        '--interval',
+        help='Length of the intervals data is aggregated into when outputting '
+             'data in PLOT or ROLLUP format, e.g. 1m or 1h. If an output file is '
+             'specified, PLOT data is written to it as CSV instead of plotted.',
+        dest='interval',
+        default='1m'
+    )
+
+    parser.add_argument(
+        '--workers',
+        help='Number of processes to use for decoding and formatting data. The '
+             'output is the same regardless of the number of processes.',
+        type=int,
+        dest='workers',
+        default=1
+    )
+
+    parser.add_argument(
+        '--convert',
+        help='Convert the NASA or ClarkNet logs of the input, or the specified '
+             'part, into compact binary stores instead of viewing them. Converted '
+             'logs are read from their stores from then on, until they change.',
+        action='store_true',
+        dest='convert'
+    )
+
     return parser.parse_args(sys.argv[1:])
 
 
@@ -119,102 +169,550 @@ def main():
         options.duration
     )
 
-    view(viewer, options)
+    try:
+        if options.convert:
+            convert(viewer, options)
+        else:
+            view(viewer, options)
+    finally:
+        close_archives()
 
 
-def format_json(data: dict[str, Any]) -> str:
-    for key, value in data.items():
-        if isinstance(value, datetime.datetime):
-            data[key] = value.isoformat()
+# Characters removed from strings in SQL output
+SQL_STRING_FILTER = re.compile(r'[^\w\/:\s.\-?!,~]')
+SQL_TABLE_NAME = re.compile(r'\w+(\.\w+)?')
 
-    return json.dumps(data)
+SQL_TYPES = {
+    int: 'BIGINT',
+    float: 'DOUBLE PRECISION',
+    str: 'TEXT',
+    datetime.datetime: 'DATETIME'
+}
 
+# The maximum number of formatted values cached per column
+VALUE_CACHE_SIZE = 1 << 16
+
+# The number of formatted records a worker sends at a time, and the number of such
+# chunks it may send ahead of the output before it waits
+CHUNK_RECORDS = 4096
+QUEUED_CHUNKS = 4
+
+
+def to_datetime(value: datetime.datetime | int) -> datetime.datetime:
+    """
+    Get a time of a record as a datetime.
+    :param value: The time, either as a datetime or as an integer timestamp, which
+    is converted to local time.
+    :return: The time as a datetime.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+
+    return datetime.datetime.fromtimestamp(value)
+
+
+def format_time(value: datetime.datetime | int) -> str:
+    """
+    Format a time the way databases accept it, i.e. as YYYY-MM-DD HH:MM:SS without
+    a timezone.
+    :param value: The time, either as a datetime or as an integer timestamp.
+    :return: The formatted time.
+    """
+    return to_datetime(value).replace(tzinfo=None).isoformat(sep=' ')
+
+
+def cached(format_value: Callable[[Any], str]) -> Callable[[Any], str]:
+    """
+    Cache the formatted values of a column. Strings and times repeat a lot within
+    a stream of records, so most values are only formatted once.
+    :param format_value: The function formatting a value of the column.
+    :return: A function formatting values the same way, using a cache.
+    """
+    cache = dict()
+
+    def format_cached(value: Any) -> str:
+        formatted = cache.get(value)
+
+        if formatted is None:
+            if len(cache) >= VALUE_CACHE_SIZE:
+                cache.clear()
+
+            formatted = cache[value] = format_value(value)
+
+        return formatted
+
+    return format_cached
+
+
+class RecordFormatter:
+    """
+    Formatter of a stream of records into text. How each column is formatted is
+    determined once from the schema of the viewer, rather than for each record.
+    A stream consists of a header, followed by the formatted records joined by
+    join. Records are either records returned by Viewer.read, or the rows of
+    batches of columns returned by read_batches, which are formatted without
+    creating records.
+    """
+
+    NULL = ''
+
+    def __init__(self, schema: dict[str, type]):
+        self.columns: list[str] = list(schema)
+        self.formatters: list[Callable[[Any], str]] = [
+            self.get_value_formatter(value_type) for value_type in schema.values()
+        ]
+
+    def get_value_formatter(self, value_type: type) -> Callable[[Any], str]:
+        return str
+
+    def get_header(self) -> str:
+        return ''
+
+    def format_values(self, data: Record | dict[str, Any]) -> Iterable[str]:
+        null = self.NULL
+
+        for column, format_value in zip(self.columns, self.formatters):
+            value = data[column]
+            yield null if value is None else format_value(value)
+
+    def format_record(self, data: Record | dict[str, Any]) -> str:
+        return self.format_row(*self.format_values(data))
+
+    def format_batch(self, batch: dict[str, np.ndarray]) -> list[str]:
+        """
+        Format the rows of a batch of columns the same way as format_record
+        formats records with the same values.
+        :param batch: The columns of the batch, none of which contain None.
+        :return: The formatted rows.
+        """
+        return list(map(
+            self.format_row,
+            *(
+                map(format_value, batch[column].tolist())
+                for column, format_value in zip(self.columns, self.formatters)
+            )
+        ))
+
+    @abstractmethod
+    def format_row(self, *values: str) -> str:
+        """
+        Format a record from its formatted values.
+        :param values: The formatted values of the columns, in order.
+        :return: The formatted record.
+        """
+        pass
+
+    def join(self, records: Iterable[str]) -> Iterable[str]:
+        """
+        Join formatted records into the text of the stream.
+        :param records: The formatted records.
+        :return: A generator yielding the text of the stream.
+        """
+        for record in records:
+            yield record
+            yield '\n'
+
+
+class JsonFormatter(RecordFormatter):
+    """
+    Formatter of records into JSON objects, one per line, with times as ISO
+    formatted strings.
+    """
+
+    NULL = 'null'
+
+    def __init__(self, schema: dict[str, type]):
+        super().__init__(schema)
+        self.keys: list[str] = [json.dumps(column) + ': ' for column in self.columns]
+
+    def get_value_formatter(self, value_type: type) -> Callable[[Any], str]:
+        if value_type == str:
+            return cached(json.dumps)
+        if value_type == datetime.datetime:
+            return cached(lambda value: '"' + to_datetime(value).isoformat() + '"')
+        if value_type == int:
+            return str
+
+        return json.dumps
+
+    def format_row(self, *values: str) -> str:
+        return '{' + ', '.join(map(str.__add__, self.keys, values)) + '}'
+
+
+class SqlFormatter(RecordFormatter):
+    """
+    Formatter of records into SQL statements. The stream starts with a CREATE
+    TABLE statement for the schema, followed by INSERT statements of up to
+    batch_size records each.
+    """
+
+    NULL = 'NULL'
+
+    def __init__(self, table_name: str, schema: dict[str, type], batch_size: int):
+        if not SQL_TABLE_NAME.fullmatch(table_name):
+            raise ValueError(f'Table name contains risky characters.')
+
+        if batch_size < 1:
+            raise ValueError('Batch size must be at least 1.')
+
+        super().__init__(schema)
+        self.table_name: str = table_name
+        self.schema: dict[str, type] = schema
+        self.batch_size: int = batch_size
+
+    def get_value_formatter(self, value_type: type) -> Callable[[Any], str]:
+        if value_type == str:
+            return cached(
+                lambda value: '\'' + SQL_STRING_FILTER.sub('', value) + '\''
+            )
+        if value_type == datetime.datetime:
+            return cached(lambda value: '\'' + format_time(value) + '\'')
+
+        return str
+
+    def get_header(self) -> str:
+        columns = ',\n'.join(
+            f'    {name} {SQL_TYPES.get(value_type, "TEXT")}'
+            for name, value_type in self.schema.items()
+        )
+
+        return f'CREATE TABLE IF NOT EXISTS {self.table_name} (\n{columns}\n);\n'
+
+    def format_row(self, *values: str) -> str:
+        return '(' + ', '.join(values) + ')'
+
+    def join(self, records: Iterable[str]) -> Iterable[str]:
+        insert = f'INSERT INTO {self.table_name} ({", ".join(self.columns)}) VALUES\n'
+        records = iter(records)
+
+        while batch := list(itertools.islice(records, self.batch_size)):
+            yield insert
+            yield ',\n'.join(batch)
+            yield ';\n'
+
+
+class CsvFormatter(RecordFormatter):
+    """
+    Formatter of records into comma separated values with a header line, as read
+    by COPY ... WITH (FORMAT csv, HEADER) or LOAD DATA ... FIELDS TERMINATED BY ','
+    OPTIONALLY ENCLOSED BY '"' IGNORE 1 LINES. Values containing separators, quotes
+    or newlines are quoted.
+    """
+
+    def get_value_formatter(self, value_type: type) -> Callable[[Any], str]:
+        if value_type == str:
+            return cached(self.quote)
+        if value_type == datetime.datetime:
+            return cached(format_time)
 
-def format_sql(table_name: str, data: dict[str, Any]) -> str:
-    string_filter = re.compile(r'[^\w\/:\s.\-?!,~]')
+        return str
 
-    def format_value(value: Any) -> str:
-        if isinstance(value, str):
-            value = string_filter.sub('', value)
-            return '\'' + value + '\''
-        if isinstance(value, int) or isinstance(value, float):
-            return str(value)
-        if isinstance(value, datetime.datetime):
-            return f'CAST(\'{value.replace(tzinfo=None).isoformat()}\' AS DATETIME)'
+    @staticmethod
+    def quote(value: str) -> str:
+        if any(character in value for character in ',"\r\n'):
+            return '"' + value.replace('"', '""') + '"'
+
+        return value
+
+    def get_header(self) -> str:
+        return ','.join(self.quote(column) for column in self.columns) + '\n'
+
+    def format_row(self, *values: str) -> str:
+        return ','.join(values)
+
+
+class TsvFormatter(RecordFormatter):
+    """
+    Formatter of records into tab separated values with a header line, using the
+    text format of COPY and the default format of LOAD DATA, where special
+    characters are escaped with backslashes.
+    """
+
+    NULL = '\\N'
+    ESCAPES = str.maketrans({
+        '\\': '\\\\',
+        '\t': '\\t',
+        '\n': '\\n',
+        '\r': '\\r'
+    })
+
+    def get_value_formatter(self, value_type: type) -> Callable[[Any], str]:
+        if value_type == str:
+            return cached(lambda value: value.translate(self.ESCAPES))
+        if value_type == datetime.datetime:
+            return cached(format_time)
+
+        return str
+
+    def get_header(self) -> str:
+        return '\t'.join(
+            column.translate(self.ESCAPES) for column in self.columns
+        ) + '\n'
+
+    def format_row(self, *values: str) -> str:
+        return '\t'.join(values)
+
+
+def get_formatter(
+        output_format: OutputOption,
+        viewer: Viewer,
+        options
+) -> RecordFormatter | None:
+    if output_format == OutputOption.JSON:
+        return JsonFormatter(viewer.SCHEMA)
+    if output_format == OutputOption.SQL:
+        return SqlFormatter(options.db_table, viewer.SCHEMA, options.batch_size)
+    if output_format == OutputOption.CSV:
+        return CsvFormatter(viewer.SCHEMA)
+    if output_format == OutputOption.TSV:
+        return TsvFormatter(viewer.SCHEMA)
+
+    return None
+
+
+_worker_viewer: Viewer | None = None
+_worker_formatter: RecordFormatter | None = None
+_worker_queues: list[multiprocessing.Queue] | None = None
+
+
+def _init_worker(
+        viewer: Viewer,
+        output_format: OutputOption,
+        options,
+        queues: list[multiprocessing.Queue]
+):
+    global _worker_viewer, _worker_formatter, _worker_queues
+
+    _worker_viewer = viewer
+    _worker_formatter = get_formatter(output_format, viewer, options)
+    _worker_queues = queues
+
+
+def _format_task(task: tuple, slot: int):
+    """
+    Format the records of a task, and send them to the queue of a slot a chunk at
+    a time. Each chunk is sent as a tuple of the formatted records and None. The
+    end of the task is sent as a tuple of None and whether reading stopped, or the
+    exception raised by the task.
+    """
+    queue = _worker_queues[slot]
+
+    try:
+        if hasattr(_worker_viewer, 'read_task_batches'):
+            records = _worker_viewer.read_task_batches(task)
+            format_records = _worker_formatter.format_batch
+            add = list.extend
+        else:
+            records = _worker_viewer.read_task(task)
+            format_records = _worker_formatter.format_record
+            add = list.append
+
+        chunk = []
+        try:
+            while True:
+                add(chunk, format_records(next(records)))
+
+                if len(chunk) >= CHUNK_RECORDS:
+                    queue.put((chunk, None))
+                    chunk = []
+        except StopIteration as stop:
+            stopped = stop.value
+
+        if chunk:
+            queue.put((chunk, None))
+
+        queue.put((None, stopped))
+    except Exception as error:
+        queue.put((None, error))
+
+
+def format_parallel(
+        viewer: Viewer,
+        output_format: OutputOption,
+        options
+) -> Iterable[str]:
+    """
+    Read and format records using a pool of worker processes. The output is split
+    into tasks by the viewer, and the formatted records are yielded in order, so
+    the output is identical to formatting the output of viewer.read sequentially.
+    Workers run at most twice as many tasks as there are workers, and send their
+    output through bounded queues, so they cannot run arbitrarily far ahead of the
+    output. No tasks are started after a task reaches the stop time.
+    :param viewer: The viewer to read data from.
+    :param output_format: The format to output data in.
+    :param options: The parsed command line options.
+    :return: A generator yielding formatted records.
+    """
+    tasks = viewer.get_tasks(options.part, options.workers * 4)
+    slots = options.workers * 2
+    queues = [multiprocessing.Queue(QUEUED_CHUNKS) for _ in range(slots)]
+
+    with multiprocessing.Pool(
+            options.workers,
+            initializer=_init_worker,
+            initargs=(viewer, output_format, options, queues)
+    ) as pool:
+        for index, task in enumerate(tasks[:slots]):
+            pool.apply_async(_format_task, (task, index))
+
+        for index in range(len(tasks)):
+            slot = index % slots
+
+            while (message := queues[slot].get())[0] is not None:
+                yield from message[0]
+
+            result = message[1]
+            if isinstance(result, Exception):
+                raise result
+
+            if result:
+                break
 
-    if string_filter.match(table_name):
-        raise ValueError(f'Table name contains risky characters.')
+            # The slot is free once the output of its task has been yielded
+            if index + slots < len(tasks):
+                pool.apply_async(_format_task, (tasks[index + slots], slot))
+
+
+def write_columnar(viewer: Viewer, options):
+    """
+    Write data in the columnar format of the columnar module. Viewers that can read
+    batches of columns are read that way, avoiding per-record dictionaries.
+    :param viewer: The viewer to read data from.
+    :param options: The parsed command line options.
+    """
+    output = sys.stdout.buffer
+
+    if options.output_file is not None:
+        output = open(options.output_file, 'wb')
+
+    with ColumnarWriter(output) as writer:
+        if hasattr(viewer, 'read_batches'):
+            for batch in viewer.read_batches(options.part):
+                writer.write_batch(batch)
+        else:
+            for line in viewer.read(options.part):
+                writer.write_row(line)
+
+    if output != sys.stdout.buffer:
+        output.close()
+
+
+def build_histogram(viewer: Viewer, options) -> Histogram:
+    """
+    Aggregate the data of a viewer into a histogram, from the rollups of the data
+    if they have been built, or in a single pass over the data. Viewers that can
+    read batches of columns are read that way.
+    :param viewer: The viewer to read data from.
+    :param options: The parsed command line options.
+    :return: The histogram.
+    """
+    histogram = Histogram(
+        parse_duration(options.interval),
+        viewer.start_time,
+        viewer.stop_time
+    )
 
-    ordered = list(sorted(data.items(), key=lambda pair: pair[0]))
-    keys = ', '.join(key for key, value in ordered)
-    values = ', '.join(format_value(value) for key, value in ordered)
+    table = query_rollups(viewer, histogram.interval, options.part, clients=False)
+
+    if table is not None:
+        if histogram.tzinfo is None:
+            histogram.tzinfo = table.tz
+
+        histogram.add_counts(table.times, table.get_columns(METRICS))
+    elif hasattr(viewer, 'read_batches'):
+        status_column = next(
+            column for column in STATUS_COLUMNS if column in viewer.SCHEMA
+        )
+
+        for batch in viewer.read_batches(options.part):
+            histogram.add_batch(batch['time'], batch['size'], batch[status_column])
+    else:
+        histogram.add_records(viewer.read(options.part))
+
+    return histogram
+
+
+def convert(viewer: Viewer, options):
+    """
+    Convert the input of a viewer into its binary store, see LogViewer.convert.
+    :param viewer: The viewer of the input.
+    :param options: The parsed command line options.
+    """
+    if not hasattr(viewer, 'convert'):
+        raise ValueError(f'{options.dataset} data cannot be converted.')
+
+    for file_path, part in viewer.convert(options.part):
+        sys.stderr.write(f'Converted {file_path}{f" ({part})" if part else ""}\n')
+
+
+def write_rollup(viewer: Viewer, options):
+    """
+    Write the requests, bytes, methods, status classes and distinct clients of the
+    data of a viewer per interval, and per server region for the World Cup 98
+    dataset, as CSV. The data is aggregated from the coarsest level of its
+    rollups that fits the interval, and only read if there is none, see
+    rollup.query_rollups.
+    :param viewer: The viewer to read data from.
+    :param options: The parsed command line options.
+    """
+    interval = int(parse_duration(options.interval).total_seconds())
+    table = query_rollups(viewer, interval, options.part)
+
+    if table is None:
+        table = aggregate_records(viewer, interval, options.part)
+
+    output = sys.stdout
+    if options.output_file is not None:
+        output = open(options.output_file, 'w')
+
+    table.write_csv(
+        output,
+        next((column for column in GROUP_COLUMNS if column in viewer.SCHEMA), None),
+        None if viewer.start_time is None else viewer.start_time.tzinfo
+    )
 
-    return f'INSERT INTO {table_name} ({keys}) VALUES ({values});'
+    if output != sys.stdout:
+        output.close()
 
 
 def view(viewer: Viewer, options):
     output_format = OutputOption.parse(options.output_format)
-    start_date = viewer.start_time
-    end_date = viewer.stop_time
-    data = viewer.read(options.part)
+    formatter = get_formatter(output_format, viewer, options)
 
-    formatters = {
-        OutputOption.JSON: format_json,
-        OutputOption.SQL: lambda line: format_sql(options.db_table, line)
-    }
-
-    if output_format in formatters:
+    if formatter is not None:
         output = sys.stdout
 
         if options.output_file is not None:
             output = open(options.output_file, 'w')
 
-        for line in data:
-            text = formatters[output_format](line)
-            output.write(text)
-            output.write('\n')
+        # Viewers that can read batches of columns are formatted a batch at a
+        # time, without creating records
+        if options.workers > 1:
+            records = format_parallel(viewer, output_format, options)
+        elif hasattr(viewer, 'read_batches'):
+            records = itertools.chain.from_iterable(
+                map(formatter.format_batch, viewer.read_batches(options.part))
+            )
+        else:
+            records = map(formatter.format_record, viewer.read(options.part))
+
+        output.write(formatter.get_header())
+        output.writelines(formatter.join(records))
 
         if output != sys.stdout:
             output.close()
+    elif output_format == OutputOption.COLUMNAR:
+        write_columnar(viewer, options)
+    elif output_format == OutputOption.ROLLUP:
+        write_rollup(viewer, options)
     elif output_format == OutputOption.PLOT:
-        bin_count = 256
-
-        first_time = start_date
-        last_time = end_date
-
-        items = data
-        if start_date is None or end_date is None:
-            items = list(data)
-            first_time = datetime.datetime.fromisoformat(items[0]['time'])
-            last_time = datetime.datetime.fromisoformat(items[-1]['time'])
-
-        step = (last_time - first_time) / bin_count
-
-        bin_times = [first_time + step * i for i in range(bin_count)]
-        bin_counts = [0 for _ in bin_times]
-        bin = 0
-        next_bin = bin_times[1]
+        histogram = build_histogram(viewer, options)
 
-        for point in items:
-            time = datetime.datetime.fromisoformat(point['time'])
-
-            if next_bin is None:
-                break
-
-            while time >= next_bin and bin < bin_count - 2:
-                bin += 1
-                next_bin = bin_times[bin + 1] if bin + 1 < bin_count else None
-
-                if next_bin is None:
-                    break
-
-            if bin < bin_count:
-                bin_counts[bin] += 1
-
-        import matplotlib.pyplot as plt
-        fig, ax = plt.subplots()
-        ax.plot(bin_times[:-2], bin_counts[:-2])
-        plt.show()
+        if options.output_file is not None:
+            with open(options.output_file, 'w') as output:
+                histogram.write_csv(output)
+        else:
+            histogram.plot()
 
 
 if __name__ == '__main__':
@@ -3,9 +3,12 @@ import re
 import sys
 
 from abstract_scraper import Scraper
+from worldcup98.viewer import WorldCup98Viewer
 
 
 class WorldCup98Scraper(Scraper):
+    VIEWER = WorldCup98Viewer
+    RECORD_SIZE = WorldCup98Viewer.RECORD_SIZE
 
     def __init__(self, output_path: str, threads: int):
         super().__init__(output_path, threads)
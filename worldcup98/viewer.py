@@ -1,13 +1,42 @@
+from __future__ import annotations
+
+import bisect
 import json
+import os
 import struct
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Iterable, IO, Any
+from typing import Iterable, IO, Any, Generator
+
+import numpy as np
 
 import generic
-from abstract_viewer import Viewer
+from abstract_viewer import Viewer, PartIndexer
+from record import Record
+from gzip_index import build_checkpoints, GzipCheckpoint
+from time_index import TimeIndexEntry
+
+
+class WorldCup98DataPoint(Record):
+    """
+    A decoded record of the World Cup 98 dataset. The time is stored as an integer
+    timestamp, and methods and types are the shared strings of METHOD_NAMES and
+    TYPES, so records do not own any strings.
+    """
 
+    __slots__ = (
+        'time',
+        'client_id',
+        'object_id',
+        'size',
+        'method',
+        'status',
+        'http_version',
+        'type',
+        'server_id',
+        'server_region'
+    )
 
-class WorldCup98DataPoint:
     METHOD_NAMES = [
         'GET',
         'HEAD',
@@ -81,36 +110,59 @@ class WorldCup98DataPoint:
             client_id: int,
             object_id: int,
             size: int,
-            method: int,
+            method: str,
             status: int,
-            type: int,
-            server: int
+            http_version: int,
+            type: str,
+            server_id: int,
+            server_region: int
     ):
-        self.time: str = datetime.fromtimestamp(time).isoformat()
+        self.time: int = time
         self.client_id: int = client_id
         self.object_id: int = object_id
-        self.size: int = int(size)
-        self.method: str = self.get_safe(
-            int.from_bytes(method, 'big'),
-            self.METHOD_NAMES,
-            'unknown'
-        )
+        self.size: int = size
+        self.method: str = method
+        self.status: int = status
+        self.http_version: int = http_version
+        self.type: str = type
+        self.server_id: int = server_id
+        self.server_region: int = server_region
 
+    @staticmethod
+    def decode(
+            time: int,
+            client_id: int,
+            object_id: int,
+            size: int,
+            method: bytes,
+            status: bytes,
+            type: bytes,
+            server: bytes
+    ) -> WorldCup98DataPoint:
+        """
+        Decode the fields of a raw record.
+        :return: The decoded record.
+        """
         status_field = int.from_bytes(status, 'big')
-        self.status: int = self.get_safe(
-            status_field & 0b111111,
-            self.STATUS_CODES,
-            0
-        )
-        self.http_version = status_field >> 6
-        self.type: str = self.get_safe(
-            int.from_bytes(type, 'big'),
-            self.TYPES,
-            'unknown'
-        )
         server_field = int.from_bytes(server, 'big')
-        self.server_id: int = server_field & 0b11111
-        self.server_region: int = server_field >> 5
+        get_safe = WorldCup98DataPoint.get_safe
+
+        return WorldCup98DataPoint(
+            time,
+            client_id,
+            object_id,
+            int(size),
+            get_safe(
+                int.from_bytes(method, 'big'),
+                WorldCup98DataPoint.METHOD_NAMES,
+                'unknown'
+            ),
+            get_safe(status_field & 0b111111, WorldCup98DataPoint.STATUS_CODES, 0),
+            status_field >> 6,
+            get_safe(int.from_bytes(type, 'big'), WorldCup98DataPoint.TYPES, 'unknown'),
+            server_field & 0b11111,
+            server_field >> 5
+        )
 
     @staticmethod
     def get_safe(index: int, from_list: list, default: Any) -> Any:
@@ -119,11 +171,243 @@ class WorldCup98DataPoint:
 
         return from_list[index]
 
-    def to_dict(self):
-        return self.__dict__
+
+RECORD_DTYPE = np.dtype([
+    ('time', '>u4'),
+    ('client_id', '>u4'),
+    ('object_id', '>u4'),
+    ('size', '>u4'),
+    ('method', 'u1'),
+    ('status', 'u1'),
+    ('type', 'u1'),
+    ('server', 'u1')
+])
+
+
+def _lookup_table(values: list, default: Any, size: int = 256) -> np.ndarray:
+    """
+    Create a lookup table mapping every possible field value to its decoded value,
+    so that a whole column can be decoded with a single indexing operation.
+    :param values: The decoded values, in the order of their encoded indices.
+    :param default: The value used for indices outside the list of values.
+    :param size: The number of possible encoded values.
+    :return: An array of the decoded values, indexable by encoded value.
+    """
+    return np.array(values + [default] * (size - len(values)))
+
+
+METHOD_TABLE = _lookup_table(WorldCup98DataPoint.METHOD_NAMES, 'unknown')
+STATUS_TABLE = _lookup_table(WorldCup98DataPoint.STATUS_CODES, 0, 64)
+TYPE_TABLE = _lookup_table(WorldCup98DataPoint.TYPES, 'unknown')
+
+# The lookup tables as lists, whose values are shared by all decoded records
+METHOD_LIST = METHOD_TABLE.tolist()
+STATUS_LIST = STATUS_TABLE.tolist()
+TYPE_LIST = TYPE_TABLE.tolist()
+
+
+def decode_records(records: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Decode an array of raw records into a batch of columns. The columns are named
+    and decoded the same way as the fields of WorldCup98DataPoint, except that the
+    time column contains integer timestamps.
+    :param records: An array of records with the RECORD_DTYPE data type.
+    :return: A dictionary mapping column names to arrays of decoded values.
+    """
+    status = records['status']
+    server = records['server']
+
+    return {
+        'time': records['time'].astype(np.int64),
+        'client_id': records['client_id'].astype(np.int64),
+        'object_id': records['object_id'].astype(np.int64),
+        'size': records['size'].astype(np.int64),
+        'method': METHOD_TABLE[records['method']],
+        'status': STATUS_TABLE[status & 0b111111],
+        'http_version': status >> 6,
+        'type': TYPE_TABLE[records['type']],
+        'server_id': server & 0b11111,
+        'server_region': server >> 5
+    }
+
+
+def records_to_points(records: np.ndarray) -> Iterable[WorldCup98DataPoint]:
+    """
+    Decode an array of raw records into records, decoded the same way as the
+    columns of decode_records.
+    :param records: An array of records with the RECORD_DTYPE data type.
+    :return: An iterator of the decoded records.
+    """
+    status = records['status']
+    server = records['server']
+
+    return map(
+        WorldCup98DataPoint,
+        records['time'].tolist(),
+        records['client_id'].tolist(),
+        records['object_id'].tolist(),
+        records['size'].tolist(),
+        map(METHOD_LIST.__getitem__, records['method'].tolist()),
+        map(STATUS_LIST.__getitem__, (status & 0b111111).tolist()),
+        (status >> 6).tolist(),
+        map(TYPE_LIST.__getitem__, records['type'].tolist()),
+        (server & 0b11111).tolist(),
+        (server >> 5).tolist()
+    )
+
+
+def merge_chunks(streams: list[Iterable[np.ndarray]]) -> Iterable[np.ndarray]:
+    """
+    Merge streams of raw records that are each sorted by time into a single
+    stream sorted by time, a chunk at a time. Each merged chunk holds the records
+    of all streams up to the earliest last time of their current chunks, sorted
+    stably, so records with the same time keep the order of their streams.
+    :param streams: The streams, each yielding arrays of raw records.
+    :return: A generator yielding arrays of raw records.
+    """
+    iterators = [iter(stream) for stream in streams]
+    chunks = [next(iterator, None) for iterator in iterators]
+
+    while True:
+        active = [index for index, chunk in enumerate(chunks) if chunk is not None]
+        if not active:
+            return
+
+        bound = min(chunks[index]['time'][-1] for index in active)
+        taken = []
+
+        for index in active:
+            chunk = chunks[index]
+            cut = int(np.searchsorted(chunk['time'], bound, side='right'))
+            taken.append(chunk[:cut])
+
+            chunk = chunk[cut:]
+            while chunk is not None and len(chunk) == 0:
+                chunk = next(iterators[index], None)
+
+            chunks[index] = chunk
+
+        merged = np.concatenate(taken)
+        yield merged[np.argsort(merged['time'], kind='stable')]
+
+
+class RecordTimes(Sequence):
+    """
+    A lazy sequence of the timestamps of the records in a part. Timestamps are
+    only read when accessed, which allows the records to be bisected by time while
+    only touching O(log n) records.
+    """
+
+    def __init__(self, source: np.ndarray):
+        """
+        Constructs a new lazy sequence of record timestamps.
+        :param source: An array of raw records, such as a memory-mapped part.
+        """
+        self.source: np.ndarray = source
+        self.count: int = len(source)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+
+        if not 0 <= index < self.count:
+            raise IndexError('Record index out of range.')
+
+        return int(self.source[index]['time'])
+
+    def find_range(
+            self,
+            start: float | None,
+            stop: float | None
+    ) -> tuple[int, int]:
+        """
+        Bisect the records to find the ones within a time range.
+        :param start: The first timestamp of the range, or None for no lower bound.
+        :param stop: The timestamp where the range ends (exclusive), or None for no
+        upper bound.
+        :return: A tuple of the index of the first record at or after the start,
+        and the index of the first record at or after the stop.
+        """
+        first = 0 if start is None else bisect.bisect_left(self, start)
+        last = self.count if stop is None else \
+            bisect.bisect_left(self, stop, lo=first)
+
+        return first, last
+
+
+class WorldCup98PartIndexer(PartIndexer):
+    RECORD_SIZE = RECORD_DTYPE.itemsize
+
+    def __init__(self):
+        self.head: bytearray = bytearray()
+        self.tail: bytes = b''
+        self.length: int = 0
+
+    def update(self, data: bytes):
+        size = self.RECORD_SIZE
+
+        if len(self.head) < size:
+            self.head.extend(data[:size - len(self.head)])
+
+        self.tail = (self.tail + data[-2 * size:])[-2 * size:]
+        self.length += len(data)
+
+    def locate(
+            self,
+            head: bytes,
+            offset: int,
+            previous: bytes
+    ) -> tuple[int, datetime] | None:
+        skip = -offset % self.RECORD_SIZE
+        if len(head) < skip + 4:
+            return None
+
+        return skip, datetime.fromtimestamp(struct.unpack_from('>I', head, skip)[0])
+
+    def get_entry(
+            self,
+            checkpoints: list[GzipCheckpoint] | None = None
+    ) -> TimeIndexEntry | None:
+        size = self.RECORD_SIZE
+        count = self.length // size
+        if count == 0:
+            return None
+
+        # The last record ends before any trailing partial record
+        last_offset = len(self.tail) - size - self.length % size
+
+        return TimeIndexEntry(
+            first=datetime.fromtimestamp(struct.unpack_from('>I', self.head)[0]),
+            last=datetime.fromtimestamp(
+                struct.unpack_from('>I', self.tail, last_offset)[0]
+            ),
+            count=count,
+            checkpoints=checkpoints
+        )
 
 
 class WorldCup98Viewer(Viewer):
+    RECORD_SIZE = RECORD_DTYPE.itemsize
+    CHUNK_SIZE = 1 << 16
+
+    # Times are stored in records as integer timestamps, which the formatters
+    # output as datetimes
+    SCHEMA = {
+        'time': datetime,
+        'client_id': int,
+        'object_id': int,
+        'size': int,
+        'method': str,
+        'status': int,
+        'http_version': int,
+        'type': str,
+        'server_id': int,
+        'server_region': int
+    }
+
     def __init__(
             self,
             input_path: str,
@@ -131,7 +415,13 @@ class WorldCup98Viewer(Viewer):
             stop_time: str | None,
             duration: str | None = None
     ):
-        super().__init__(input_path, start_time, stop_time, duration)
+        super().__init__(
+            input_path,
+            start_time,
+            stop_time,
+            duration,
+            read_flags='rb'
+        )
 
     def read_time(self, file: IO[bytes]):
         time_int = struct.unpack('>I', file.read(4))
@@ -142,41 +432,345 @@ class WorldCup98Viewer(Viewer):
         return self.read_time(file)
 
     def read_last_time(self, file: IO[bytes]) -> datetime:
-        file.seek(-5, 2)
+        file.seek(-self.RECORD_SIZE, os.SEEK_END)
         return self.read_time(file)
 
-    def get_parts(self):
-        start_file = self.find_file(self.start_time)
-        end_file = self.find_file(self.stop_time)
+    def index_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        mapped = self.map_part(file_path, part)
+        if mapped is not None:
+            if len(mapped) == 0:
+                return None
 
-        return self.ordered_files[start_file:end_file + 1]
+            return TimeIndexEntry(
+                first=datetime.fromtimestamp(int(mapped[0]['time'])),
+                last=datetime.fromtimestamp(int(mapped[-1]['time'])),
+                count=len(mapped)
+            )
 
-    def read(self, parts: list[str] | str | None = None) -> Iterable[dict]:
-        struct_format = '>IIIIcccc'
-        size = struct.calcsize(struct_format)
+        if generic.is_gzip(file_path, part):
+            return self._index_gzip_part(file_path, part)
 
-        if isinstance(parts, str):
-            parts = [parts]
+        first = None
+        last = None
+        count = 0
 
-        if not parts:
-            parts = self.get_parts()
-        else:
-            parts = [(self.input_path, part) for part in parts]
+        with generic.open_file(file_path, part, read_flags=self.read_flags) as file:
+            for records in self.read_chunks(file):
+                if first is None:
+                    first = int(records[0]['time'])
 
-        chunk_size = 1000
+                last = int(records[-1]['time'])
+                count += len(records)
 
-        for part in parts:
-            with generic.open_file(*part) as file:
-                while data := file.read(size * chunk_size):
-                    for offset in range(0, len(data), size):
-                        values = struct.unpack_from(struct_format, data, offset=offset)
-                        time = datetime.fromtimestamp(values[0])
+        if first is None:
+            return None
 
-                        if self.start_time is not None and time < self.start_time:
-                            break
+        return TimeIndexEntry(
+            first=datetime.fromtimestamp(first),
+            last=datetime.fromtimestamp(last),
+            count=count
+        )
+
+    def _index_gzip_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> TimeIndexEntry | None:
+        indexer = self.create_indexer()
+
+        with generic.open_compressed(file_path, part) as file:
+            checkpoints = build_checkpoints(file, indexer.locate, indexer.update)
+
+        return indexer.get_entry(checkpoints)
+
+    @classmethod
+    def create_indexer(cls) -> PartIndexer:
+        return WorldCup98PartIndexer()
+
+    def map_part(self, file_path: str, part: str | None = None) -> np.ndarray | None:
+        """
+        Memory-map an uncompressed part as an array of raw records, without
+        copying any of its data. Only the pages that are accessed through the
+        returned array are read from disk.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :return: A read-only array of raw records, or None if the part is
+        compressed and therefore cannot be mapped.
+        """
+        if part or generic.get_archive_format(file_path) is not None:
+            return None
+
+        count = os.path.getsize(file_path) // self.RECORD_SIZE
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        return np.memmap(file_path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    @staticmethod
+    def slice_chunks(
+            records: np.ndarray,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[np.ndarray]:
+        for offset in range(0, len(records), chunk_size):
+            yield records[offset:offset + chunk_size]
+
+    def read_chunks(
+            self,
+            file: IO[bytes],
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[np.ndarray]:
+        """
+        Read raw records from a file, a chunk at a time.
+        :param file: The file to read records from.
+        :param chunk_size: The maximum number of records per chunk.
+        :return: A generator yielding arrays of raw records.
+        """
+        size = self.RECORD_SIZE
+        remainder = b''
+
+        while data := file.read(size * chunk_size):
+            if remainder:
+                data = remainder + data
+
+            usable = len(data) - len(data) % size
+            remainder = data[usable:]
+
+            if usable:
+                yield np.frombuffer(data, dtype=RECORD_DTYPE, count=usable // size)
 
-                        if self.stop_time is not None and time >= self.stop_time:
-                            break
+    def seek_records(self, records: np.ndarray) -> np.ndarray:
+        """
+        Select the records within the start and stop time of the viewer from an
+        array of time-sorted records, by bisecting it.
+        :param records: An array of raw records, sorted by time.
+        :return: A view of the records with a time within [start_time, stop_time).
+        """
+        first, last = RecordTimes(records).find_range(*self.time_bounds())
+        return records[first:last]
 
-                        data_point = WorldCup98DataPoint(*values)
-                        yield data_point.to_dict()
+    def filter_records(self, records: np.ndarray) -> np.ndarray:
+        """
+        Select the records within the start and stop time of the viewer.
+        :param records: An array of raw records.
+        :return: The records with a time within [start_time, stop_time).
+        """
+        start, stop = self.time_bounds()
+        if start is None and stop is None:
+            return records
+
+        times = records['time']
+        mask = np.ones(len(records), dtype=bool)
+
+        if start is not None:
+            mask &= times >= start
+
+        if stop is not None:
+            mask &= times < stop
+
+        return records[mask]
+
+    def read_batches(
+            self,
+            parts: list[str] | str | None = None,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[dict[str, np.ndarray]]:
+        """
+        Read and decode records as batches of columns.
+        :param parts: The parts to read. If not specified, the parts overlapping
+        the start and stop time of the viewer are read.
+        :param chunk_size: The maximum number of records per batch.
+        :return: A generator yielding batches of decoded columns, as returned by
+        decode_records.
+        """
+        for records in self.read_records(parts, chunk_size):
+            yield decode_records(records)
+
+    def read_records(
+            self,
+            parts: list[str] | str | None = None,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[np.ndarray]:
+        """
+        Read the raw records of some parts within the start and stop time of the
+        viewer in order of time, a chunk at a time.
+        :param parts: The parts to read, as passed to read_batches.
+        :param chunk_size: The maximum number of records per chunk read from each
+        part.
+        :return: A generator yielding arrays of raw records.
+        """
+        for group in self.group_parts(self.resolve_parts(parts)):
+            yield from self.read_group_records(group, chunk_size)
+
+    def read_group_records(
+            self,
+            group: list[tuple[str, str | None]],
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[np.ndarray]:
+        """
+        Read the raw records of a group of parts, as created by group_parts, in
+        order of time. The chunks of overlapping parts are merged.
+        :param group: The parts of the group.
+        :param chunk_size: The maximum number of records per chunk read from each
+        part.
+        :return: A generator yielding arrays of raw records.
+        """
+        if len(group) == 1:
+            return self.read_part_records(*group[0], chunk_size)
+
+        return merge_chunks([
+            self.read_part_records(file_path, part, chunk_size)
+            for file_path, part in group
+        ])
+
+    def read_part_batches(
+            self,
+            file_path: str,
+            part: str | None,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[dict[str, np.ndarray]]:
+        """
+        Read and decode the records of a single part within the start and stop
+        time of the viewer as batches of columns.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :param chunk_size: The maximum number of records per batch.
+        :return: A generator yielding batches of decoded columns.
+        """
+        for records in self.read_part_records(file_path, part, chunk_size):
+            yield decode_records(records)
+
+    def read_part_records(
+            self,
+            file_path: str,
+            part: str | None,
+            chunk_size: int = CHUNK_SIZE
+    ) -> Iterable[np.ndarray]:
+        """
+        Read the raw records of a single part within the start and stop time of
+        the viewer, a chunk at a time.
+        :param file_path: The path of the file containing the part.
+        :param part: The part within the file, if any.
+        :param chunk_size: The maximum number of records per chunk.
+        :return: A generator yielding arrays of raw records.
+        """
+        mapped = self.map_part(file_path, part)
+        if mapped is not None:
+            yield from self.slice_chunks(self.seek_records(mapped), chunk_size)
+            return
+
+        with self.open_part(file_path, part, self.start_time) as file:
+            yield from self._filter_chunks(self.read_chunks(file, chunk_size))
+
+    def _filter_chunks(self, chunks: Iterable[np.ndarray]) -> Iterable[np.ndarray]:
+        # Compressed streams cannot be bisected, so whole chunks before the start
+        # time are skipped without filtering them, and reading stops at the first
+        # chunk past the stop time.
+        start, stop = self.time_bounds()
+
+        for records in chunks:
+            times = records['time']
+            if start is not None and times[-1] < start:
+                continue
+
+            if stop is not None and times[0] >= stop:
+                break
+
+            records = self.filter_records(records)
+
+            if len(records):
+                yield records
+
+    def get_tasks(
+            self,
+            parts: list[str] | str | None = None,
+            count: int = 1
+    ) -> list[tuple[str, str | None, int | None, int | None]]:
+        # Memory-mapped parts are split into record ranges, while compressed parts
+        # can only be read as a whole.
+        tasks = []
+
+        for group in self.group_parts(self.resolve_parts(parts)):
+            if len(group) > 1:
+                tasks.append((None, tuple(group), None, None))
+                continue
+
+            file_path, part = group[0]
+            mapped = self.map_part(file_path, part)
+            if mapped is None:
+                tasks.append((file_path, part, None, None))
+                continue
+
+            first, last = RecordTimes(mapped).find_range(*self.time_bounds())
+            step = max(self.CHUNK_SIZE, -(-(last - first) // count))
+
+            tasks.extend(
+                (file_path, part, begin, min(begin + step, last))
+                for begin in range(first, last, step)
+            )
+
+        return tasks
+
+    def read_task_records(
+            self,
+            task: tuple[str, str | None, int | None, int | None]
+    ) -> Iterable[np.ndarray]:
+        """
+        Read the raw records of a task created by get_tasks, a chunk at a time.
+        """
+        file_path, part, begin, end = task
+
+        if file_path is None:
+            return self.read_group_records(list(part), self.CHUNK_SIZE)
+
+        if begin is None:
+            return self.read_part_records(file_path, part, self.CHUNK_SIZE)
+
+        return self.slice_chunks(
+            self.map_part(file_path, part)[begin:end],
+            self.CHUNK_SIZE
+        )
+
+    def read_task_batches(
+            self,
+            task: tuple[str, str | None, int | None, int | None]
+    ) -> Generator[dict[str, np.ndarray], None, bool]:
+        """
+        Read the records of a task as batches of columns, as returned by
+        decode_records.
+        :param task: The task to read.
+        :return: A generator yielding the batches of the task, see read_task.
+        """
+        for records in self.read_task_records(task):
+            yield decode_records(records)
+
+        return False
+
+    def read_task(
+            self,
+            task: tuple[str, str | None, int | None, int | None]
+    ) -> Generator[WorldCup98DataPoint, None, bool]:
+        for records in self.read_task_records(task):
+            yield from records_to_points(records)
+
+        return False
+
+    def read_part(
+            self,
+            file_path: str,
+            part: str | None
+    ) -> Generator[WorldCup98DataPoint, None, bool]:
+        for records in self.read_part_records(file_path, part):
+            yield from records_to_points(records)
+
+        return False
+
+    def read(
+            self,
+            parts: list[str] | str | None = None
+    ) -> Iterable[WorldCup98DataPoint]:
+        for records in self.read_records(parts):
+            yield from records_to_points(records)